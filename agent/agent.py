@@ -1,30 +1,68 @@
-import time
-import json
-import gzip
-import base64
 from datetime import datetime
-from system_info import get_system_info
+import metrics
+from system_info import HostInfo
 from config import load_config
-from process import collect_process_data
-from sender import send_data
+from process import create_sampler
+from process_filter import ProcessFilter
+from scheduler import AdaptiveInterval, Scheduler
+from sender import SpoolSender
+from spool import Spool
+from delta import DeltaEncoder
+from wire import PayloadEncoder
 
 def main():
     config = load_config()
+    sampler = create_sampler(config["collector"])
+    process_filter = ProcessFilter.from_config(config)
+    adaptive = None
+    if config["adaptive"]:
+        adaptive = AdaptiveInterval(config["interval"], config["max_interval"], config["cpu_spike"],
+                                    config["rss_spike"], config["churn_spike"])
+    scheduler = Scheduler(config["interval"], adaptive)
+    host_info = HostInfo(config["host_info_interval"])
+    encoder = DeltaEncoder(config["keyframe_interval"]) if config["delta"] else None
+    payload_encoder = PayloadEncoder(config["wire_format"])
+    spool = Spool(config["spool_path"], int(config["spool_max_mb"] * 1024 * 1024))
+    SpoolSender(spool, payload_encoder, encoder, config, scheduler).start()
+    metrics.Gauge("procmon_agent_spool_bytes", "Unsent snapshot bytes in the spool.", function=spool.pending_bytes)
+    metrics.Gauge("procmon_agent_interval_seconds", "Sampling interval in force.", function=scheduler.current_interval)
+    if config["metrics_port"]:
+        metrics.serve(config["metrics_port"])
 
     print("🔹 Process Monitoring Agent Started")
     print(f"➡ Endpoint: {config['endpoint']}")
-    print(f"➡ Polling interval: {config['interval']}s")
+    if adaptive is not None:
+        print(f"➡ Polling interval: adaptive, {config['interval']}-{config['max_interval']}s")
+    else:
+        print(f"➡ Polling interval: {config['interval']}s")
+    print(f"➡ Collector: {type(sampler).__name__}")
+    if process_filter is not None:
+        print(f"➡ Process filter: top_k={config['top_k']} min_cpu={config['min_cpu']} min_rss={config['min_rss']} "
+              f"fold_idle={config['fold_idle']}")
+    print(f"➡ Wire format: {payload_encoder.wire_format}")
+    print(f"➡ Spool: {config['spool_path']} (max {config['spool_max_mb']} MB)")
+    if config["metrics_port"]:
+        print(f"➡ Metrics: http://127.0.0.1:{config['metrics_port']}/metrics")
+    if config["metrics_file"]:
+        print(f"➡ Metrics file: {config['metrics_file']}")
     print("-" * 60)
 
     while True:
         try:
 
-            process_data = collect_process_data()
-
-            system_info = get_system_info()
-            print(f"➡ Hostname: {system_info['hostname']}")
+            with metrics.collect_seconds.time():
+                process_data = sampler.sample()
+                metrics.processes.set(len(process_data))
+                if adaptive is not None:
+                    adaptive.update(process_data)
+                if process_filter is not None:
+                    process_data = process_filter.apply(process_data)
+                hostdetails, host_metrics = host_info.collect()
+            metrics.sent_processes.set(len(process_data))
+            print(f"➡ Hostname: {hostdetails['hostname']}")
             snapshot = {
-                "hostdetails": system_info,
+                "hostdetails": hostdetails,
+                "host_metrics": host_metrics,
                 "snapshot_time": datetime.utcnow().isoformat(),
                 "processes": process_data
             }
@@ -32,21 +70,15 @@ def main():
             print(f"[{snapshot['snapshot_time']}] Collected {len(process_data)} processes")
 
 
-            raw_json = json.dumps(snapshot).encode("utf-8")
-            compressed = gzip.compress(raw_json)
-            encoded = base64.b64encode(compressed).decode("utf-8")
-
-            success = send_data(encoded, config)
+            spool.append(snapshot)
 
-            if success:
-                print(" Sending System Info...")
-            else:
-                print(" Failed to send data")
+            if config["metrics_file"]:
+                metrics.write_file(config["metrics_file"])
 
         except Exception as e:
             print(f" Agent error: {e}")
 
-        time.sleep(config["interval"])
+        scheduler.wait()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,75 @@
+"""
+Compare the psutil and procfs collectors on a synthetic /proc tree.
+
+    python bench_collectors.py [--sizes 1000 10000 50000] [--rounds 3]
+
+Builds a fake procfs with N processes in a temp directory, points both
+collectors at it (psutil via ``psutil.PROCFS_PATH``) and reports the best
+per-sample time of each.
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import psutil
+
+from process import ProcessSampler, ProcfsSampler
+
+
+def build_procfs(root, count):
+    with open(os.path.join(root, "stat"), "w") as f:
+        f.write("cpu  1 0 1 1 0 0 0 0 0 0\nbtime 1700000000\n")
+    for pid in range(1, count + 1):
+        d = os.path.join(root, str(pid))
+        os.mkdir(d)
+        name = f"proc{pid % 997}"
+        with open(os.path.join(d, "stat"), "w") as f:
+            f.write(
+                f"{pid} ({name}) S {max(pid // 10, 1) if pid > 1 else 0} {pid} {pid} 0 -1 4194560 "
+                f"100 0 0 0 {pid % 50} {pid % 7} 0 0 20 0 1 0 {1000 + pid} 1000000 250 "
+                + " ".join(["0"] * 30) + "\n"
+            )
+        with open(os.path.join(d, "statm"), "w") as f:
+            f.write(f"2000 {pid % 400 + 10} 100 10 0 200 0\n")
+        with open(os.path.join(d, "status"), "w") as f:
+            f.write(f"Name:\t{name}\nPPid:\t{max(pid // 10, 1) if pid > 1 else 0}\n")
+        with open(os.path.join(d, "cmdline"), "w") as f:
+            f.write(name + "\0")
+
+
+def best_time(sampler, rounds):
+    sampler.sample()
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        rows = sampler.sample()
+        best = min(best, time.perf_counter() - start)
+    return best, len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'processes':>10} {'psutil (ms)':>12} {'procfs (ms)':>12} {'speedup':>8}")
+    for count in args.sizes:
+        root = tempfile.mkdtemp(prefix="fakeproc-")
+        try:
+            build_procfs(root, count)
+            psutil.PROCFS_PATH = root
+            ps_time, ps_rows = best_time(ProcessSampler(), args.rounds)
+            fs_time, fs_rows = best_time(ProcfsSampler(procfs=root), args.rounds)
+            assert ps_rows == fs_rows == count, (ps_rows, fs_rows)
+            print(f"{count:>10} {ps_time * 1000:>12.1f} {fs_time * 1000:>12.1f} {ps_time / fs_time:>7.1f}x")
+        finally:
+            psutil.PROCFS_PATH = "/proc"
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
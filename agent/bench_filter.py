@@ -0,0 +1,93 @@
+"""
+Measure what agent-side process filtering saves per snapshot.
+
+    python bench_filter.py [--kernel-threads 400] [--processes 600] [--rounds 20]
+
+Builds a process list shaped like a busy Linux server (kthreadd with many
+idle kernel threads, a few service trees, mostly idle user processes),
+then reports rows, spooled JSON size, the compressed columnar upload and
+the time spent filtering and encoding for several agentconfig settings.
+"""
+
+import argparse
+import json
+import random
+import time
+
+from process_filter import ProcessFilter
+from wire import PayloadEncoder
+
+KERNEL_THREADS = ("kworker/{}:{}", "ksoftirqd/{}", "migration/{}", "cpuhp/{}", "irq/{}-nvme", "rcu_gp", "kswapd0")
+SERVICES = ("nginx", "postgres", "python3", "node", "java", "sshd", "bash", "containerd-shim", "php-fpm")
+
+
+def build_processes(kernel_threads, processes):
+    rows = [
+        {"pid": 1, "ppid": 0, "name": "systemd", "cpu_percent": 0.1, "rss_bytes": 1200},
+        {"pid": 2, "ppid": 0, "name": "kthreadd", "cpu_percent": 0.0, "rss_bytes": 0},
+    ]
+    pid = 3
+    for i in range(kernel_threads):
+        name = KERNEL_THREADS[i % len(KERNEL_THREADS)].format(i % 16, i // 16)
+        busy = random.random() < 0.03
+        rows.append({"pid": pid, "ppid": 2, "name": name,
+                     "cpu_percent": round(random.uniform(0.1, 5), 1) if busy else 0.0, "rss_bytes": 0})
+        pid += 1
+    parents = [1]
+    for i in range(processes):
+        name = SERVICES[i % len(SERVICES)]
+        busy = random.random() < 0.1
+        rows.append({"pid": pid, "ppid": random.choice(parents), "name": name,
+                     "cpu_percent": round(random.uniform(0.1, 80), 1) if busy else 0.0,
+                     "rss_bytes": random.randrange(100, 200000)})
+        if random.random() < 0.2:
+            parents.append(pid)
+        pid += 1
+    return rows
+
+
+def check_tree(original, rows):
+    """Every ppid that pointed at a process still points at a row that is sent."""
+    original_pids = {p["pid"] for p in original}
+    sent = {p["pid"] for p in rows}
+    broken = [p for p in rows if p["ppid"] in original_pids and p["ppid"] not in sent]
+    if broken:
+        raise AssertionError(f"{len(broken)} rows lost their parent, e.g. {broken[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--kernel-threads", type=int, default=400)
+    parser.add_argument("--processes", type=int, default=600)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    processes = build_processes(args.kernel_threads, args.processes)
+    encoder = PayloadEncoder("columnar")
+    settings = (
+        ("off", None),
+        ("fold_idle", ProcessFilter(fold_idle=True)),
+        ("fold_idle + top_k 50", ProcessFilter(fold_idle=True, top_k=50)),
+        ("min_cpu 1 + include sshd", ProcessFilter(min_cpu=1.0, include=["sshd"])),
+        ("exclude kworker/* + top_k 20", ProcessFilter(exclude=["kworker/*"], top_k=20)),
+    )
+    print(f"{'setting':<30} {'rows':>6} {'json KB':>8} {'upload KB':>10} {'filter ms':>10} {'encode ms':>10}")
+    for label, process_filter in settings:
+        best_filter = best_encode = float("inf")
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            rows = process_filter.apply(processes) if process_filter else processes
+            best_filter = min(best_filter, time.perf_counter() - start)
+            snapshot = {"hostdetails": {"hostname": "bench"}, "snapshot_time": "2025-01-01T00:00:00",
+                        "processes": rows}
+            start = time.perf_counter()
+            line = json.dumps(snapshot)
+            body, _ = encoder.encode([snapshot])
+            best_encode = min(best_encode, time.perf_counter() - start)
+        check_tree(processes, rows)
+        print(f"{label:<30} {len(rows):>6} {len(line) / 1024:>8.1f} {len(body) / 1024:>10.1f} "
+              f"{best_filter * 1000:>10.2f} {best_encode * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
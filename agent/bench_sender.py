@@ -0,0 +1,84 @@
+"""
+Measure per-send latency and server connection load for the uploader.
+
+    python bench_sender.py [--sends 500] [--payload-kb 20]
+
+Starts a local HTTP/1.1 stand-in for /api/ingest/ that counts accepted TCP
+connections, then uploads the same payload with one-off requests.post calls
+and with the persistent session from sender.create_session.
+"""
+
+import argparse
+import os
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from sender import create_session
+
+
+class IngestStandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = b'{"created": []}'
+        self.send_response(201)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class CountingServer(ThreadingHTTPServer):
+    daemon_threads = True
+    connections = 0
+
+    def get_request(self):
+        request = super().get_request()
+        self.connections += 1
+        return request
+
+
+def run(post, url, body, sends):
+    headers = {"Authorization": "ApiKey bench", "Content-Type": "application/octet-stream"}
+    latencies = []
+    for _ in range(sends):
+        start = time.perf_counter()
+        post(url, data=body, headers=headers, timeout=10).raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sends", type=int, default=500)
+    parser.add_argument("--payload-kb", type=int, default=20)
+    args = parser.parse_args()
+
+    server = CountingServer(("127.0.0.1", 0), IngestStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/ingest/"
+    body = os.urandom(args.payload_kb * 1024)
+
+    print(f"{'client':>10} {'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'connections':>12}")
+    for label, post in (("requests", requests.post), ("session", create_session({}).post)):
+        before = server.connections
+        lat = run(post, url, body, args.sends)
+        p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))]
+        print(f"{label:>10} {statistics.mean(lat):>8.2f} {statistics.median(lat):>8.2f} "
+              f"{p99:>8.2f} {server.connections - before:>12}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,32 @@ def load_config():
         "endpoint": os.getenv("ENDPOINT", "http://127.0.0.1:8000/api/ingest/"),
         "api_key": os.getenv("API_KEY", "mysecretapikey"),
         "interval": int(os.getenv("INTERVAL", "5")),
+        "adaptive": os.getenv("ADAPTIVE", "false").lower() == "true",
+        "max_interval": int(os.getenv("MAX_INTERVAL", "60")),
+        "cpu_spike": float(os.getenv("CPU_SPIKE", "20")),
+        "rss_spike": float(os.getenv("RSS_SPIKE", "0.2")),
+        "churn_spike": float(os.getenv("CHURN_SPIKE", "0.05")),
         "max_retries": int(os.getenv("MAX_RETRIES", "5")),
+        "collector": os.getenv("COLLECTOR", "psutil"),
+        "delta": os.getenv("DELTA", "true").lower() == "true",
+        "keyframe_interval": int(os.getenv("KEYFRAME_INTERVAL", "12")),
+        "wire_format": os.getenv("WIRE_FORMAT", "columnar"),
+        "spool_path": os.getenv("SPOOL_PATH", "agent_spool.jsonl"),
+        "spool_max_mb": float(os.getenv("SPOOL_MAX_MB", "50")),
+        "batch_size": int(os.getenv("BATCH_SIZE", "20")),
+        "backoff_base": float(os.getenv("BACKOFF_BASE", "1")),
+        "backoff_max": float(os.getenv("BACKOFF_MAX", "30")),
+        "http2": os.getenv("HTTP2", "false").lower() == "true",
+        "metrics_port": int(os.getenv("METRICS_PORT", "0")),
+        "metrics_file": os.getenv("METRICS_FILE", ""),
+        "top_k": int(os.getenv("TOP_K", "0")),
+        "min_cpu": float(os.getenv("MIN_CPU", "0")),
+        "min_rss": int(os.getenv("MIN_RSS", "0")),
+        "include": [p for p in os.getenv("INCLUDE", "").split(",") if p],
+        "exclude": [p for p in os.getenv("EXCLUDE", "").split(",") if p],
+        "fold_idle": os.getenv("FOLD_IDLE", "false").lower() == "true",
+        "idle_cpu": float(os.getenv("IDLE_CPU", "0")),
+        "host_info_interval": int(os.getenv("HOST_INFO_INTERVAL", "3600")),
     }
  
 
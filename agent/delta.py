@@ -0,0 +1,60 @@
+import uuid
+
+FIELDS = ("ppid", "name", "cpu_percent", "rss_bytes", "start_time")
+
+
+class DeltaEncoder:
+
+    """
+    Turns full process lists into keyframes and deltas.
+
+    Every ``keyframe_interval`` snapshots (and after reset()) the full list is
+    sent; in between only added processes, removed PIDs and changed fields are
+    sent. ``stream`` changes whenever the agent restarts so the server can tell
+    that its state for this host is stale.
+    """
+
+    def __init__(self, keyframe_interval=12):
+        self.keyframe_interval = keyframe_interval
+        self.stream = uuid.uuid4().hex
+        self.seq = 0
+        self._since_keyframe = None
+        self._prev = {}
+
+    def reset(self):
+        """Force the next snapshot to be a keyframe, e.g. after a failed send or a resync request."""
+        self._since_keyframe = None
+
+    def encode(self, snapshot):
+        processes = snapshot["processes"]
+        current = {p["pid"]: p for p in processes}
+        self.seq += 1
+
+        encoded = {k: v for k, v in snapshot.items() if k != "processes"}
+        encoded["stream"] = self.stream
+        encoded["seq"] = self.seq
+
+        if self._since_keyframe is None or self._since_keyframe >= self.keyframe_interval:
+            encoded["keyframe"] = True
+            encoded["processes"] = processes
+            self._since_keyframe = 1
+        else:
+            prev = self._prev
+            added = []
+            changed = []
+            for pid, p in current.items():
+                old = prev.get(pid)
+                if old is None:
+                    added.append(p)
+                    continue
+                # .get: snapshots spooled by an older agent carry no start_time
+                diff = {f: value for f in FIELDS if (value := p.get(f)) != old.get(f)}
+                if diff:
+                    diff["pid"] = pid
+                    changed.append(diff)
+            removed = [pid for pid in prev if pid not in current]
+            encoded["delta"] = {"added": added, "removed": removed, "changed": changed}
+            self._since_keyframe += 1
+
+        self._prev = current
+        return encoded
@@ -0,0 +1,195 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(9))  # 1 KiB .. 64 MiB
+
+_registry = []
+
+
+# shared with backend/api/metrics.py from here to render()
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._values[()] = self._zero()
+        _registry.append(self)
+
+    def _zero(self):
+        return 0
+
+    def _key(self, labels):
+        # str() so label values of mixed types (200, "error") still sort
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, value, *extra in self.samples():
+            lines.append(f"{name}{_format_labels(self.labelnames, key, *extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), function=None):
+        super().__init__(name, help, labels)
+        self.function = function
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.function is None:
+            return super().samples()
+        try:
+            value = self.function()
+        except Exception:
+            return []
+        return [(self.name, (), value)]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=TIME_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels)
+
+    def _zero(self):
+        return [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = self._zero()
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(state[0]), state[1], state[2]) for key, state in sorted(self._values.items())]
+        samples = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts):
+                cumulative += n
+                samples.append((f"{self.name}_bucket", key, cumulative, (("le", _format_value(bound)),)))
+            samples.append((f"{self.name}_sum", key, total))
+            samples.append((f"{self.name}_count", key, count))
+        return samples
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def write_file(path):
+
+    """
+    Write the metrics to ``path`` atomically, e.g. for node_exporter's
+    textfile collector.
+    """
+
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve the metrics over HTTP on a background thread."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+skipped_ticks = Counter("procmon_agent_skipped_ticks_total", "Sampling ticks skipped because a cycle overran them.")
+collect_seconds = Histogram("procmon_agent_collect_seconds", "Time to sample processes and host details.")
+processes = Gauge("procmon_agent_processes", "Processes in the latest sample.")
+sent_processes = Gauge("procmon_agent_sent_processes", "Process rows in the latest snapshot after filtering and folding.")
+payload_bytes = Histogram("procmon_agent_payload_bytes", "Upload size before and after compression.",
+                          ["stage"], buckets=SIZE_BUCKETS)
+send_seconds = Histogram("procmon_agent_send_seconds", "Latency of one ingest POST attempt.")
+send_responses = Counter("procmon_agent_send_responses_total",
+                         "Ingest POST attempts by HTTP status (\"error\" when no response).", ["status"])
+send_retries = Counter("procmon_agent_send_retries_total", "Ingest POSTs retried after a failure.")
+uploaded = Counter("procmon_agent_uploaded_snapshots_total", "Snapshots accepted by the server.")
+dropped = Counter("procmon_agent_dropped_snapshots_total", "Snapshots the server rejected for good.")
@@ -1,30 +1,163 @@
+import os
 import psutil
 import time
 
-def collect_process_data():
 
-    """Collect real CPU% and memory usage after warm-up and delay."""
+class ProcessSampler:
 
-    for p in psutil.process_iter():
-        try:
-            p.cpu_percent(interval=None)
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            continue
+    """
+    Single-pass process sampler.
+
+    Keeps the CPU times seen for every PID on the previous call and derives
+    CPU% from the delta, so no warm-up pass or sleep is needed. PIDs that
+    have exited are dropped on each call.
+    """
+
+    ATTRS = ["pid", "ppid", "name", "create_time", "cpu_times", "memory_info"]
+
+    def __init__(self):
+        self._prev = {}
+        self._prev_time = None
+
+    def sample(self):
+        now = time.monotonic()
+        elapsed = now - self._prev_time if self._prev_time is not None else 0.0
+
+        current = {}
+        processes = []
+        for p in psutil.process_iter(attrs=self.ATTRS, ad_value=None):
+            info = p.info
+            times = info["cpu_times"]
+            mem = info["memory_info"]
+            if times is None or mem is None:
+                continue
+
+            pid = info["pid"]
+            total = times.user + times.system
+            current[pid] = (info["create_time"], total)
+
+            cpu = 0.0
+            prev = self._prev.get(pid)
+            # a different create_time means the PID was reused by a new process
+            if prev and prev[0] == info["create_time"] and elapsed > 0:
+                cpu = round(max(total - prev[1], 0.0) / elapsed * 100, 1)
 
-    time.sleep(1.0)
+            processes.append({
+                "pid": pid,
+                "ppid": info["ppid"] or 0,
+                "name": info["name"] or "",
+                "cpu_percent": cpu,
+                "rss_bytes": mem.rss//10000,
+                "start_time": round(info["create_time"] or 0.0, 2)
+            })
 
-    processes = []
-    for p in psutil.process_iter(attrs=["pid", "ppid", "name", "memory_info"]):
+        self._prev = current
+        self._prev_time = now
+        return processes
+
+
+class ProcfsSampler:
+
+    """
+    Linux-only sampler that reads /proc/<pid>/stat and /proc/<pid>/statm
+    directly into a reused buffer instead of building a psutil.Process per PID.
+
+    Returns the same records as ProcessSampler. The process name is always
+    the kernel ``comm`` value; psutil may expand truncated names from cmdline.
+    Start times are computed from the boot time the way psutil does, so
+    both collectors report the same ``start_time`` for a process.
+    """
+
+    def __init__(self, procfs="/proc"):
+        self.procfs = procfs
+        self._clk_tck = os.sysconf("SC_CLK_TCK")
+        self._page_size = os.sysconf("SC_PAGE_SIZE")
+        self._boot_time = self._read_boot_time()
+        self._buf = bytearray(4096)
+        self._view = memoryview(self._buf)
+        self._prev = {}
+        self._prev_time = None
+
+    def _read_boot_time(self):
+        with open(f"{self.procfs}/stat", "rb") as f:
+            for line in f:
+                if line.startswith(b"btime "):
+                    return float(line.split()[1])
+        return 0.0
+
+    def _read(self, path):
+        fd = os.open(path, os.O_RDONLY)
         try:
-            with p.oneshot():
-                processes.append({
-                    "pid": p.pid,
-                    "ppid": p.ppid(),
-                    "name": p.name(),
-                    "cpu_percent": p.cpu_percent(interval=None),
-                    "rss_bytes": p.memory_info().rss//10000
-                })
-            
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            continue
-    return processes
+            n = os.readv(fd, [self._buf])
+        finally:
+            os.close(fd)
+        return bytes(self._view[:n])
+
+    def sample(self):
+        now = time.monotonic()
+        elapsed = now - self._prev_time if self._prev_time is not None else 0.0
+        clk_tck = self._clk_tck
+        page_size = self._page_size
+
+        current = {}
+        processes = []
+        for entry in os.listdir(self.procfs):
+            if not entry.isdigit():
+                continue
+            base = f"{self.procfs}/{entry}/"
+            try:
+                stat = self._read(base + "stat")
+                statm = self._read(base + "statm")
+            except (FileNotFoundError, ProcessLookupError, PermissionError):
+                continue
+
+            # comm may contain spaces and parentheses, so split around the last ")"
+            lpar = stat.find(b"(")
+            rpar = stat.rfind(b")")
+            fields = stat[rpar + 2:].split()
+            if len(fields) < 20:
+                continue
+
+            pid = int(entry)
+            start = int(fields[19])
+            total = (int(fields[11]) + int(fields[12])) / clk_tck
+            current[pid] = (start, total)
+
+            cpu = 0.0
+            prev = self._prev.get(pid)
+            if prev and prev[0] == start and elapsed > 0:
+                cpu = round(max(total - prev[1], 0.0) / elapsed * 100, 1)
+
+            processes.append({
+                "pid": pid,
+                "ppid": int(fields[1]),
+                "name": stat[lpar + 1:rpar].decode("utf-8", "replace"),
+                "cpu_percent": cpu,
+                "rss_bytes": int(statm.split(None, 2)[1]) * page_size//10000,
+                "start_time": round(self._boot_time + start / clk_tck, 2)
+            })
+
+        self._prev = current
+        self._prev_time = now
+        return processes
+
+
+def create_sampler(collector="psutil"):
+
+    """Return the sampler for the configured collector, falling back to psutil."""
+
+    if collector == "procfs":
+        if os.path.exists("/proc/self/stat"):
+            return ProcfsSampler()
+        print("⚠️ /proc not available, falling back to psutil collector")
+    return ProcessSampler()
+
+
+_sampler = ProcessSampler()
+
+
+def collect_process_data():
+
+    """Collect CPU% (delta since the previous call) and memory usage in one pass."""
+
+    return _sampler.sample()
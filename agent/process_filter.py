@@ -0,0 +1,144 @@
+import fnmatch
+import heapq
+import re
+import zlib
+
+# Aggregate rows get pids far above any real pid (Linux pid_max is 2^22),
+# derived from the name so they stay the same between snapshots and deltas
+# only carry their changed fields.
+AGGREGATE_PID_BASE = 1 << 30
+AGGREGATE_PID_SPAN = 1 << 24
+
+
+def _patterns(value):
+    if isinstance(value, str):
+        value = value.split(",")
+    value = [p.strip() for p in value or [] if p.strip()]
+    if not value:
+        return None
+    return re.compile("|".join(fnmatch.translate(p) for p in value))
+
+
+def fold_key(name):
+    """Name idle processes are grouped under: kernel threads such as ``kworker/0:1`` fold into ``kworker``."""
+    return name.split("/", 1)[0] or name
+
+
+class ProcessFilter:
+
+    """
+    Reduces a sampled process list before it is spooled and uploaded.
+
+    In order:
+
+    * processes whose name matches ``exclude`` are dropped;
+    * with ``fold_idle``, processes at or below ``idle_cpu`` that have no
+      children and do not match ``include`` are folded into one row per
+      fold_key(name), named ``"<key> (idle)"``, with summed CPU and RSS and
+      the members' common ppid (0 if they differ);
+    * of the rest, processes matching ``include`` are kept, and so are those
+      reaching ``min_cpu`` or ``min_rss`` (whichever are set), cut to the
+      ``top_k`` heaviest by CPU plus the ``top_k`` heaviest by RSS;
+    * the ancestors of every row that is sent are added back, so each ppid
+      points at a row in the same snapshot and the dashboard tree stays
+      intact. Folding only ever takes leaves, so an ancestor is never also
+      counted in an aggregate.
+    """
+
+    def __init__(self, top_k=0, min_cpu=0.0, min_rss=0, include=None, exclude=None, fold_idle=False, idle_cpu=0.0):
+        self.top_k = top_k
+        self.min_cpu = min_cpu
+        self.min_rss = min_rss
+        self.include = _patterns(include)
+        self.exclude = _patterns(exclude)
+        self.fold_idle = fold_idle
+        self.idle_cpu = idle_cpu
+
+    @classmethod
+    def from_config(cls, config):
+        """The filter configured in agentconfig.json, or None when it would keep everything."""
+        process_filter = cls(
+            top_k=int(config["top_k"]),
+            min_cpu=float(config["min_cpu"]),
+            min_rss=int(config["min_rss"]),
+            include=config["include"],
+            exclude=config["exclude"],
+            fold_idle=bool(config["fold_idle"]),
+            idle_cpu=float(config["idle_cpu"]),
+        )
+        if not (process_filter.top_k or process_filter.min_cpu or process_filter.min_rss
+                or process_filter.exclude or process_filter.fold_idle):
+            return None
+        return process_filter
+
+    def _significant(self, p):
+        if not (self.min_cpu or self.min_rss):
+            return True
+        return (bool(self.min_cpu) and p["cpu_percent"] >= self.min_cpu
+                or bool(self.min_rss) and p["rss_bytes"] >= self.min_rss)
+
+    def apply(self, processes):
+        if self.exclude is not None:
+            processes = [p for p in processes if not self.exclude.match(p["name"])]
+        by_pid = {p["pid"]: p for p in processes}
+        include = self.include
+
+        folded = []
+        if self.fold_idle:
+            parents = {p["ppid"] for p in processes}
+            rest = []
+            for p in processes:
+                if (p["cpu_percent"] <= self.idle_cpu and p["pid"] not in parents
+                        and not (include is not None and include.match(p["name"]))):
+                    folded.append(p)
+                else:
+                    rest.append(p)
+            processes = rest
+
+        kept = []
+        candidates = []
+        for p in processes:
+            if include is not None and include.match(p["name"]):
+                kept.append(p)
+            elif self._significant(p):
+                candidates.append(p)
+        if self.top_k and len(candidates) > self.top_k:
+            top = {p["pid"]: p for p in heapq.nlargest(self.top_k, candidates, key=lambda p: p["cpu_percent"])}
+            top.update((p["pid"], p) for p in heapq.nlargest(self.top_k, candidates, key=lambda p: p["rss_bytes"]))
+            candidates = list(top.values())
+        kept.extend(candidates)
+
+        rows = kept + self._aggregate(folded)
+        sent = {p["pid"] for p in rows}
+        for p in list(rows):
+            parent = by_pid.get(p["ppid"])
+            while parent is not None and parent["pid"] not in sent:
+                rows.append(parent)
+                sent.add(parent["pid"])
+                parent = by_pid.get(parent["ppid"])
+        return rows
+
+    def _aggregate(self, folded):
+        groups = {}
+        for p in folded:
+            groups.setdefault(fold_key(p["name"]), []).append(p)
+        rows = []
+        taken = set()
+        for key in sorted(groups):
+            members = groups[key]
+            ppids = {p["ppid"] for p in members}
+            # names that hash to the same slot take the next free one
+            pid = AGGREGATE_PID_BASE + zlib.crc32(key.encode("utf-8")) % AGGREGATE_PID_SPAN
+            while pid in taken:
+                pid = AGGREGATE_PID_BASE + (pid + 1 - AGGREGATE_PID_BASE) % AGGREGATE_PID_SPAN
+            taken.add(pid)
+            rows.append({
+                "pid": pid,
+                "ppid": ppids.pop() if len(ppids) == 1 else 0,
+                "name": f"{key} (idle)",
+                "cpu_percent": round(sum(p["cpu_percent"] for p in members), 1),
+                "rss_bytes": sum(p["rss_bytes"] for p in members),
+                # an aggregate is no single process; 0 is "unknown"
+                "start_time": 0.0,
+            })
+        return rows
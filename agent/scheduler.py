@@ -0,0 +1,98 @@
+import time
+
+import metrics
+
+
+class AdaptiveInterval:
+
+    """
+    Sampling interval that follows how much the host is changing.
+
+    After each sample the interval either drops straight to
+    ``min_interval`` on a spike, or grows by ``growth`` up to
+    ``max_interval`` while things are stable. A spike is any of:
+
+    * a process whose CPU% rose by at least ``cpu_spike`` points (or a new
+      process already at that level);
+    * total RSS moving by at least ``rss_spike`` (a fraction) either way;
+    * at least ``churn_spike`` of the processes (a fraction) started or
+      exited since the previous sample.
+    """
+
+    def __init__(self, min_interval, max_interval, cpu_spike=20.0, rss_spike=0.2, churn_spike=0.05, growth=1.5):
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.cpu_spike = cpu_spike
+        self.rss_spike = rss_spike
+        self.churn_spike = churn_spike
+        self.growth = growth
+        self.interval = min_interval
+        self._prev = None
+        self._prev_rss = 0
+
+    def _spiked(self, current, total_rss):
+        prev = self._prev
+        churn = sum(1 for pid in current if pid not in prev) + sum(1 for pid in prev if pid not in current)
+        if churn >= self.churn_spike * max(len(prev), 1):
+            return True
+        if self._prev_rss and abs(total_rss - self._prev_rss) >= self.rss_spike * self._prev_rss:
+            return True
+        for pid, cpu in current.items():
+            if cpu - prev.get(pid, 0.0) >= self.cpu_spike:
+                return True
+        return False
+
+    def update(self, processes):
+        """Feed the full (unfiltered) sample; returns the interval until the next one."""
+        current = {p["pid"]: p["cpu_percent"] for p in processes}
+        total_rss = sum(p["rss_bytes"] for p in processes)
+        if self._prev is not None:
+            if self._spiked(current, total_rss):
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.max_interval, self.interval * self.growth)
+        self._prev = current
+        self._prev_rss = total_rss
+        return self.interval
+
+
+class Scheduler:
+
+    """
+    Fixed-cadence sampling clock.
+
+    Sample n is due at ``start + n * interval`` on the monotonic clock, so
+    the time spent collecting and spooling does not push later samples
+    back. If a cycle overruns one or more ticks, those ticks are skipped
+    rather than run back to back.
+
+    The interval in force is, in order: the one the server sent in its
+    last ingest response (``server_interval``), the adaptive one, and the
+    configured ``interval``.
+    """
+
+    def __init__(self, interval, adaptive=None):
+        self.interval = interval
+        self.adaptive = adaptive
+        self.server_interval = None
+        self._next = None
+
+    def current_interval(self):
+        if self.server_interval:
+            return self.server_interval
+        if self.adaptive is not None:
+            return self.adaptive.interval
+        return self.interval
+
+    def wait(self):
+        """Sleep until the next tick."""
+        now = time.monotonic()
+        interval = self.current_interval()
+        if self._next is None:
+            self._next = now
+        self._next += interval
+        if self._next < now:
+            missed = int((now - self._next) // interval) + 1
+            self._next += missed * interval
+            metrics.skipped_ticks.inc(missed)
+        time.sleep(self._next - now)
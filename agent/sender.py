@@ -1,26 +1,174 @@
+import random
+import threading
 import time
 import requests
+from requests.adapters import HTTPAdapter
 
-def send_data(data, config):
+import metrics
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+def create_session(config):
+    """
+    Long-lived HTTP client so uploads reuse one keep-alive connection
+    (and TLS session) instead of reconnecting every cycle. Uses httpx with
+    HTTP/2 when "http2" is enabled, the endpoint is https:// and
+    httpx[http2] is installed; HTTP/2 is only negotiated over TLS.
+
+    """
+    if config.get("http2") and not config["endpoint"].lower().startswith("https://"):
+        print("⚠️ http2 needs an https:// endpoint (no HTTP/2 over plain http), using HTTP/1.1")
+    elif config.get("http2"):
+        if httpx is not None:
+            try:
+                return httpx.Client(http2=True, timeout=10)
+            except ImportError:
+                pass
+        print("⚠️ http2 requested but httpx[http2] is not installed, using HTTP/1.1")
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def backoff_delay(attempt, config):
+    """Full-jitter exponential backoff, so agents don't retry in lockstep after an outage."""
+    cap = min(config["backoff_max"], config["backoff_base"] * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
+def send_data(body, content_headers, config, session=None):
+    """
+    POST an encoded payload to the ingest endpoint, retrying with backoff.
+    Returns the response on success, on 415 (so the caller can renegotiate
+    the wire format), on 400/413 (the server will never accept this body),
+    or None once all retries have failed.
+
+    """
     headers = {
         "Authorization": f"ApiKey {config['api_key']}",
-        "Content-Type": "application/json"
+        **content_headers
     }
     url = config["endpoint"]
+    client = session or requests
 
-    backoff = 1
     for attempt in range(config["max_retries"]):
+        start = time.perf_counter()
         try:
-            response = requests.post(url, json={"payload": data}, headers=headers, timeout=10)
-            if response.status_code in (200, 201):
-                return True
+            if httpx is not None and isinstance(client, httpx.Client):
+                response = client.post(url, content=body, headers=headers)
+            else:
+                response = client.post(url, data=body, headers=headers, timeout=10)
+            metrics.send_seconds.observe(time.perf_counter() - start)
+            metrics.send_responses.inc(status=response.status_code)
+            if response.status_code in (200, 201, 202, 400, 413, 415):
+                return response
             else:
                 print(f"Server returned {response.status_code}: {response.text}")
         except Exception as e:
+            response = None
+            metrics.send_responses.inc(status="error")
             print(f" Send failed: {e}")
 
-        print(f" Retrying in {backoff}s...")
-        time.sleep(backoff)
-        backoff *= 2 
+        if attempt + 1 < config["max_retries"]:
+            metrics.send_retries.inc()
+            delay = backoff_delay(attempt, config)
+            if response is not None and response.status_code == 429:
+                try:
+                    delay = float(response.headers.get("Retry-After", delay))
+                except ValueError:
+                    pass
+            print(f" Retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+    return None
+
+
+class SpoolSender(threading.Thread):
+    """
+    Background uploader that drains the spool in batches, so a slow or
+    unreachable backend never stalls sampling. Snapshots stay in the spool
+    until the server has accepted them. An "interval" in the server's
+    response is passed on to the scheduler.
+
+    """
+
+    def __init__(self, spool, payload_encoder, delta_encoder, config, scheduler=None):
+        super().__init__(name="spool-sender", daemon=True)
+        self.spool = spool
+        self.payload_encoder = payload_encoder
+        self.delta_encoder = delta_encoder
+        self.config = config
+        self.scheduler = scheduler
+        self.session = create_session(config)
+
+    def run(self):
+        while True:
+            try:
+                self.drain_once()
+            except Exception as e:
+                print(f" Sender error: {e}")
+                self.spool.release()
+                time.sleep(self.config["interval"])
+
+    def _encode(self, items):
+        if self.delta_encoder:
+            items = [self.delta_encoder.encode(s) for s in items]
+        return self.payload_encoder.encode(items)
+
+    def drain_once(self):
+        items, token = self.spool.peek(self.config["batch_size"], timeout=self.config["interval"])
+        if not items:
+            return
+
+        body, headers = self._encode(items)
+        response = send_data(body, headers, self.config, self.session)
+        while response is not None and self.payload_encoder.negotiate(response):
+            if self.delta_encoder:
+                self.delta_encoder.reset()
+            body, headers = self._encode(items)
+            response = send_data(body, headers, self.config, self.session)
+
+        if response is not None and response.status_code in (400, 413):
+            # retrying cannot help, and keeping the batch would block the spool for good
+            print(f" Server rejected {len(items)} snapshot(s) ({response.status_code}: {response.text}); dropping them")
+            self.spool.commit(token)
+            metrics.dropped.inc(len(items))
+            if self.delta_encoder:
+                self.delta_encoder.reset()
+        elif response is not None and response.status_code in (200, 201, 202):
+            self.spool.commit(token)
+            result = response.json()
+            invalid = result.get("invalid") or []
+            if invalid:
+                # the rest of the batch was stored; the server skipped only these
+                print(f" Server skipped {len(invalid)} invalid snapshot(s), first: {invalid[0].get('detail')}")
+                metrics.dropped.inc(len(invalid))
+            metrics.uploaded.inc(len(items) - len(invalid))
+            print(f" Uploaded {len(items) - len(invalid)} snapshot(s) ({len(body)} bytes)")
+            if self.delta_encoder and result.get("resync"):
+                print(" Server requested resync, next snapshot is a keyframe")
+                self.delta_encoder.reset()
+            if self.scheduler is not None:
+                self._apply_interval(result.get("interval"))
+        else:
+            print(" Failed to send data, keeping snapshots in spool")
+            self.spool.release()
+            if self.delta_encoder:
+                self.delta_encoder.reset()
+            time.sleep(self.config["interval"])
 
-    return False
+    def _apply_interval(self, interval):
+        """Follow the interval set on the server; a response without one hands control back to the config."""
+        if not isinstance(interval, (int, float)) or isinstance(interval, bool) or interval <= 0:
+            interval = None
+        if interval != self.scheduler.server_interval:
+            print(f" Server set the sampling interval to {interval}s" if interval else
+                  " Server interval cleared, using the configured one")
+            self.scheduler.server_interval = interval
@@ -0,0 +1,116 @@
+import json
+import os
+import threading
+
+
+class Spool:
+
+    """
+    Append-only on-disk queue of snapshots (one JSON document per line).
+
+    The sampler appends; a single sender peeks a batch, uploads it and then
+    commits it. The read offset is persisted next to the spool file so
+    unsent snapshots survive a restart. When the unsent data grows past
+    ``max_bytes`` the oldest snapshots are dropped.
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.offset_path = path + ".offset"
+        self.max_bytes = max_bytes
+        self._cond = threading.Condition()
+        self._inflight = False
+        self.evicted = 0
+
+        open(self.path, "ab").close()
+        self._offset = 0
+        if os.path.exists(self.offset_path):
+            try:
+                with open(self.offset_path, "r") as f:
+                    self._offset = min(int(f.read().strip() or 0), os.path.getsize(self.path))
+            except (OSError, ValueError):
+                self._offset = 0
+
+    def pending_bytes(self):
+        return os.path.getsize(self.path) - self._offset
+
+    def append(self, snapshot):
+        line = json.dumps(snapshot).encode("utf-8") + b"\n"
+        with self._cond:
+            with open(self.path, "ab") as f:
+                f.write(line)
+            if self.pending_bytes() > self.max_bytes:
+                self._evict()
+            self._cond.notify()
+
+    def peek(self, max_items, timeout=None):
+        """
+        Return up to ``max_items`` of the oldest unsent snapshots and a token
+        to pass to commit(). Waits up to ``timeout`` seconds for data.
+        """
+        with self._cond:
+            if self.pending_bytes() <= 0:
+                self._cond.wait(timeout)
+            items = []
+            end = self._offset
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    end += len(line)
+                    try:
+                        items.append(json.loads(line))
+                    except ValueError:
+                        continue
+                    if len(items) >= max_items:
+                        break
+            self._inflight = end > self._offset
+            return items, end
+
+    def commit(self, token):
+        """Mark everything up to ``token`` (from peek) as sent."""
+        with self._cond:
+            self._inflight = False
+            self._offset = max(self._offset, token)
+            self._compact()
+            self._save_offset()
+
+    def release(self):
+        """Give up on the batch returned by peek(); it will be returned again."""
+        with self._cond:
+            self._inflight = False
+            self._compact()
+
+    def _evict(self):
+        target = self.max_bytes * 0.9
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            for line in f:
+                if self.pending_bytes() <= target:
+                    break
+                self._offset += len(line)
+                self.evicted += 1
+        print(f"⚠️ Spool full, dropped oldest snapshots ({self.evicted} so far)")
+        if not self._inflight:
+            self._compact()
+        self._save_offset()
+
+    def _compact(self):
+        # rewrite the file once the sent/evicted prefix dominates it
+        if self._inflight or self._offset == 0:
+            return
+        size = os.path.getsize(self.path)
+        if self._offset < size and self._offset < self.max_bytes:
+            return
+        tmp = self.path + ".tmp"
+        with open(self.path, "rb") as src, open(tmp, "wb") as dst:
+            src.seek(self._offset)
+            dst.write(src.read())
+        os.replace(tmp, self.path)
+        self._offset = 0
+        self._save_offset()
+
+    def _save_offset(self):
+        with open(self.offset_path, "w") as f:
+            f.write(str(self._offset))
@@ -1,21 +1,69 @@
 import platform
 import psutil
 import socket
+import time
 
-def get_system_info():
-    ram = psutil.virtual_memory()
-    disk = psutil.disk_usage('/')
-    
+GB = 1024 ** 3
+
+
+def get_static_info():
+    """Facts that only change on reboot or reconfiguration; platform.processor() may fork a subprocess."""
     return {
         "hostname": socket.gethostname(),
         "os": f"{platform.system()} {platform.release()}",
         "processor": platform.processor(),
         "physical_cores": psutil.cpu_count(logical=False),
         "logical_cores": psutil.cpu_count(logical=True),
-        "ram_total_gb": round(ram.total / (1024**3), 2),
-        "ram_used_gb": round(ram.used / (1024**3), 2),
-        "ram_available_gb": round(ram.available / (1024**3), 2),
-        "disk_total_gb": round(disk.total / (1024**3), 2),
-        "disk_used_gb": round(disk.used / (1024**3), 2),
-        "disk_free_gb": round(disk.free / (1024**3), 2),
     }
+
+
+def get_host_metrics():
+    """RAM and disk figures, read on every sample."""
+    ram = psutil.virtual_memory()
+    disk = psutil.disk_usage('/')
+
+    return {
+        "ram_total_gb": round(ram.total / GB, 2),
+        "ram_used_gb": round(ram.used / GB, 2),
+        "ram_available_gb": round(ram.available / GB, 2),
+        "disk_total_gb": round(disk.total / GB, 2),
+        "disk_used_gb": round(disk.used / GB, 2),
+        "disk_free_gb": round(disk.free / GB, 2),
+    }
+
+
+class HostInfo:
+
+    """
+    Host details for each snapshot, split into static facts and metrics.
+
+    Static facts (OS, processor, core counts, RAM and disk totals) are
+    collected at start and again every ``refresh_interval`` seconds, and
+    sent in ``hostdetails`` only when they differ from what was last sent,
+    or on that refresh so a server that missed them catches up. Otherwise
+    ``hostdetails`` carries just the hostname. RAM and disk use go in
+    ``host_metrics`` with every snapshot.
+    """
+
+    TOTALS = ("ram_total_gb", "disk_total_gb")
+
+    def __init__(self, refresh_interval=3600):
+        self.refresh_interval = refresh_interval
+        self._static = None
+        self._sent = None
+        self._collected_at = None
+
+    def collect(self):
+        """Returns (hostdetails, host_metrics) for the next snapshot."""
+        now = time.monotonic()
+        refresh = self._static is None or (self.refresh_interval
+                                           and now - self._collected_at >= self.refresh_interval)
+        if refresh:
+            self._static = get_static_info()
+            self._collected_at = now
+        host_metrics = get_host_metrics()
+        static = {**self._static, **{key: host_metrics.pop(key) for key in self.TOTALS}}
+        if refresh or static != self._sent:
+            self._sent = static
+            return dict(static), host_metrics
+        return {"hostname": static["hostname"]}, host_metrics
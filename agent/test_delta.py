@@ -0,0 +1,123 @@
+import metrics
+import sender
+from delta import DeltaEncoder
+from scheduler import Scheduler
+from sender import SpoolSender
+from spool import Spool
+from wire import PayloadEncoder
+
+
+def proc(pid, cpu=1.0, rss=100, ppid=1, name=None):
+    return {"pid": pid, "ppid": ppid, "name": name or f"p{pid}", "cpu_percent": cpu, "rss_bytes": rss}
+
+
+def snap(processes):
+    return {"hostdetails": {"hostname": "h"}, "snapshot_time": "t", "processes": processes}
+
+
+def test_keyframe_every_interval():
+    encoder = DeltaEncoder(keyframe_interval=3)
+    encoded = [encoder.encode(snap([proc(1)])) for _ in range(7)]
+    assert [s["seq"] for s in encoded] == list(range(1, 8))
+    assert [bool(s.get("keyframe")) for s in encoded] == [True, False, False, True, False, False, True]
+    assert len({s["stream"] for s in encoded}) == 1
+    assert encoded[0]["processes"] == [proc(1)]
+    assert "processes" not in encoded[1]
+
+
+def test_delta_carries_only_differences():
+    encoder = DeltaEncoder(keyframe_interval=10)
+    encoder.encode(snap([proc(1), proc(2), proc(3)]))
+    encoded = encoder.encode(snap([proc(1), proc(2, cpu=5.0), proc(4)]))
+    assert encoded["delta"] == {"added": [proc(4)], "removed": [3], "changed": [{"pid": 2, "cpu_percent": 5.0}]}
+    assert encoded["hostdetails"] == {"hostname": "h"}
+
+
+def test_reused_pid_changes_start_time():
+    encoder = DeltaEncoder(keyframe_interval=10)
+    encoder.encode(snap([{**proc(1), "start_time": 100.0}]))
+    encoded = encoder.encode(snap([{**proc(1), "start_time": 160.5}]))
+    assert encoded["delta"]["changed"] == [{"pid": 1, "start_time": 160.5}]
+
+
+def test_reset_forces_keyframe():
+    encoder = DeltaEncoder(keyframe_interval=10)
+    encoder.encode(snap([proc(1)]))
+    encoder.reset()
+    encoded = encoder.encode(snap([proc(1)]))
+    assert encoded["keyframe"] and encoded["seq"] == 2
+
+
+def test_restart_starts_a_new_stream():
+    assert DeltaEncoder().stream != DeltaEncoder().stream
+
+
+class Response:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body or {}
+        self.text = str(body)
+        self.headers = {}
+
+    def json(self):
+        return self.body
+
+
+def make_sender(tmp_path, monkeypatch, responses):
+    config = {"endpoint": "http://127.0.0.1:8000/api/ingest/", "http2": False, "batch_size": 10, "interval": 0}
+    spool = Spool(str(tmp_path / "spool"), 1 << 20)
+    sent = []
+
+    def send_data(body, headers, config, session=None):
+        sent.append(body)
+        return responses.pop(0)
+
+    monkeypatch.setattr(sender, "send_data", send_data)
+    monkeypatch.setattr(sender.time, "sleep", lambda s: None)
+    encoder = DeltaEncoder(keyframe_interval=10)
+    return SpoolSender(spool, PayloadEncoder("json"), encoder, config), spool, encoder
+
+
+def test_resync_response_sends_keyframe_next(tmp_path, monkeypatch):
+    spool_sender, spool, encoder = make_sender(tmp_path, monkeypatch, [Response(201), Response(201, {"resync": ["h"]})])
+    for _ in range(2):
+        spool.append(snap([proc(1)]))
+        spool_sender.drain_once()
+    assert encoder.encode(snap([proc(1)]))["keyframe"]
+
+
+def test_failed_send_keeps_batch_and_sends_keyframe_next(tmp_path, monkeypatch):
+    spool_sender, spool, encoder = make_sender(tmp_path, monkeypatch, [Response(201), None])
+    spool.append(snap([proc(1)]))
+    spool_sender.drain_once()
+    spool.append(snap([proc(2)]))
+    spool_sender.drain_once()
+    items, _ = spool.peek(10, timeout=0)
+    assert items == [snap([proc(2)])]
+    assert encoder.encode(snap([proc(2)]))["keyframe"]
+
+
+def test_skipped_snapshots_are_counted_as_dropped(tmp_path, monkeypatch):
+    invalid = [{"index": 0, "detail": "[0].snapshot_time: expected a string"}]
+    spool_sender, spool, _ = make_sender(tmp_path, monkeypatch, [Response(201, {"invalid": invalid})])
+    dropped, uploaded = metrics.dropped._values[()], metrics.uploaded._values[()]
+    spool.append(snap([proc(1)]))
+    spool.append(snap([proc(2)]))
+    spool_sender.drain_once()
+    assert spool.peek(10, timeout=0)[0] == []
+    assert metrics.dropped._values[()] - dropped == 1
+    assert metrics.uploaded._values[()] - uploaded == 1
+
+
+def test_server_interval_overrides_until_cleared(tmp_path, monkeypatch):
+    responses = [Response(201, {"interval": 30}), Response(201, {"interval": True}), Response(201, {"interval": 15}),
+                 Response(201)]
+    spool_sender, spool, _ = make_sender(tmp_path, monkeypatch, responses)
+    spool_sender.scheduler = Scheduler(10)
+    seen = []
+    for _ in range(4):
+        spool.append(snap([proc(1)]))
+        spool_sender.drain_once()
+        seen.append(spool_sender.scheduler.current_interval())
+    # booleans are not intervals; a response without one hands control back to the config
+    assert seen == [30, 10, 15, 10]
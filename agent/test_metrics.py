@@ -0,0 +1,25 @@
+import metrics
+
+
+def test_label_values_are_escaped():
+    counter = metrics.Counter("procmon_agent_test_total", "Test.", ["status"])
+    metrics._registry.remove(counter)
+    counter.inc(status='bad "quote"\\\n')
+    counter.inc(status=200)
+    assert counter.render()[2:] == [
+        'procmon_agent_test_total{status="200"} 1',
+        'procmon_agent_test_total{status="bad \\"quote\\"\\\\\\n"} 1',
+    ]
+
+
+def test_histogram_buckets():
+    histogram = metrics.Histogram("procmon_agent_test_seconds", "Test.", buckets=(1, 2))
+    metrics._registry.remove(histogram)
+    histogram.observe(1.5)
+    assert histogram.render()[2:] == [
+        'procmon_agent_test_seconds_bucket{le="1"} 0',
+        'procmon_agent_test_seconds_bucket{le="2"} 1',
+        'procmon_agent_test_seconds_bucket{le="+Inf"} 1',
+        "procmon_agent_test_seconds_sum 1.5",
+        "procmon_agent_test_seconds_count 1",
+    ]
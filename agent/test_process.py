@@ -0,0 +1,26 @@
+import os
+
+import psutil
+import pytest
+
+from process import ProcessSampler, ProcfsSampler
+from wire import pack_columnar
+
+
+def own(records):
+    return next(p for p in records if p["pid"] == os.getpid())
+
+
+def test_psutil_sampler_reports_start_time():
+    assert own(ProcessSampler().sample())["start_time"] == round(psutil.Process().create_time(), 2)
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/stat"), reason="needs procfs")
+def test_collectors_agree_on_start_time():
+    # the series API splits a pid's samples on start_time, so switching collectors must not change it
+    assert abs(own(ProcfsSampler().sample())["start_time"] - own(ProcessSampler().sample())["start_time"]) <= 0.01
+
+
+def test_spooled_snapshots_without_start_time_still_pack():
+    old = {"pid": 1, "ppid": 0, "name": "init", "cpu_percent": 0.5, "rss_bytes": 10}
+    assert pack_columnar([{"snapshot_time": "t", "processes": [old]}]).startswith(b"PMC2")
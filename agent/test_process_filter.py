@@ -0,0 +1,95 @@
+from process_filter import AGGREGATE_PID_BASE, AGGREGATE_PID_SPAN, ProcessFilter
+
+
+def proc(pid, ppid, name, cpu=0.0, rss=0):
+    return {"pid": pid, "ppid": ppid, "name": name, "cpu_percent": cpu, "rss_bytes": rss, "start_time": 100.0}
+
+
+def tree():
+    return [
+        proc(1, 0, "systemd", 0.1, 1200),
+        proc(2, 0, "kthreadd"),
+        proc(10, 2, "kworker/0:1"),
+        proc(11, 2, "kworker/1:0", 0.2),
+        proc(12, 2, "kworker/u8:2", 0.0, 4),
+        proc(100, 1, "sshd", 0.0, 500),
+        proc(200, 100, "bash", 0.0, 300),
+        proc(201, 200, "heavy", 50.0, 100),
+        proc(202, 1, "fat", 1.0, 90000),
+        *(proc(pid, 1, "worker", 2.0, 10) for pid in range(300, 305)),
+    ]
+
+
+def pids(rows):
+    return {p["pid"] for p in rows}
+
+
+def assert_tree_closed(rows):
+    sent = pids(rows)
+    assert all(p["ppid"] == 0 or p["ppid"] in sent for p in rows)
+
+
+def config(**overrides):
+    return {"top_k": 0, "min_cpu": 0, "min_rss": 0, "include": "", "exclude": "", "fold_idle": False,
+            "idle_cpu": 0, **overrides}
+
+
+def test_fold_idle_leaves_into_one_row_per_key():
+    rows = ProcessFilter(fold_idle=True, idle_cpu=0.5).apply(tree())
+    folded = {p["name"]: p for p in rows if p["pid"] >= AGGREGATE_PID_BASE}
+    # kthreadd has children and stays; the idle sshd/bash chain leads to a busy process
+    assert {2, 100, 200, 201} <= pids(rows)
+    kworker = folded["kworker (idle)"]
+    assert kworker["ppid"] == 2
+    assert kworker["cpu_percent"] == 0.2 and kworker["rss_bytes"] == 4
+    assert AGGREGATE_PID_BASE <= kworker["pid"] < AGGREGATE_PID_BASE + AGGREGATE_PID_SPAN
+    assert not pids(rows) & {10, 11, 12}
+    assert_tree_closed(rows)
+
+
+def test_aggregate_pids_are_stable():
+    first = ProcessFilter(fold_idle=True).apply(tree())
+    again = ProcessFilter(fold_idle=True).apply(list(reversed(tree())))
+    assert ({p["name"]: p["pid"] for p in first if p["pid"] >= AGGREGATE_PID_BASE}
+            == {p["name"]: p["pid"] for p in again if p["pid"] >= AGGREGATE_PID_BASE})
+
+
+def test_fold_spares_busy_and_included_processes():
+    rows = ProcessFilter(fold_idle=True, idle_cpu=0.1, include="kworker/0*").apply(tree())
+    # 10 is idle but included, 11 is above idle_cpu; only 12 is folded
+    assert {10, 11} <= pids(rows)
+    assert 12 not in pids(rows)
+    assert [p["rss_bytes"] for p in rows if p["name"] == "kworker (idle)"] == [4]
+
+
+def test_top_k_keeps_heaviest_by_cpu_and_by_rss_with_ancestors():
+    rows = ProcessFilter(top_k=1).apply(tree())
+    # 201 by CPU and 202 by RSS, then 201's ancestors so the tree stays intact
+    assert pids(rows) == {201, 202, 200, 100, 1}
+    assert_tree_closed(rows)
+
+
+def test_include_is_kept_beyond_top_k():
+    rows = ProcessFilter(top_k=1, include="sshd").apply(tree())
+    assert pids(rows) == {100, 201, 202, 200, 1}
+
+
+def test_thresholds_and_exclude():
+    rows = ProcessFilter(min_cpu=10, exclude="kworker/*").apply(tree())
+    assert pids(rows) == {201, 200, 100, 1}
+    rows = ProcessFilter(min_rss=1000).apply(tree())
+    assert pids(rows) == {1, 202}
+
+
+def test_ancestors_are_added_once():
+    rows = ProcessFilter(min_cpu=1.5).apply(tree())
+    assert len(rows) == len(pids(rows))
+    assert pids(rows) == {201, 200, 100, 1, *range(300, 305)}
+
+
+def test_from_config():
+    assert ProcessFilter.from_config(config()) is None
+    assert ProcessFilter.from_config(config(include="sshd")) is None
+    process_filter = ProcessFilter.from_config(config(top_k=5, exclude="kworker/*, ,migration/*"))
+    assert process_filter.top_k == 5
+    assert process_filter.exclude.match("migration/3") and not process_filter.exclude.match("sshd")
@@ -0,0 +1,72 @@
+import metrics
+import scheduler
+from scheduler import AdaptiveInterval, Scheduler
+
+
+def proc(pid, cpu=1.0, rss=100):
+    return {"pid": pid, "ppid": 1, "name": f"p{pid}", "cpu_percent": cpu, "rss_bytes": rss}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_ticks_keep_cadence_and_skip_overruns(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(scheduler.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(scheduler.time, "sleep", clock.sleep)
+    skipped = metrics.skipped_ticks._values[()]
+    tick = Scheduler(10)
+
+    tick.wait()
+    clock.now += 3  # a 3 s cycle does not push the next sample back
+    tick.wait()
+    assert clock.sleeps == [10, 7]
+
+    clock.now += 25  # overran two ticks: they are skipped, not run back to back
+    tick.wait()
+    assert clock.sleeps[-1] == 5 and clock.now == 50
+    assert metrics.skipped_ticks._values[()] - skipped == 2
+
+
+def test_interval_precedence():
+    adaptive = AdaptiveInterval(2, 60)
+    tick = Scheduler(10, adaptive)
+    assert tick.current_interval() == 2
+    tick.server_interval = 30
+    assert tick.current_interval() == 30
+    tick.server_interval = None
+    assert Scheduler(10).current_interval() == 10
+
+
+def test_adaptive_grows_while_stable_and_resets_on_spikes():
+    adaptive = AdaptiveInterval(2, 10, growth=2)
+    stable = [proc(pid) for pid in range(1, 101)]
+    assert adaptive.update(stable) == 2
+    assert [adaptive.update(stable) for _ in range(4)] == [4, 8, 10, 10]
+
+    # CPU jump on one process
+    assert adaptive.update([proc(1, cpu=30.0), *stable[1:]]) == 2
+    adaptive.update(stable)
+    # total RSS up by a fifth
+    assert adaptive.update([proc(1, rss=2100), *stable[1:]]) == 2
+    adaptive.update(stable)
+    adaptive.update(stable)
+    # 5% of the processes replaced
+    assert adaptive.update([*stable[:97], *(proc(pid) for pid in range(200, 203))]) == 2
+
+
+def test_small_changes_are_not_spikes():
+    adaptive = AdaptiveInterval(2, 10, growth=2)
+    stable = [proc(pid) for pid in range(1, 101)]
+    adaptive.update(stable)
+    assert adaptive.update([proc(1, cpu=15.0, rss=150), *stable[1:-1], proc(500)]) == 4
@@ -0,0 +1,143 @@
+import json
+import os
+
+from spool import Spool
+
+
+def snap(i, size=0):
+    # fixed width so every line of a given size has the same length
+    return {"snapshot_time": f"t{i:03d}", "pad": "x" * size}
+
+
+def line_bytes(i, size=0):
+    return len(json.dumps(snap(i, size)).encode("utf-8")) + 1
+
+
+def times(items):
+    return [int(s["snapshot_time"][1:]) for s in items]
+
+
+def test_peek_commit_and_release(tmp_path):
+    spool = Spool(str(tmp_path / "spool"), 1 << 20)
+    for i in range(5):
+        spool.append(snap(i))
+
+    items, token = spool.peek(3, timeout=0)
+    assert times(items) == [0, 1, 2]
+    spool.release()
+    # released batches come back
+    items, token = spool.peek(3, timeout=0)
+    assert times(items) == [0, 1, 2]
+    spool.commit(token)
+
+    items, token = spool.peek(10, timeout=0)
+    assert times(items) == [3, 4]
+    spool.commit(token)
+    assert spool.pending_bytes() == 0
+    assert spool.peek(10, timeout=0) == ([], spool._offset)
+
+
+def test_offset_survives_restart(tmp_path):
+    path = str(tmp_path / "spool")
+    spool = Spool(path, 1 << 20)
+    for i in range(4):
+        spool.append(snap(i))
+    spool.commit(spool.peek(2, timeout=0)[1])
+
+    items, _ = Spool(path, 1 << 20).peek(10, timeout=0)
+    assert times(items) == [2, 3]
+
+
+def test_partial_and_corrupt_lines(tmp_path):
+    path = str(tmp_path / "spool")
+    spool = Spool(path, 1 << 20)
+    spool.append(snap(0))
+    with open(path, "ab") as f:
+        f.write(b"not json\n")
+    spool.append(snap(1))
+    with open(path, "ab") as f:
+        f.write(b'{"snapshot_time": "half')
+
+    items, token = spool.peek(10, timeout=0)
+    assert times(items) == [0, 1]
+    # the unfinished line is left for the next peek
+    assert token == os.path.getsize(path) - len(b'{"snapshot_time": "half')
+
+
+def test_eviction_drops_oldest_to_ninety_percent(tmp_path):
+    size = line_bytes(0, 100)
+    spool = Spool(str(tmp_path / "spool"), size * 10)
+    for i in range(11):
+        spool.append(snap(i, 100))
+
+    assert spool.evicted == 2
+    assert spool.pending_bytes() == size * 9
+    items, _ = spool.peek(20, timeout=0)
+    assert times(items) == list(range(2, 11))
+
+
+def test_eviction_during_upload_keeps_newer_data(tmp_path):
+    size = line_bytes(0, 100)
+    spool = Spool(str(tmp_path / "spool"), size * 10)
+    for i in range(10):
+        spool.append(snap(i, 100))
+    _, token = spool.peek(2, timeout=0)
+    spool.append(snap(10, 100))
+
+    # the batch being uploaded was evicted; committing it must not move the offset back
+    spool.commit(token)
+    items, _ = spool.peek(20, timeout=0)
+    assert times(items) == list(range(2, 11))
+
+
+def test_compaction(tmp_path):
+    path = str(tmp_path / "spool")
+    size = line_bytes(0, 100)
+    spool = Spool(path, size * 4)
+    for i in range(3):
+        spool.append(snap(i, 100))
+
+    # the sent prefix is still smaller than max_bytes: no rewrite yet
+    spool.commit(spool.peek(2, timeout=0)[1])
+    assert os.path.getsize(path) == size * 3
+
+    # everything sent: the file is emptied and the offset reset
+    spool.commit(spool.peek(2, timeout=0)[1])
+    assert os.path.getsize(path) == 0
+    with open(path + ".offset") as f:
+        assert f.read() == "0"
+
+    for i in range(3, 7):
+        spool.append(snap(i, 100))
+    spool.commit(spool.peek(3, timeout=0)[1])
+    for i in range(7, 10):
+        spool.append(snap(i, 100))
+    assert os.path.getsize(path) == size * 7
+    spool.commit(spool.peek(1, timeout=0)[1])
+    # the sent prefix reached max_bytes with data still unsent: only the unsent tail is kept
+    assert spool.evicted == 0
+    assert spool._offset == 0
+    assert os.path.getsize(path) == size * 3
+    items, _ = spool.peek(20, timeout=0)
+    assert times(items) == [7, 8, 9]
+
+
+def test_no_compaction_while_a_batch_is_in_flight(tmp_path):
+    path = str(tmp_path / "spool")
+    size = line_bytes(0, 100)
+    spool = Spool(path, size * 4)
+    for i in range(4):
+        spool.append(snap(i, 100))
+    spool.commit(spool.peek(3, timeout=0)[1])
+    spool.append(snap(4, 100))
+    spool.peek(1, timeout=0)
+    for i in range(5, 8):
+        spool.append(snap(i, 100))
+
+    # eviction moved the offset past max_bytes but left the file alone for the in-flight batch
+    assert spool.evicted == 2
+    assert os.path.getsize(path) == size * 8
+    spool.release()
+    assert os.path.getsize(path) == size * 3
+    items, _ = spool.peek(20, timeout=0)
+    assert times(items) == [5, 6, 7]
@@ -0,0 +1,69 @@
+import system_info
+from system_info import HostInfo
+
+
+STATIC = {"hostname": "h", "os": "Linux 6.1", "processor": "x86_64", "physical_cores": 4, "logical_cores": 8}
+
+
+def patch_host(monkeypatch, metrics):
+    clock = {"now": 0.0}
+    calls = []
+
+    def get_static_info():
+        calls.append(clock["now"])
+        return dict(STATIC)
+
+    monkeypatch.setattr(system_info, "get_static_info", get_static_info)
+    monkeypatch.setattr(system_info, "get_host_metrics", lambda: dict(metrics))
+    monkeypatch.setattr(system_info.time, "monotonic", lambda: clock["now"])
+    return clock, calls
+
+
+def host_metrics(**overrides):
+    return {"ram_total_gb": 16.0, "ram_used_gb": 4.0, "ram_available_gb": 12.0, "disk_total_gb": 100.0,
+            "disk_used_gb": 40.0, "disk_free_gb": 60.0, **overrides}
+
+
+def test_static_details_are_sent_once(monkeypatch):
+    patch_host(monkeypatch, host_metrics())
+    host_info = HostInfo(refresh_interval=0)
+    hostdetails, metrics = host_info.collect()
+    assert hostdetails == {**STATIC, "ram_total_gb": 16.0, "disk_total_gb": 100.0}
+    # totals travel with the static facts, not with every sample
+    assert metrics == {"ram_used_gb": 4.0, "ram_available_gb": 12.0, "disk_used_gb": 40.0, "disk_free_gb": 60.0}
+    hostdetails, metrics = host_info.collect()
+    assert hostdetails == {"hostname": "h"}
+    assert metrics["ram_used_gb"] == 4.0
+
+
+def test_changed_total_resends_static_details(monkeypatch):
+    metrics = host_metrics()
+    patch_host(monkeypatch, metrics)
+    host_info = HostInfo(refresh_interval=0)
+    host_info.collect()
+    metrics["ram_total_gb"] = 32.0
+    hostdetails, _ = host_info.collect()
+    assert hostdetails["ram_total_gb"] == 32.0 and hostdetails["os"] == "Linux 6.1"
+    assert host_info.collect()[0] == {"hostname": "h"}
+
+
+def test_refresh_interval_recollects_and_resends(monkeypatch):
+    clock, calls = patch_host(monkeypatch, host_metrics())
+    host_info = HostInfo(refresh_interval=60)
+    host_info.collect()
+    clock["now"] = 59.0
+    assert host_info.collect()[0] == {"hostname": "h"}
+    clock["now"] = 60.0
+    # unchanged, but sent again so a server that missed them catches up
+    assert host_info.collect()[0]["os"] == "Linux 6.1"
+    assert calls == [0.0, 60.0]
+    assert host_info.collect()[0] == {"hostname": "h"}
+
+
+def test_zero_refresh_interval_collects_once(monkeypatch):
+    clock, calls = patch_host(monkeypatch, host_metrics())
+    host_info = HostInfo(refresh_interval=0)
+    for now in (0.0, 1e6, 2e6):
+        clock["now"] = now
+        host_info.collect()
+    assert calls == [0.0]
@@ -0,0 +1,117 @@
+import base64
+import gzip
+import json
+import struct
+
+import metrics
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COLUMNAR_CONTENT_TYPE = "application/x-procmon-columnar"
+MAGIC = b"PMC2"
+NO_NAME = 0xFFFFFFFF
+ROW_KEYS = ("processes", "delta")
+
+
+def _pack_block(rows, names, sparse=False):
+    n = len(rows)
+    if sparse:
+        ppid = [p.get("ppid", -1) for p in rows]
+        name = [names.setdefault(p["name"], len(names)) if "name" in p else NO_NAME for p in rows]
+        cpu = [round(p["cpu_percent"] * 100) if "cpu_percent" in p else -1 for p in rows]
+        rss = [p.get("rss_bytes", -1) for p in rows]
+        start = [round(p["start_time"] * 100) if p.get("start_time") is not None else -1 for p in rows]
+    else:
+        ppid = [p["ppid"] for p in rows]
+        name = [names.setdefault(p["name"], len(names)) for p in rows]
+        cpu = [round(p["cpu_percent"] * 100) for p in rows]
+        rss = [p["rss_bytes"] for p in rows]
+        # snapshots spooled by an older agent carry no start time: 0 is "unknown"
+        start = [round(p.get("start_time", 0) * 100) for p in rows]
+    return b"".join((
+        struct.pack("<I", n),
+        struct.pack(f"<{n}i", *[p["pid"] for p in rows]),
+        struct.pack(f"<{n}i", *ppid),
+        struct.pack(f"<{n}I", *name),
+        struct.pack(f"<{n}i", *cpu),
+        struct.pack(f"<{n}q", *rss),
+        struct.pack(f"<{n}q", *start),
+    ))
+
+
+def pack_columnar(snapshots):
+
+    """
+    Pack snapshots (full or delta) into the columnar format understood by
+    the backend's api.codecs module. Process names go into one deduplicated
+    string table shared by the whole batch.
+    """
+
+    names = {}
+    parts = [struct.pack("<I", len(snapshots))]
+    for snap in snapshots:
+        meta = json.dumps({k: v for k, v in snap.items() if k not in ROW_KEYS}).encode("utf-8")
+        delta = snap.get("delta")
+        if delta is not None:
+            rows, changed, removed = delta["added"], delta["changed"], delta["removed"]
+        else:
+            rows, changed, removed = snap.get("processes", []), [], []
+        parts.append(struct.pack("<I", len(meta)))
+        parts.append(meta)
+        parts.append(_pack_block(rows, names))
+        parts.append(_pack_block(changed, names, sparse=True))
+        parts.append(struct.pack(f"<I{len(removed)}i", len(removed), *removed))
+
+    encoded = [name.encode("utf-8") for name in names]
+    table = struct.pack(f"<I{len(encoded)}I", len(encoded), *map(len, encoded)) + b"".join(encoded)
+    return MAGIC + table + b"".join(parts)
+
+
+class PayloadEncoder:
+
+    """
+    Encodes snapshots for upload and negotiates the wire format with the server.
+
+    Starts with the configured format. Falls back to the legacy
+    base64(gzip(JSON)) body if the server answers 415, and switches to zstd
+    once the server advertises it in Accept-Encoding.
+    """
+
+    def __init__(self, wire_format="columnar"):
+        self.wire_format = wire_format
+        self.encoding = "gzip"
+
+    def encode(self, snapshots):
+        if self.wire_format == "json":
+            raw = json.dumps(snapshots[0] if len(snapshots) == 1 else {"snapshots": snapshots}).encode("utf-8")
+            encoded = base64.b64encode(gzip.compress(raw)).decode("utf-8")
+            body = json.dumps({"payload": encoded}).encode("utf-8")
+            headers = {"Content-Type": "application/json"}
+        else:
+            raw = pack_columnar(snapshots)
+            if self.encoding == "zstd":
+                body = zstandard.ZstdCompressor().compress(raw)
+            else:
+                body = gzip.compress(raw)
+            headers = {"Content-Type": COLUMNAR_CONTENT_TYPE, "Content-Encoding": self.encoding}
+        metrics.payload_bytes.observe(len(raw), stage="raw")
+        metrics.payload_bytes.observe(len(body), stage="compressed")
+        return body, headers
+
+    def negotiate(self, response):
+        """Adapt to the server's response. Returns True if the payload should be re-encoded and resent."""
+        if response.status_code == 415 and self.wire_format != "json":
+            if self.encoding != "gzip":
+                self.encoding = "gzip"
+            else:
+                print("⚠️ Server does not accept columnar payloads, falling back to JSON")
+                self.wire_format = "json"
+            return True
+
+        accepted = response.headers.get("Accept-Encoding", "")
+        if zstandard is not None and self.encoding != "zstd" and "zstd" in accepted:
+            self.encoding = "zstd"
+        return False
@@ -3,7 +3,8 @@ from .models import Host, Snapshot, Process
 
 @admin.register(Host)
 class HostAdmin(admin.ModelAdmin):
-    list_display = ("hostname", "created_at")
+    list_display = ("hostname", "sample_interval", "created_at")
+    list_editable = ("sample_interval",)
 
 @admin.register(Snapshot)
 class SnapshotAdmin(admin.ModelAdmin):
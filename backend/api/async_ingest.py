@@ -0,0 +1,166 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import metrics
+from .codecs import COLUMNAR_CONTENT_TYPE, PayloadTooLarge, UnsupportedEncoding, decode_columnar, decompress, loads
+from .ingest import (InvalidPayload, broadcast_entries, extract_snapshots, forget_deltas, payload_limit,
+                     write_snapshots)
+
+
+class UnsupportedContentType(Exception):
+    pass
+
+
+def decode_body(body, content_type, content_encoding):
+    """
+    Decode a raw ingest body the way IngestAPIView's parsers do and return
+    extract_snapshots' (snapshots, invalid). Raises
+    UnsupportedContentType, codecs.UnsupportedEncoding,
+    codecs.PayloadTooLarge or InvalidPayload.
+    """
+    with metrics.ingest_decode_seconds.time():
+        return _decode(body, content_type, content_encoding)
+
+
+def _decode(body, content_type, content_encoding):
+    if content_type == COLUMNAR_CONTENT_TYPE:
+        try:
+            data = decode_columnar(decompress(body, content_encoding, payload_limit()))
+        except (UnsupportedEncoding, PayloadTooLarge):
+            raise
+        except Exception as e:
+            raise InvalidPayload(f"Failed to decode payload: {e}")
+    elif content_type == "application/json" or content_type.endswith("+json"):
+        try:
+            data = loads(body)
+        except ValueError as e:
+            raise InvalidPayload(f"JSON parse error - {e}")
+    else:
+        raise UnsupportedContentType(content_type)
+    return extract_snapshots(data)
+
+
+decode_pool = ThreadPoolExecutor(max_workers=settings.INGEST_DECODE_WORKERS, thread_name_prefix="ingest-decode")
+
+
+def _write(prepared):
+    close_old_connections()
+    return write_snapshots(prepared)
+
+
+class IngestWriter:
+    """
+    Database writer for the async ingest view.
+
+    Requests hand over their prepared snapshots and await the result.
+    Whatever queued up while the previous write ran (up to
+    ``coalesce_max`` snapshots) is stored in one write_snapshots call on a
+    pool of ``workers`` DB threads, and the broadcasts are then awaited on
+    the event loop. Like IngestQueue, a request claims its place with
+    reserve() before its deltas are applied and store() fills it;
+    release() gives back a place that will not be used.
+    """
+
+    def __init__(self, maxsize, workers, coalesce_max):
+        self.maxsize = maxsize
+        self.workers = workers
+        self.coalesce_max = coalesce_max
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest-db")
+        self._loop = None
+        self._queue = None
+        self._active = 0
+        self._reserved = 0
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+            self._active = 0
+            self._reserved = 0
+
+    def full(self):
+        return self._queue is not None and self._queue.qsize() + self._reserved >= self.maxsize
+
+    def reserve(self):
+        """Claim a place for one request; False when the queue is full. Call on the event loop."""
+        self._bind()
+        if self.full():
+            return False
+        self._reserved += 1
+        return True
+
+    def release(self):
+        """Give back a place claimed with reserve() that will not be used."""
+        self._reserved -= 1
+
+    def depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def store(self, prepared):
+        """Write prepared snapshots in the place claimed with reserve(); returns their "created" records."""
+        self._bind()
+        future = self._loop.create_future()
+        self._reserved -= 1
+        self._queue.put_nowait((prepared, future))
+        # drain tasks run only while there is work, up to one per DB thread
+        if self._active < self.workers:
+            self._active += 1
+            self._loop.create_task(self._drain())
+        return await future
+
+    async def _drain(self):
+        try:
+            while not self._queue.empty():
+                batch = [self._queue.get_nowait()]
+                count = len(batch[0][0])
+                while count < self.coalesce_max and not self._queue.empty():
+                    item = self._queue.get_nowait()
+                    batch.append(item)
+                    count += len(item[0])
+                try:
+                    entries = await self._write_batch(batch)
+                except Exception as e:
+                    entries = {}
+                    if len(batch) == 1:
+                        self._fail(batch[0], e)
+                    else:
+                        # one bad request must not fail the others it was batched with
+                        for item in batch:
+                            try:
+                                entries.update(await self._write_batch([item]))
+                            except Exception as e:
+                                self._fail(item, e)
+                await broadcast_entries(entries)
+        finally:
+            self._active -= 1
+
+    async def _write_batch(self, batch):
+        prepared = [p for items, _ in batch for p in items]
+        created, entries = await self._loop.run_in_executor(self._executor, _write, prepared)
+        offset = 0
+        for items, future in batch:
+            if not future.done():
+                future.set_result(created[offset:offset + len(items)])
+            offset += len(items)
+        return entries
+
+    @staticmethod
+    def _fail(item, exc):
+        prepared, future = item
+        forget_deltas(prepared)
+        if not future.done():
+            future.set_exception(exc)
+
+
+ingest_writer = IngestWriter(
+    maxsize=settings.INGEST_QUEUE_SIZE,
+    workers=settings.INGEST_WORKERS,
+    coalesce_max=settings.INGEST_COALESCE_MAX,
+)
+
+metrics.Gauge("procmon_ingest_writer_depth", "Requests waiting for the async ingest view's database writer.",
+              function=ingest_writer.depth)
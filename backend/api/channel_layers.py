@@ -0,0 +1,243 @@
+import asyncio
+import json
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+
+from channels.layers import InMemoryChannelLayer
+
+
+# frame: op, group length, body length, then the group name and JSON body
+HEADER = struct.Struct(">BHI")
+SUBSCRIBE, UNSUBSCRIBE, SEND = 1, 2, 3
+
+
+def encode_frame(op, group, body=b""):
+    name = group.encode()
+    return HEADER.pack(op, len(name), len(body)) + name + body
+
+
+class ChannelHub:
+    """
+    Relays group messages between worker processes on one machine.
+
+    Each SocketChannelLayer keeps one Unix socket connection to the hub and
+    tells it which groups have local members. A message published to a
+    group is forwarded, unparsed, to every other connection subscribed to
+    it. A peer that stops reading is skipped once ``max_buffer`` bytes are
+    queued for it, so one stuck worker cannot stall the others.
+    """
+
+    def __init__(self, path, max_buffer=16 * 1024 * 1024, log=print):
+        self.path = path
+        self.max_buffer = max_buffer
+        self.log = log
+        self.members = {}
+        self.relayed = 0
+        self.dropped = 0
+
+    async def serve(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self._handle, path=self.path)
+        self.log(f"Channel hub listening on {self.path}")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        groups = set()
+        try:
+            while True:
+                header = await reader.readexactly(HEADER.size)
+                op, name_len, body_len = HEADER.unpack(header)
+                name = await reader.readexactly(name_len)
+                body = await reader.readexactly(body_len) if body_len else b""
+                group = name.decode()
+                if op == SUBSCRIBE:
+                    groups.add(group)
+                    self.members.setdefault(group, set()).add(writer)
+                elif op == UNSUBSCRIBE:
+                    groups.discard(group)
+                    self._leave(group, writer)
+                elif op == SEND:
+                    self._relay(group, header + name + body, writer)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for group in groups:
+                self._leave(group, writer)
+            writer.close()
+
+    def _leave(self, group, writer):
+        members = self.members.get(group)
+        if members:
+            members.discard(writer)
+            if not members:
+                del self.members[group]
+
+    def _relay(self, group, frame, sender):
+        for peer in self.members.get(group, ()):
+            if peer is sender:
+                continue
+            if peer.transport.get_write_buffer_size() > self.max_buffer:
+                self.dropped += 1
+                continue
+            peer.write(frame)
+            self.relayed += 1
+
+
+class _HubLink:
+    """
+    A worker's connection to the hub, run on background threads so that
+    publishing never blocks a request or an event loop. Frames queue while
+    the hub is unreachable (up to ``outbox_size``, then the newest are
+    dropped) and subscriptions are replayed after every reconnect.
+    """
+
+    def __init__(self, path, deliver, outbox_size=1000):
+        self.path = path
+        self.deliver = deliver
+        self.groups = set()
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._outbox = queue.Queue(maxsize=outbox_size)
+        threading.Thread(target=self._run, name="channel-hub-link", daemon=True).start()
+
+    def subscribe(self, group):
+        with self._lock:
+            self.groups.add(group)
+        self._put(encode_frame(SUBSCRIBE, group))
+
+    def unsubscribe(self, group):
+        with self._lock:
+            self.groups.discard(group)
+        self._put(encode_frame(UNSUBSCRIBE, group))
+
+    def publish(self, group, message):
+        self._put(encode_frame(SEND, group, json.dumps(message, separators=(",", ":")).encode()))
+
+    def _put(self, frame):
+        try:
+            self._outbox.put_nowait(frame)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        delay, warned = 0.1, False
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+            except OSError as e:
+                sock.close()
+                if not warned:
+                    print(f"⚠️ Channel hub unavailable at {self.path}: {e}; retrying")
+                    warned = True
+                time.sleep(delay)
+                delay = min(delay * 2, 5)
+                continue
+            delay, warned = 0.1, False
+
+            broken = threading.Event()
+            reader = threading.Thread(target=self._read, args=(sock, broken), daemon=True)
+            reader.start()
+            try:
+                with self._lock:
+                    replay = [encode_frame(SUBSCRIBE, g) for g in self.groups]
+                for frame in replay:
+                    sock.sendall(frame)
+                while not broken.is_set():
+                    try:
+                        frame = self._outbox.get(timeout=1)
+                    except queue.Empty:
+                        continue
+                    sock.sendall(frame)
+            except OSError:
+                pass
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+            reader.join()
+
+    def _read(self, sock, broken):
+        stream = sock.makefile("rb")
+        try:
+            while True:
+                header = stream.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    break
+                op, name_len, body_len = HEADER.unpack(header)
+                group = stream.read(name_len).decode()
+                body = stream.read(body_len)
+                if op == SEND:
+                    self.deliver(group, json.loads(body))
+        except (OSError, ValueError):
+            pass
+        finally:
+            broken.set()
+
+
+class SocketChannelLayer(InMemoryChannelLayer):
+    """
+    In-memory channel layer whose group messages also reach the other
+    worker processes on the machine, through ``manage.py channel_hub``
+    listening on ``path``.
+
+    Channels stay process-local: only groups cross processes, which is
+    all the snapshot broadcasts use. Messages must be JSON-serializable.
+    """
+
+    def __init__(self, path, outbox_size=1000, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.outbox_size = outbox_size
+        self._link = None
+        self._link_lock = threading.Lock()
+        self._loop = None
+
+    def link(self):
+        if self._link is None:
+            with self._link_lock:
+                if self._link is None:
+                    self._link = _HubLink(self.path, self._deliver_remote, self.outbox_size)
+        return self._link
+
+    async def group_add(self, group, channel):
+        # consumers run on this loop; remote messages are delivered onto it
+        self._loop = asyncio.get_running_loop()
+        first = group not in self.groups
+        await super().group_add(group, channel)
+        if first:
+            self.link().subscribe(group)
+
+    async def group_discard(self, group, channel):
+        await super().group_discard(group, channel)
+        if group not in self.groups and self._link is not None:
+            self._link.unsubscribe(group)
+
+    async def group_send(self, group, message):
+        self.link().publish(group, message)
+        loop = asyncio.get_running_loop()
+        if self._loop is None or self._loop is loop:
+            await super().group_send(group, message)
+        else:
+            # e.g. an ingest worker thread with its own loop: hand the local
+            # delivery to the consumers' loop, whose queues are not thread-safe
+            asyncio.run_coroutine_threadsafe(InMemoryChannelLayer.group_send(self, group, message), self._loop)
+
+    def _deliver_remote(self, group, message):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(InMemoryChannelLayer.group_send(self, group, message), loop)
+
+    async def flush(self):
+        await super().flush()
+        if self._link is not None:
+            for group in list(self._link.groups):
+                self._link.unsubscribe(group)
@@ -0,0 +1,213 @@
+"""
+Columnar wire format for agent snapshots.
+
+Sent as a raw request body with ``Content-Type: application/x-procmon-columnar``
+and ``Content-Encoding: gzip`` (or ``zstd`` when the zstandard package is
+installed on both sides). All integers are little-endian.
+
+    b"PMC2"
+    u32 name_count, u32[name_count] byte lengths, utf-8 names back to back
+    u32 snapshot_count, then per snapshot:
+        u32 meta_len, meta JSON (every snapshot key except the process rows)
+        rows block     -> "processes", or delta "added"
+        changed block  -> delta "changed"
+        u32 n, i32[n]  -> delta "removed"
+
+    block: u32 n, i32[n] pid, i32[n] ppid, u32[n] name index,
+           i32[n] cpu_percent * 100, i64[n] rss_bytes, i64[n] start_time * 100
+
+Rows decode straight into schema.Rows of process tuples; in the changed
+block a field that did not change is -1 (0xFFFFFFFF for the name index) and
+None in the tuple. Bodies from agents older than the start_time column
+(b"PMC1", blocks without it) are still read, with start_time 0.
+"""
+
+import gzip
+import json
+import struct
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from .schema import NAME_MAX, Rows
+
+COLUMNAR_CONTENT_TYPE = "application/x-procmon-columnar"
+MAGIC = b"PMC2"
+MAGIC_V1 = b"PMC1"
+NO_NAME = 0xFFFFFFFF
+
+SUPPORTED_ENCODINGS = ["gzip", "identity"]
+if zstandard is not None:
+    SUPPORTED_ENCODINGS.insert(0, "zstd")
+
+
+CHUNK = 256 * 1024
+
+# orjson parses JSON bodies several times faster when it is installed
+loads = orjson.loads if orjson is not None else json.loads
+
+
+class UnsupportedEncoding(ValueError):
+    pass
+
+
+class PayloadTooLarge(ValueError):
+    pass
+
+
+def _too_large(limit):
+    return PayloadTooLarge(f"Decompressed payload exceeds {limit} bytes")
+
+
+def _gunzip(body, limit):
+    """gzip.decompress that stops as soon as the output passes ``limit`` bytes."""
+    parts, size, data = [], 0, body
+    while data:
+        # one decompressor per gzip member, as gzip.decompress does
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        while True:
+            chunk = d.decompress(data, CHUNK)
+            size += len(chunk)
+            if size > limit:
+                raise _too_large(limit)
+            parts.append(chunk)
+            data = d.unconsumed_tail
+            if d.eof or not chunk and not data:
+                break
+        if not d.eof:
+            raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+        data = d.unused_data
+    return b"".join(parts)
+
+
+def _unzstd(body, limit):
+    # the frame header's content size is the sender's claim, so read incrementally
+    with zstandard.ZstdDecompressor().stream_reader(body, read_across_frames=True) as reader:
+        parts, size = [], 0
+        while True:
+            chunk = reader.read(CHUNK)
+            if not chunk:
+                return b"".join(parts)
+            size += len(chunk)
+            if size > limit:
+                raise _too_large(limit)
+            parts.append(chunk)
+
+
+def decompress(body, encoding, limit=None):
+    """
+    Undo a Content-Encoding. With ``limit``, raise PayloadTooLarge once
+    more than that many bytes come out, without inflating the rest.
+    """
+    encoding = (encoding or "identity").strip().lower()
+    if encoding == "identity":
+        if limit is not None and len(body) > limit:
+            raise _too_large(limit)
+        return body
+    if encoding == "gzip":
+        return gzip.decompress(body) if limit is None else _gunzip(body, limit)
+    if encoding == "zstd" and zstandard is not None:
+        if limit is None:
+            return zstandard.ZstdDecompressor().decompress(body)
+        return _unzstd(body, limit)
+    raise UnsupportedEncoding(encoding)
+
+
+def _read_block(buf, off, names, sparse=False, start_times=True):
+    (n,) = struct.unpack_from("<I", buf, off)
+    off += 4
+    pids = struct.unpack_from(f"<{n}i", buf, off)
+    off += 4 * n
+    ppids = struct.unpack_from(f"<{n}i", buf, off)
+    off += 4 * n
+    name_idx = struct.unpack_from(f"<{n}I", buf, off)
+    off += 4 * n
+    cpus = struct.unpack_from(f"<{n}i", buf, off)
+    off += 4 * n
+    rss = struct.unpack_from(f"<{n}q", buf, off)
+    off += 8 * n
+    if start_times:
+        starts = struct.unpack_from(f"<{n}q", buf, off)
+        off += 8 * n
+    else:
+        starts = (-1 if sparse else 0,) * n
+    if not n:
+        return Rows(), off
+
+    # range checks on whole columns run in C; -1 marks "unchanged" in sparse blocks
+    floor = -1 if sparse else 0
+    if (min(pids) < 0 or min(ppids) < floor or min(cpus) < floor or min(rss) < floor
+            or min(starts) < floor):
+        raise ValueError("negative value in process block")
+    if not sparse:
+        if max(name_idx) >= len(names):
+            raise ValueError("name index out of range")
+        return Rows(zip(pids, ppids, [names[i] for i in name_idx], [c / 100 for c in cpus], rss,
+                        [s / 100 for s in starts])), off
+
+    if any(i >= len(names) and i != NO_NAME for i in name_idx):
+        raise ValueError("name index out of range")
+    return Rows(
+        (pid, None if ppid == -1 else ppid, None if ni == NO_NAME else names[ni],
+         None if cpu == -1 else cpu / 100, None if r == -1 else r, None if s == -1 else s / 100)
+        for pid, ppid, ni, cpu, r, s in zip(pids, ppids, name_idx, cpus, rss, starts)
+    ), off
+
+
+def decode_columnar(buf):
+    """
+    Decode a columnar payload into the same snapshots the JSON path has
+    after schema validation; the meta fields are still checked by
+    schema.validate_snapshots.
+    """
+    buf = memoryview(buf)
+    magic = bytes(buf[:4])
+    if magic not in (MAGIC, MAGIC_V1):
+        raise ValueError("bad magic")
+    start_times = magic == MAGIC
+    off = 4
+
+    (count,) = struct.unpack_from("<I", buf, off)
+    off += 4
+    lengths = struct.unpack_from(f"<{count}I", buf, off)
+    off += 4 * count
+    names = []
+    for length in lengths:
+        names.append(str(buf[off:off + length], "utf-8")[:NAME_MAX])
+        off += length
+
+    (snap_count,) = struct.unpack_from("<I", buf, off)
+    off += 4
+    snapshots = []
+    for _ in range(snap_count):
+        (meta_len,) = struct.unpack_from("<I", buf, off)
+        off += 4
+        snap = loads(bytes(buf[off:off + meta_len]))
+        off += meta_len
+        if not isinstance(snap, dict):
+            raise ValueError("snapshot meta is not an object")
+
+        rows, off = _read_block(buf, off, names, start_times=start_times)
+        changed, off = _read_block(buf, off, names, sparse=True, start_times=start_times)
+        (n,) = struct.unpack_from("<I", buf, off)
+        off += 4
+        removed = list(struct.unpack_from(f"<{n}i", buf, off))
+        off += 4 * n
+
+        if "seq" in snap and not snap.get("keyframe"):
+            snap["delta"] = {"added": rows, "changed": changed, "removed": removed}
+        else:
+            snap["processes"] = rows
+        snapshots.append(snap)
+
+    if off != len(buf):
+        raise ValueError("trailing data")
+    return snapshots
@@ -1,10 +1,19 @@
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
-def broadcast_snapshot(snapshot_id, hostname, snapshot_time):
+from . import metrics
+
+# every snapshot event also goes here, for wildcard subscriptions
+FLEET_GROUP = "hosts"
+
+
+async def broadcast_snapshot_async(snapshot_id, hostname, snapshot_time, text=None, patch=None, patch_base=None):
     """
-    Sends a lightweight event to the host group; consumers can fetch
-    details if needed or we can send full payload.
+    Sends a snapshot event to the host group and the fleet group. ``text``
+    is the ready-made full WebSocket frame and ``patch`` the protocol v2
+    patch from snapshot ``patch_base``, both rendered once for all
+    subscribers; without them consumers fetch and serialize the snapshot
+    themselves.
     
     """
 
@@ -15,6 +24,16 @@ def broadcast_snapshot(snapshot_id, hostname, snapshot_time):
         "hostname": hostname,
         "snapshot_time": snapshot_time,
     }
-    group_name = f"host_{hostname}"
-    async_to_sync(layer.group_send)(group_name, payload)
+    if text is not None:
+        payload["text"] = text
+    if patch is not None:
+        payload["patch"] = patch
+        payload["patch_base"] = patch_base
+    for group in (f"host_{hostname}", FLEET_GROUP):
+        await layer.group_send(group, payload)
+    metrics.broadcasts.inc()
+
 
+def broadcast_snapshot(*args, **kwargs):
+    """Synchronous broadcast_snapshot_async, for views and worker threads."""
+    async_to_sync(broadcast_snapshot_async)(*args, **kwargs)
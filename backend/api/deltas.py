@@ -0,0 +1,68 @@
+import threading
+
+
+class ResyncRequired(Exception):
+    """Raised when a delta cannot be applied and the agent must send a keyframe."""
+
+
+class DeltaStore:
+    """
+    Rebuilds full process lists from agent keyframes and deltas.
+
+    Keeps the last reconstructed process table per host in memory, keyed by
+    pid. A delta is only applied when it comes from the same agent stream and
+    carries the next sequence number; anything else raises ResyncRequired.
+    Snapshots without a ``seq`` (older agents) pass through unchanged.
+    Processes are the tuples made by schema.validate_snapshots; None in a
+    "changed" tuple keeps the current value.
+
+    A host's state advances as soon as its snapshot is rebuilt. When that
+    snapshot is then not stored, the caller must forget() the host so the
+    agent's next delta asks for a keyframe instead of applying against a
+    base the server never kept.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def apply(self, hostname, snap):
+        seq = snap.get("seq")
+        if seq is None:
+            return snap.get("processes", [])
+
+        stream = snap.get("stream")
+        with self._lock:
+            if snap.get("keyframe"):
+                table = {p[0]: p for p in snap.get("processes", [])}
+                self._hosts[hostname] = (stream, seq, table)
+                return list(table.values())
+
+            state = self._hosts.get(hostname)
+            if state is None or state[0] != stream or state[1] + 1 != seq:
+                self._hosts.pop(hostname, None)
+                raise ResyncRequired(hostname)
+
+            delta = snap.get("delta") or {}
+            table = state[2]
+            for pid in delta.get("removed", []):
+                table.pop(pid, None)
+            for p in delta.get("added", []):
+                table[p[0]] = p
+            for change in delta.get("changed", []):
+                current = table.get(change[0])
+                if current is None:
+                    self._hosts.pop(hostname, None)
+                    raise ResyncRequired(hostname)
+                table[change[0]] = tuple(old if new is None else new for new, old in zip(change, current))
+
+            self._hosts[hostname] = (stream, seq, table)
+            return list(table.values())
+
+    def forget(self, hostname):
+        """Drop a host's state; its next delta raises ResyncRequired."""
+        with self._lock:
+            self._hosts.pop(hostname, None)
+
+
+delta_store = DeltaStore()
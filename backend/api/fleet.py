@@ -0,0 +1,200 @@
+"""
+Fleet-wide views of every host's newest snapshot for /api/fleet/.
+
+HostLatest (one summary row per host) and LatestProcess (each host's
+FLEET_TOP_PROCESSES heaviest processes by CPU and by RSS) are rewritten in
+the ingest transaction, at most every FLEET_REFRESH_SECONDS of snapshot
+time per host, so they are shared by every worker process. Queries read those small
+tables through their sort-column indexes: "top 50 processes by CPU" is an
+index scan of 50 rows however many hosts there are.
+
+Fleet process queries are exact up to FLEET_TOP_PROCESSES: a process
+outside its own host's top N cannot be in the fleet's top N.
+"""
+
+import heapq
+from datetime import timedelta
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import Host, HostLatest, LatestProcess, Snapshot
+from .storage import BATCH_SIZE, PROCESS_KEYS, _q, get_process_store
+
+
+HOST_SORTS = ("ram_percent", "disk_percent", "cpu_percent", "rss_bytes", "process_count", "snapshot_time")
+PROCESS_SORTS = ("cpu_percent", "rss_bytes")
+HOST_FIELDS = ("snapshot_time", "process_count", "cpu_percent", "rss_bytes", "ram_percent", "disk_percent")
+# LatestProcess keeps the process fields up to rss_bytes
+LATEST_PROCESS_KEYS = PROCESS_KEYS[:5]
+HOSTS_LIMIT = 100
+HOSTS_MAX_LIMIT = 5000
+
+# process row layout: (snapshot_id, pid, ppid, name, cpu_percent, rss_bytes, start_time)
+_cpu = itemgetter(4)
+_rss = itemgetter(5)
+
+
+def _percent(used, total):
+    if used is None or not total:
+        return None
+    return round(used / total * 100, 2)
+
+
+def _heaviest(rows, n):
+    if len(rows) <= n:
+        return rows
+    picked = {row[1]: row for row in heapq.nlargest(n, rows, key=_cpu)}
+    picked.update((row[1], row) for row in heapq.nlargest(n, rows, key=_rss))
+    return list(picked.values())
+
+
+def refresh(batches, force=False):
+    """
+    Update the fleet tables from written ``(snapshot, process rows)``
+    batches; runs inside the ingest transaction. Only each host's newest
+    snapshot counts, and only once it is FLEET_REFRESH_SECONDS newer than
+    the stored one: rewriting a host's rows costs about as much as a third
+    of its process insert, and spooled uploads that arrive late are older.
+    ``force`` rewrites the hosts regardless, e.g. for rebuild().
+    """
+    newest = {}
+    for snap_obj, rows in batches:
+        current = newest.get(snap_obj.host_id)
+        if current is None or snap_obj.snapshot_time >= current[0].snapshot_time:
+            newest[snap_obj.host_id] = (snap_obj, rows)
+    if force:
+        fresh = list(newest.values())
+    else:
+        stored = dict(HostLatest.objects.filter(host_id__in=list(newest)).values_list("host_id", "snapshot_time"))
+        interval = timedelta(seconds=settings.FLEET_REFRESH_SECONDS)
+        fresh = [(snap_obj, rows) for host_id, (snap_obj, rows) in newest.items()
+                 if host_id not in stored or stored[host_id] + interval <= snap_obj.snapshot_time]
+    if not fresh:
+        return
+
+    HostLatest.objects.bulk_create(
+        [
+            HostLatest(
+                host_id=snap_obj.host_id,
+                snapshot_time=snap_obj.snapshot_time,
+                process_count=len(rows),
+                cpu_percent=round(sum(map(_cpu, rows)), 2),
+                rss_bytes=sum(map(_rss, rows)),
+                ram_percent=_percent(snap_obj.ram_used_gb, snap_obj.host.ram_total_gb),
+                disk_percent=_percent(snap_obj.disk_used_gb, snap_obj.host.disk_total_gb),
+            )
+            for snap_obj, rows in fresh
+        ],
+        update_conflicts=True,
+        unique_fields=["host"],
+        update_fields=list(HOST_FIELDS),
+    )
+    LatestProcess.objects.filter(host_id__in=[snap_obj.host_id for snap_obj, _ in fresh]).delete()
+    # executemany like the process stores: model instances would cost more than the inserts
+    fields = ("host", *LATEST_PROCESS_KEYS)
+    columns = ", ".join(_q(LatestProcess._meta.get_field(f).column) for f in fields)
+    sql = f"INSERT INTO {_q(LatestProcess._meta.db_table)} ({columns}) VALUES ({', '.join(['%s'] * len(fields))})"
+    rows = [(snap_obj.host_id, *row[1:len(fields)]) for snap_obj, rows in fresh
+            for row in _heaviest(rows, settings.FLEET_TOP_PROCESSES)]
+    with connection.cursor() as cursor:
+        for i in range(0, len(rows), BATCH_SIZE):
+            cursor.executemany(sql, rows[i:i + BATCH_SIZE])
+
+
+def _number(params, key, cast):
+    try:
+        return cast(params[key])
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a number")
+
+
+def _sort(params, allowed):
+    sort = params.get("sort") or f"-{allowed[0]}"
+    if sort.lstrip("-") not in allowed:
+        raise ValueError(f"sort must be one of {', '.join(allowed)} (prefix '-' for descending)")
+    return sort
+
+
+def _limit(params, default, maximum):
+    if not params.get("limit"):
+        return default
+    limit = _number(params, "limit", int)
+    if not 1 <= limit <= maximum:
+        raise ValueError(f"limit must be between 1 and {maximum}")
+    return limit
+
+
+def _cutoff(params):
+    """snapshot_time a host must have reached for ?max_age=<seconds>, or None."""
+    if not params.get("max_age"):
+        return None
+    return timezone.now() - timedelta(seconds=_number(params, "max_age", float))
+
+
+def top_processes(params):
+    """
+    Heaviest processes across the fleet:
+
+        ?sort=-cpu_percent   -cpu_percent (default) or -rss_bytes
+        ?limit=50            at most FLEET_TOP_PROCESSES
+        ?max_age=300         only hosts that reported in the last N seconds
+
+    Raises ValueError on bad values.
+    """
+    sort = _sort(params, PROCESS_SORTS)
+    if not sort.startswith("-"):
+        raise ValueError("fleet processes are kept per host by descending cpu_percent and rss_bytes only")
+    limit = _limit(params, 50, settings.FLEET_TOP_PROCESSES)
+    rows = LatestProcess.objects.all()
+    cutoff = _cutoff(params)
+    if cutoff is not None:
+        rows = rows.filter(host__latest__snapshot_time__gte=cutoff)
+    rows = rows.order_by(sort, "host_id", "pid")[:limit].values_list(
+        "host__hostname", "host__latest__snapshot_time", *LATEST_PROCESS_KEYS
+    )
+    keys = ("host", "snapshot_time", *LATEST_PROCESS_KEYS)
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def hosts(params):
+    """
+    Host summaries across the fleet:
+
+        ?min_ram=90          ram_percent >= value (also min_disk, min_cpu)
+        ?sort=-ram_percent   any of HOST_SORTS, "-" for descending
+        ?limit=100           at most HOSTS_MAX_LIMIT
+        ?max_age=300         only hosts that reported in the last N seconds
+
+    Returns (count of matching hosts, the first ``limit`` of them). Raises
+    ValueError on bad values.
+    """
+    sort = _sort(params, HOST_SORTS)
+    limit = _limit(params, HOSTS_LIMIT, HOSTS_MAX_LIMIT)
+    rows = HostLatest.objects.all()
+    for param, field in (("min_ram", "ram_percent"), ("min_disk", "disk_percent"), ("min_cpu", "cpu_percent")):
+        if params.get(param):
+            rows = rows.filter(**{f"{field}__gte": _number(params, param, float)})
+    cutoff = _cutoff(params)
+    if cutoff is not None:
+        rows = rows.filter(snapshot_time__gte=cutoff)
+    page = rows.order_by(sort, "host_id")[:limit].values_list("host__hostname", *HOST_FIELDS)
+    keys = ("host", *HOST_FIELDS)
+    return rows.count(), [dict(zip(keys, row)) for row in page]
+
+
+def rebuild():
+    """Refill the fleet tables from each host's newest snapshot. Returns the number of hosts."""
+    store = get_process_store()
+    count = 0
+    for host in Host.objects.iterator():
+        snap = Snapshot.objects.filter(host=host).first()
+        if snap is None:
+            continue
+        snap.host = host
+        rows = store.read([snap])[snap.id]
+        refresh([(snap, [(snap.id, *(p[k] for k in PROCESS_KEYS)) for p in rows])], force=True)
+        count += 1
+    return count
@@ -0,0 +1,305 @@
+import base64
+import logging
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import fleet, metrics, rollups
+from .codecs import PayloadTooLarge, decompress, loads
+from .consumers import broadcast_snapshot, broadcast_snapshot_async
+from .deltas import delta_store, ResyncRequired
+from .latest_cache import latest_cache
+from .models import Host, Snapshot
+from .schema import HOST_METRIC_FIELDS, SchemaError, validate_snapshot
+from .serializers import HostSerializer
+from .storage import PROCESS_KEYS, get_process_store
+
+
+HOSTNAME_MAX = Host._meta.get_field("hostname").max_length
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidPayload(ValueError):
+    """The ingest body could not be turned into snapshots; the message is the 400 detail."""
+
+
+def payload_limit():
+    """Bytes an ingest body may inflate to (INGEST_MAX_DECOMPRESSED_MB)."""
+    return settings.INGEST_MAX_DECOMPRESSED_MB * 1024 * 1024
+
+
+def extract_snapshots(data):
+    """
+    Turn a parsed ingest body into schema-validated snapshots (see
+    api.schema). Accepts
+      1) compressed: {"payload": "<base64(gzip(JSON))>"}
+      2) direct JSON snapshot: {"hostdetails": ..., "snapshot_time": ..., "processes": [...]}
+      3) a list of snapshots (e.g. a decoded columnar body)
+
+    Returns (snapshots, invalid). A snapshot that does not match the schema
+    is left out and reported in invalid as {"index", "detail"}, so one bad
+    row does not cost the agent the rest of its batch. Raises
+    InvalidPayload when nothing in the body is valid, or
+    codecs.PayloadTooLarge when the compressed payload inflates past
+    payload_limit().
+    """
+    return _validated(_unwrap(data))
+
+
+def _unwrap(data):
+    if isinstance(data, list):
+        return data
+
+    if isinstance(data, dict) and "payload" in data:
+        try:
+            raw = base64.b64decode(data["payload"])
+            parsed = loads(decompress(raw, "gzip", payload_limit()))
+        except PayloadTooLarge:
+            raise
+        except Exception as e:
+            raise InvalidPayload(f"Failed to decode payload: {e}")
+
+        if isinstance(parsed, list):
+            return parsed
+        if isinstance(parsed, dict):
+            if "snapshots" in parsed and isinstance(parsed["snapshots"], list):
+                return parsed["snapshots"]
+            return [parsed]
+        raise InvalidPayload("Unsupported payload content")
+
+    if isinstance(data, dict):
+        if "snapshot" in data and isinstance(data["snapshot"], list):
+            return data["snapshot"]
+        if "hostdetails" in data and "snapshot_time" in data:
+            return [data]
+        raise InvalidPayload("Invalid body")
+
+    raise InvalidPayload("Unsupported body")
+
+
+def _validated(snapshots):
+    if type(snapshots) is not list:
+        raise InvalidPayload("Invalid snapshot expected a list of snapshots")
+    valid, invalid = [], []
+    for i, snap in enumerate(snapshots):
+        try:
+            valid.append(validate_snapshot(snap, f"[{i}]"))
+        except SchemaError as e:
+            invalid.append({"index": i, "detail": str(e)})
+    if invalid and not valid:
+        raise InvalidPayload(f"Invalid snapshot {invalid[0]['detail']}")
+    if invalid:
+        logger.warning("Skipped %d invalid snapshot(s), first: %s", len(invalid), invalid[0]["detail"])
+    return valid, invalid
+
+
+def parse_snapshot_time(value):
+    snap_dt = None
+    try:
+        snap_dt = parse_datetime(value)
+    except Exception:
+        snap_dt = None
+    if snap_dt is None:
+        try:
+            snap_dt = datetime.fromisoformat(value)
+        except Exception:
+            snap_dt = timezone.now()
+    if timezone.is_naive(snap_dt):
+        # agents send UTC; keep cached and stored times identical
+        snap_dt = timezone.make_aware(snap_dt, dt_timezone.utc)
+    return snap_dt
+
+
+def build_process_rows(snapshot_id, processes):
+    """Prefix validated process tuples with their snapshot id for the process store."""
+    return [(snapshot_id, *p) for p in processes]
+
+
+def _resolve_hosts(hostnames):
+    hosts = {h.hostname: h for h in Host.objects.filter(hostname__in=hostnames)}
+    missing = [name for name in hostnames if name not in hosts]
+    if missing:
+        Host.objects.bulk_create([Host(hostname=name) for name in missing], ignore_conflicts=True)
+        hosts.update({h.hostname: h for h in Host.objects.filter(hostname__in=missing)})
+    return hosts
+
+
+def prepare_snapshots(snapshots):
+    """
+    Check the host details of schema-validated snapshots and rebuild full
+    process lists from deltas, without touching the database.
+
+    Returns (prepared, resync) where resync lists hosts whose delta could
+    not be applied.
+    """
+    resync = []
+    prepared = []
+    for snap in snapshots:
+        host_data = snap.get("hostdetails", {})
+        hostname = host_data.get("hostname")
+        snapshot_time = snap.get("snapshot_time")
+
+        if not hostname or not snapshot_time:
+            continue
+
+        # agents send their static facts only when they change; most
+        # snapshots carry just the hostname and skip the serializer. Checked
+        # before the delta is applied, so a dropped snapshot never becomes
+        # the base of the next one.
+        host_fields = {}
+        if len(host_data) > 1 or type(hostname) is not str or len(hostname) > HOSTNAME_MAX:
+            serializer = HostSerializer(data=host_data, partial=True)
+            if not serializer.is_valid():
+                logger.warning("Invalid host data: %s", serializer.errors)
+                if snap.get("seq") is not None and type(hostname) is str:
+                    delta_store.forget(hostname)
+                    if hostname not in resync:
+                        resync.append(hostname)
+                continue
+            host_fields = serializer.validated_data
+
+        try:
+            processes = delta_store.apply(hostname, snap)
+        except ResyncRequired:
+            if hostname not in resync:
+                resync.append(hostname)
+            continue
+
+        prepared.append((hostname, {**host_fields, **snap["host_metrics"]}, parse_snapshot_time(snapshot_time),
+                         processes))
+
+    return prepared, resync
+
+
+def write_snapshots(prepared):
+    """
+    Store prepared snapshots with a fixed number of queries: one host
+    lookup (plus one insert for new hosts), one bulk host update for hosts
+    whose static details changed, one snapshot insert (carrying the
+    HOST_METRIC_FIELDS of each snapshot), batched executemany
+    process inserts into the configured process store, the fleet-view
+    update (api.fleet) and one update marking the 1m rollups dirty if the
+    batch reaches behind their watermark. The latest-snapshot cache is
+    refreshed after the transaction has committed.
+
+    Returns (created, entries); entries maps the snapshots to broadcast to
+    their cache entries (None where the entry could not be built).
+    """
+    if not prepared:
+        return [], {}
+
+    with metrics.ingest_db_seconds.time(), transaction.atomic():
+        hosts = _resolve_hosts(list(dict.fromkeys(p[0] for p in prepared)))
+
+        changed = {}
+        for hostname, host_fields, _, _ in prepared:
+            host = hosts[hostname]
+            for field, value in host_fields.items():
+                if field in HOST_METRIC_FIELDS:
+                    continue
+                if getattr(host, field) != value:
+                    setattr(host, field, value)
+                    changed.setdefault(hostname, set()).add(field)
+        if changed:
+            fields = sorted(set().union(*changed.values()))
+            Host.objects.bulk_update([hosts[name] for name in changed], fields)
+
+        snap_objs = Snapshot.objects.bulk_create([
+            Snapshot(host=hosts[hostname], snapshot_time=snap_dt,
+                     **{field: host_fields[field] for field in HOST_METRIC_FIELDS if field in host_fields})
+            for hostname, host_fields, snap_dt, _ in prepared
+        ])
+
+        batches = [
+            (snap_obj, build_process_rows(snap_obj.id, processes))
+            for snap_obj, (_, _, _, processes) in zip(snap_objs, prepared)
+        ]
+        get_process_store().write(batches)
+        fleet.refresh(batches)
+        rollups.mark_dirty("1m", min(snap_dt for _, _, snap_dt, _ in prepared))
+
+    metrics.ingest_snapshots.inc(len(snap_objs))
+    metrics.ingest_rows.inc(sum(len(rows) for _, rows in batches))
+    entries = cache_latest(batches)
+
+    created = [{"snapshot_id": s.id, "hostname": s.host.hostname} for s in snap_objs]
+    return created, entries
+
+
+def _broadcast_args(snap_obj, entry):
+    args = (snap_obj.id, snap_obj.host.hostname, snap_obj.snapshot_time.isoformat())
+    if entry is None:
+        # no pre-rendered frames; subscribers load the snapshot themselves
+        return args
+    return (*args, entry.ws_text, entry.patch_text, entry.patch_base)
+
+
+def forget_deltas(prepared):
+    """Prepared snapshots were not stored: make their hosts' next delta ask for a keyframe."""
+    for hostname in dict.fromkeys(p[0] for p in prepared):
+        delta_store.forget(hostname)
+
+
+def store_snapshots(prepared):
+    """Write prepared snapshots and broadcast them. Returns the created list."""
+    try:
+        created, entries = write_snapshots(prepared)
+    except Exception:
+        forget_deltas(prepared)
+        raise
+    # one broadcast per host carrying the frames rendered at write time, so
+    # subscribers forward them without querying or serializing themselves
+    with metrics.ingest_broadcast_seconds.time():
+        for snap_obj, entry in entries.items():
+            try:
+                broadcast_snapshot(*_broadcast_args(snap_obj, entry))
+            except Exception:
+                pass
+    return created
+
+
+async def broadcast_entries(entries):
+    """Broadcast written snapshots from code already running on the event loop."""
+    with metrics.ingest_broadcast_seconds.time():
+        for snap_obj, entry in entries.items():
+            try:
+                await broadcast_snapshot_async(*_broadcast_args(snap_obj, entry))
+            except Exception:
+                pass
+
+
+def cache_latest(batches):
+    """
+    Put the newest snapshot of each host in the batch into the latest-snapshot
+    cache. Returns {snapshot: cache entry} for the snapshots that are now
+    the newest of their host; older ones are not worth pushing. A host whose
+    entry fails to build maps to None, so it is still broadcast.
+    """
+    newest = {}
+    for snap_obj, rows in batches:
+        current = newest.get(snap_obj.host_id)
+        if current is None or snap_obj.snapshot_time >= current[0].snapshot_time:
+            newest[snap_obj.host_id] = (snap_obj, rows)
+    entries = {}
+    for snap_obj, rows in newest.values():
+        try:
+            snap_obj.process_rows = [dict(zip(PROCESS_KEYS, row[1:])) for row in rows]
+            entry = latest_cache.put(snap_obj)
+        except Exception:
+            logger.exception("Could not cache snapshot %s of %s", snap_obj.id, snap_obj.host.hostname)
+            latest_cache.invalidate(host_id=snap_obj.host_id)
+            entries[snap_obj] = None
+            continue
+        if entry.snapshot_id == snap_obj.id:
+            entries[snap_obj] = entry
+    return entries
+
+
+def ingest_snapshots(snapshots):
+    """Validate, prepare and store a batch of decoded snapshots. Returns (created, resync)."""
+    prepared, resync = prepare_snapshots(_validated(snapshots)[0])
+    return store_snapshots(prepared), resync
@@ -0,0 +1,116 @@
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import metrics
+from .ingest import store_snapshots
+
+
+class IngestQueue:
+    """
+    Bounded in-process queue between the ingest view and the database.
+
+    The view enqueues prepared snapshots and returns immediately; worker
+    threads drain the queue and store everything they can grab (up to
+    ``coalesce_max`` snapshots) in one transaction. A request claims its
+    place with reserve() before its deltas are applied, so a full queue
+    is refused while the agent's retry still lines up with the server's
+    delta state; submit() then fills the place and release() gives it back
+    unused. Work still queued when the process exits is lost; agents keep
+    unsent data in their own spool.
+    """
+
+    def __init__(self, maxsize, workers, coalesce_max):
+        # capacity is held by the slots; the queue itself never refuses
+        self._queue = queue.Queue()
+        self.maxsize = maxsize
+        self._slots = threading.BoundedSemaphore(maxsize)
+        self.workers = workers
+        self.coalesce_max = coalesce_max
+        self._started = False
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {"enqueued": 0, "rejected": 0, "stored": 0, "failed": 0, "transactions": 0}
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            for i in range(self.workers):
+                threading.Thread(target=self._run, name=f"ingest-worker-{i}", daemon=True).start()
+            self._started = True
+
+    def reserve(self, n):
+        """Claim a place for a request of ``n`` snapshots; False (counted as rejected) when the queue is full."""
+        if self._slots.acquire(blocking=False):
+            return True
+        self._count("rejected", n)
+        return False
+
+    def release(self):
+        """Give back a place claimed with reserve() that will not be submitted."""
+        self._slots.release()
+
+    def submit(self, prepared):
+        """Queue prepared snapshots in the place claimed with reserve()."""
+        self.start()
+        self._queue.put(prepared)
+        self._count("enqueued", len(prepared))
+
+    def _count(self, key, n):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def full(self):
+        return self.depth() >= self.maxsize
+
+    def snapshot_stats(self):
+        return {
+            **self.stats,
+            "depth": self.depth(),
+            "capacity": self.maxsize,
+            "workers": self.workers,
+        }
+
+    def _take_batch(self):
+        batch = list(self._queue.get())
+        taken = 1
+        while len(batch) < self.coalesce_max:
+            try:
+                batch.extend(self._queue.get_nowait())
+                taken += 1
+            except queue.Empty:
+                break
+        for _ in range(taken):
+            self._slots.release()
+        return batch, taken
+
+    def _run(self):
+        while True:
+            batch, taken = self._take_batch()
+            try:
+                close_old_connections()
+                store_snapshots(batch)
+                self._count("stored", len(batch))
+                self._count("transactions", 1)
+            except Exception as e:
+                self._count("failed", len(batch))
+                print(f"Ingest worker failed to store {len(batch)} snapshots: {e}")
+            finally:
+                for _ in range(taken):
+                    self._queue.task_done()
+
+
+ingest_queue = IngestQueue(
+    maxsize=settings.INGEST_QUEUE_SIZE,
+    workers=settings.INGEST_WORKERS,
+    coalesce_max=settings.INGEST_COALESCE_MAX,
+)
+
+metrics.Gauge("procmon_ingest_queue_depth", "Requests waiting in the INGEST_MODE=queue queue.",
+              function=ingest_queue.depth)
@@ -0,0 +1,59 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db.models.signals import post_save
+
+from .models import Host
+
+
+class SampleIntervals:
+    """
+    Per-host sampling intervals returned to agents in ingest responses.
+
+    Hosts with their own ``sample_interval`` are read in one query and
+    kept for ``ttl`` seconds, so ingest does not look them up per request;
+    an edit reaches the agent within ``ttl`` plus one upload.
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._intervals = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def reload(self):
+        intervals = dict(Host.objects.filter(sample_interval__isnull=False).values_list("hostname", "sample_interval"))
+        with self._lock:
+            self._intervals = intervals
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def get(self, hostnames):
+        """
+        Interval for an ingest batch (agents send one host; for several the
+        shortest wins), or None to leave the agent on its own config. Call
+        reload() first when stale() from code that must not block.
+        """
+        if self.stale():
+            self.reload()
+        values = [self._intervals.get(name) or settings.AGENT_INTERVAL for name in hostnames]
+        values = [v for v in values if v]
+        return min(values) if values else None
+
+
+sample_intervals = SampleIntervals()
+
+
+# edits through the ORM (admin, shell) in this process; others wait for the TTL
+def _host_saved(sender, instance, **kwargs):
+    sample_intervals.invalidate()
+
+
+post_save.connect(_host_saved, sender="api.Host", dispatch_uid="sample_intervals_host")
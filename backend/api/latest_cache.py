@@ -0,0 +1,214 @@
+import gzip
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models.signals import post_delete
+from rest_framework.renderers import JSONRenderer
+
+from . import metrics
+from .models import Snapshot
+from .serializers import SnapshotSerializer
+from .storage import attach_processes
+
+
+PROTOCOL_VERSION = 2
+
+
+def _process_map(process_rows):
+    return {p["pid"]: (p["ppid"], p["name"], p["cpu_percent"], p["rss_bytes"], p["start_time"])
+            for p in process_rows}
+
+
+def _process_dict(pid, values):
+    ppid, name, cpu, rss, start = values
+    return {"pid": pid, "ppid": ppid, "name": name, "cpu_percent": cpu, "rss_bytes": rss, "start_time": start}
+
+
+def build_patch(previous, current):
+    """
+    Protocol v2 patch frame turning ``previous`` into ``current``
+    (both CachedSnapshot). ``seq`` is the snapshot id and ``base`` the id
+    the client must be on to apply it.
+    """
+    old, new = previous.processes, current.processes
+    added, changed = [], []
+    for pid, values in new.items():
+        before = old.get(pid)
+        if before is None:
+            added.append(_process_dict(pid, values))
+        elif before != values:
+            changed.append(_process_dict(pid, values))
+    removed = [pid for pid in old if pid not in new]
+    return json.dumps({
+        "type": "patch",
+        "v": PROTOCOL_VERSION,
+        "host": current.meta["host"],
+        "seq": current.snapshot_id,
+        "base": previous.snapshot_id,
+        "snapshot_time": current.snapshot_time_text,
+        "added": added,
+        "changed": changed,
+        "removed": removed,
+    }, separators=(",", ":"))
+
+
+class CachedSnapshot:
+    """One host's latest snapshot, kept as ready-to-send bytes."""
+
+    __slots__ = ("host_id", "snapshot_id", "snapshot_time", "snapshot_time_text", "meta", "json", "ws_text",
+                 "processes", "patch_text", "patch_base", "_gzip", "stored_at")
+
+    def __init__(self, host_id, snapshot_id, snapshot_time, meta, json_bytes, processes):
+        self.host_id = host_id
+        self.snapshot_id = snapshot_id
+        self.snapshot_time = snapshot_time
+        self.snapshot_time_text = meta["snapshot_time"]
+        # serialized snapshot fields other than processes
+        self.meta = meta
+        self.json = json_bytes
+        # a full frame; protocol v1 clients ignore "v" and "seq"
+        self.ws_text = (f'{{"type":"snapshot","v":{PROTOCOL_VERSION},"seq":{snapshot_id},"data":'
+                        + json_bytes.decode("utf-8") + "}")
+        self.processes = processes
+        self.patch_text = None
+        self.patch_base = None
+        self._gzip = None
+        self.stored_at = time.monotonic()
+
+    def select(self, query):
+        """The serialized snapshot with its processes narrowed by a ProcessQuery."""
+        rows = (_process_dict(pid, values) for pid, values in self.processes.items())
+        return {**self.meta, "processes": query.apply(rows)}
+
+    @property
+    def gzip(self):
+        if self._gzip is None:
+            self._gzip = gzip.compress(self.json, compresslevel=5)
+        return self._gzip
+
+    @property
+    def size(self):
+        # json, ws_text and the pid map (roughly the size of the json again),
+        # the patch, and room for the gzip copy made on first request; fixed
+        # once stored so the cache's byte count stays consistent
+        return 3 * len(self.json) + len(self.patch_text or "") + len(self.json) // 8
+
+
+class LatestSnapshotCache:
+    """
+    Latest serialized snapshot per host, filled at ingest time.
+
+    Reads are a dict lookup with no database access. Entries are replaced
+    only by a newer snapshot_time, dropped when their host or snapshot is
+    deleted, expire after ``ttl`` seconds (another worker may have ingested
+    something newer) and are evicted least-recently-used once the cache
+    holds more than ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, hostname):
+        with self._lock:
+            entry = self._entries.get(hostname)
+            if entry is None:
+                return None
+            if self.ttl and time.monotonic() - entry.stored_at > self.ttl:
+                self._remove(hostname)
+                return None
+            self._entries.move_to_end(hostname)
+            return entry
+
+    def put(self, snapshot):
+        """
+        Serialize a Snapshot (with ``process_rows`` attached) and store it if
+        it is the newest for its host. When it replaces an older cached
+        snapshot, ``patch_text`` holds the v2 patch from that one. Returns
+        the entry that is current afterwards; with max_bytes = 0 it is
+        returned but not stored.
+        """
+        hostname = snapshot.host.hostname
+        current = self._entries.get(hostname)
+        if current is not None and current.snapshot_time > snapshot.snapshot_time:
+            return current
+        data = SnapshotSerializer(snapshot).data
+        meta = {key: value for key, value in data.items() if key != "processes"}
+        entry = CachedSnapshot(snapshot.host_id, snapshot.id, snapshot.snapshot_time, meta,
+                               JSONRenderer().render(data), _process_map(data["processes"]))
+        if current is not None and current.snapshot_id != entry.snapshot_id:
+            entry.patch_text = build_patch(current, entry)
+            entry.patch_base = current.snapshot_id
+        if self.max_bytes <= 0:
+            return entry
+        with self._lock:
+            current = self._entries.get(hostname)
+            if current is not None and current.snapshot_time > entry.snapshot_time:
+                return current
+            self._remove(hostname)
+            self._entries[hostname] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+        return entry
+
+    def invalidate(self, hostname=None, host_id=None, snapshot_id=None):
+        with self._lock:
+            if hostname is None and host_id is None and snapshot_id is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            for name, entry in list(self._entries.items()):
+                if name == hostname or entry.host_id == host_id or entry.snapshot_id == snapshot_id:
+                    self._remove(name)
+
+    def stats(self):
+        with self._lock:
+            return {"hosts": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+    def _remove(self, hostname):
+        entry = self._entries.pop(hostname, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+
+latest_cache = LatestSnapshotCache(
+    max_bytes=settings.LATEST_CACHE_MAX_MB * 1024 * 1024,
+    ttl=settings.LATEST_CACHE_TTL,
+)
+metrics.Gauge("procmon_latest_cache_hosts", "Hosts in the latest-snapshot cache.",
+              function=lambda: latest_cache.stats()["hosts"])
+metrics.Gauge("procmon_latest_cache_bytes", "Estimated size of the latest-snapshot cache.",
+              function=lambda: latest_cache.stats()["bytes"])
+
+
+def latest_for(hostname):
+    """Cached latest snapshot of a host, read from the database on a miss. None if it has none."""
+    entry = latest_cache.get(hostname)
+    if entry is None:
+        snap = Snapshot.objects.filter(host__hostname=hostname).select_related("host").first()
+        if snap is None:
+            return None
+        attach_processes([snap])
+        entry = latest_cache.put(snap)
+    return entry
+
+
+# deletes through the ORM (admin, shell) in this process; other processes
+# and raw retention deletes are covered by the TTL
+def _host_deleted(sender, instance, **kwargs):
+    latest_cache.invalidate(host_id=instance.pk)
+
+
+def _snapshot_deleted(sender, instance, **kwargs):
+    latest_cache.invalidate(snapshot_id=instance.pk)
+
+
+post_delete.connect(_host_deleted, sender="api.Host", dispatch_uid="latest_cache_host")
+post_delete.connect(_snapshot_deleted, sender="api.Snapshot", dispatch_uid="latest_cache_snapshot")
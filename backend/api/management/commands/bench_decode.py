@@ -0,0 +1,110 @@
+import base64
+import gzip
+import json
+import random
+import struct
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.codecs import MAGIC, decode_columnar, decompress, orjson
+from api.ingest import build_process_rows, extract_snapshots, payload_limit
+
+
+def make_snapshot(processes):
+    return {
+        "hostdetails": {"hostname": "bench-decode", "os": "Linux 6.1", "logical_cores": 8},
+        "snapshot_time": "2025-01-01T00:00:00+00:00",
+        "processes": [
+            {"pid": p, "ppid": p // 10, "name": f"proc{p % 97}",
+             "cpu_percent": round(random.random() * 5, 2), "rss_bytes": p * 4096, "start_time": 1735689600.0 + p}
+            for p in range(1, processes + 1)
+        ],
+    }
+
+
+def pack_columnar(snap):
+    """Columnar body for one full snapshot (see api.codecs), as the agent's wire module writes it."""
+    rows = snap["processes"]
+    names = {}
+    name_idx = [names.setdefault(p["name"], len(names)) for p in rows]
+    encoded = [n.encode() for n in names]
+    meta = json.dumps({k: v for k, v in snap.items() if k != "processes"}).encode()
+    n = len(rows)
+    return b"".join((
+        MAGIC,
+        struct.pack(f"<I{len(encoded)}I", len(encoded), *map(len, encoded)), *encoded,
+        struct.pack("<II", 1, len(meta)), meta,
+        struct.pack("<I", n),
+        struct.pack(f"<{n}i", *[p["pid"] for p in rows]),
+        struct.pack(f"<{n}i", *[p["ppid"] for p in rows]),
+        struct.pack(f"<{n}I", *name_idx),
+        struct.pack(f"<{n}i", *[round(p["cpu_percent"] * 100) for p in rows]),
+        struct.pack(f"<{n}q", *[p["rss_bytes"] for p in rows]),
+        struct.pack(f"<{n}q", *[round(p["start_time"] * 100) for p in rows]),
+        struct.pack("<II", 0, 0),
+    ))
+
+
+def legacy_decode(body):
+    """The path before schema validation: inflate, json.loads, then coerce every field per row."""
+    snapshots = [json.loads(gzip.decompress(base64.b64decode(json.loads(body)["payload"])).decode("utf-8"))]
+    result = []
+    for snap in snapshots:
+        rows = []
+        for p in snap.get("processes", []):
+            try:
+                rows.append((
+                    0,
+                    int(p.get("pid", 0)),
+                    int(p.get("ppid", 0)),
+                    str(p.get("name", ""))[:512],
+                    float(p.get("cpu_percent", p.get("cpu", 0.0))),
+                    int(p.get("rss_bytes", p.get("memory_rss", 0))),
+                    float(p.get("start_time", 0.0)),
+                ))
+            except Exception:
+                continue
+        result.append(rows)
+    return result
+
+
+def validated_decode(body):
+    return [build_process_rows(0, s["processes"]) for s in extract_snapshots(json.loads(body))[0]]
+
+
+def columnar_decode(body):
+    snapshots, _ = extract_snapshots(decode_columnar(decompress(body, "gzip", payload_limit())))
+    return [build_process_rows(0, s["processes"]) for s in snapshots]
+
+
+class Command(BaseCommand):
+    help = ("Time decoding one ingest snapshot into process rows: the old coerce-per-row path, the "
+            "schema-validated JSON path and the columnar path.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, nargs="+", default=[1000, 10000])
+        parser.add_argument("--repeats", type=int, default=20)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"JSON parser: {'orjson' if orjson is not None else 'json (stdlib)'}")
+        self.stdout.write(f"{'processes':>10} {'path':<22} {'ms/snapshot':>12} {'body KB':>8}")
+        for processes in options["processes"]:
+            snap = make_snapshot(processes)
+            legacy_body = json.dumps({"payload": base64.b64encode(gzip.compress(json.dumps(snap).encode())).decode()})
+            columnar_body = gzip.compress(pack_columnar(snap))
+            expected = legacy_decode(legacy_body)
+            cases = (
+                ("old: coerce per row", legacy_decode, legacy_body),
+                ("validated JSON", validated_decode, legacy_body),
+                ("validated columnar", columnar_decode, columnar_body),
+            )
+            for label, decode, body in cases:
+                if decode(body) != expected:
+                    raise AssertionError(f"{label} decoded different rows")
+                best = float("inf")
+                for _ in range(options["repeats"]):
+                    start = time.perf_counter()
+                    decode(body)
+                    best = min(best, time.perf_counter() - start)
+                self.stdout.write(f"{processes:>10} {label:<22} {best * 1000:>12.2f} {len(body) / 1024:>8.1f}")
@@ -0,0 +1,81 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+import api.routing
+from api.latest_cache import latest_cache
+from api.models import Host, Snapshot
+from api.storage import PROCESS_KEYS, get_process_store
+
+
+HOSTNAME = "bench-fanout"
+
+
+def new_snapshot(processes):
+    """Store a fresh snapshot; subscribers ignore events for snapshots they have already seen."""
+    host, _ = Host.objects.get_or_create(hostname=HOSTNAME)
+    when = datetime(2025, 1, 1, tzinfo=dt_timezone.utc) + timedelta(seconds=Snapshot.objects.count())
+    snap = Snapshot.objects.create(host=host, snapshot_time=when)
+    rows = [(snap.id, p, 1, f"proc{p % 50}", 0.5, p * 10, 1735689600.0) for p in range(processes)]
+    get_process_store().write([(snap, rows)])
+    snap.process_rows = [dict(zip(PROCESS_KEYS, row[1:])) for row in rows]
+    return snap
+
+
+class Command(BaseCommand):
+    help = ("Connect simulated WebSocket clients to one host and time a snapshot broadcast when every "
+            "subscriber queries and serializes it (old) versus one frame rendered for all (new).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 50, 200])
+        parser.add_argument("--processes", type=int, default=800)
+        parser.add_argument("--repeats", type=int, default=5)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write(f"{'clients':>8} {'per-subscriber query':>21} {'rendered once':>14}   (best of {options['repeats']}, ms)")
+            for clients in options["clients"]:
+                old_ms, new_ms = asyncio.run(self.compare(options["processes"], clients, options["repeats"]))
+                self.stdout.write(f"{clients:>8} {old_ms:>21.1f} {new_ms:>14.1f}")
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    async def compare(self, processes, clients, repeats):
+        app = URLRouter(api.routing.websocket_urlpatterns)
+        communicators = [WebsocketCommunicator(app, f"/ws/hosts/{HOSTNAME}/") for _ in range(clients)]
+        for communicator in communicators:
+            await communicator.connect()
+
+        layer = get_channel_layer()
+
+        async def fan_out(render):
+            snap = await sync_to_async(new_snapshot)(processes)
+            start = time.perf_counter()
+            message = {"type": "snapshot_created", "snapshot_id": snap.id, "hostname": HOSTNAME,
+                       "snapshot_time": snap.snapshot_time.isoformat()}
+            if render:
+                latest_cache.invalidate()
+                message["text"] = latest_cache.put(snap).ws_text
+            await layer.group_send(f"host_{HOSTNAME}", message)
+            await asyncio.gather(*(c.receive_from(timeout=120) for c in communicators))
+            return (time.perf_counter() - start) * 1000
+
+        try:
+            old_ms = min([await fan_out(render=False) for _ in range(repeats)])
+            new_ms = min([await fan_out(render=True) for _ in range(repeats)])
+        finally:
+            for communicator in communicators:
+                await communicator.disconnect()
+        return old_ms, new_ms
@@ -0,0 +1,110 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+
+from api import fleet
+from api.ingest import build_process_rows, write_snapshots
+from api.latest_cache import latest_cache
+from api.models import Host, Snapshot
+
+
+def make_prepared(hosts, processes, seq, offset=0):
+    snapshot_time = datetime(2025, 1, 1, tzinfo=dt_timezone.utc) + timedelta(seconds=5 * seq)
+    prepared = []
+    for h in range(offset, offset + hosts):
+        total = 32.0
+        prepared.append((
+            f"bench-fleet-{h}",
+            {"ram_total_gb": total, "ram_used_gb": round(random.uniform(0.3, 1.0) * total, 2),
+             "disk_total_gb": 500.0, "disk_used_gb": round(random.uniform(50, 500), 1)},
+            snapshot_time,
+            [(p, 1, f"proc{p % 97}", round(random.random() * 10, 2), random.randrange(1, 2 ** 31), 1735689600.0)
+             for p in range(1, processes + 1)],
+        ))
+    return prepared
+
+
+class Command(BaseCommand):
+    help = ("Seed a throwaway database with many hosts and time fleet queries (top processes by CPU, hosts "
+            "above 90% RAM) from the fleet view against one latest-snapshot request per host, plus the "
+            "ingest-time cost of keeping the view current.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hosts", type=int, default=5000)
+        parser.add_argument("--processes", type=int, default=100, help="processes per host")
+        parser.add_argument("--batch", type=int, default=200, help="hosts per ingest write")
+        parser.add_argument("--repeats", type=int, default=5)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def timed(self, fn, repeats):
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            best = min(best, (time.perf_counter() - start) * 1000)
+        return best
+
+    def run(self, options):
+        hosts, processes, batch = options["hosts"], options["processes"], options["batch"]
+        for offset in range(0, hosts, batch):
+            write_snapshots(make_prepared(min(batch, hosts - offset), processes, 0, offset))
+        self.stdout.write(f"seeded {hosts} hosts x {processes} processes")
+
+        # one ingest write inside FLEET_REFRESH_SECONDS of the seed (view untouched), one after it
+        # (view rewritten), and the rewrite alone
+        writes = []
+        for seq in (1, 1 + settings.FLEET_REFRESH_SECONDS // 5):
+            start = time.perf_counter()
+            write_snapshots(make_prepared(batch, processes, seq))
+            writes.append((time.perf_counter() - start) * 1000)
+        prepared = make_prepared(batch, processes, 2 + 2 * settings.FLEET_REFRESH_SECONDS // 5)
+        hosts_by_name = {h.hostname: h for h in Host.objects.filter(hostname__in=[p[0] for p in prepared])}
+        with transaction.atomic():
+            snaps = Snapshot.objects.bulk_create([Snapshot(host=hosts_by_name[p[0]], snapshot_time=p[2],
+                                                           ram_used_gb=p[1]["ram_used_gb"],
+                                                           disk_used_gb=p[1]["disk_used_gb"])
+                                                  for p in prepared])
+            batches = [(snap, build_process_rows(snap.id, p[3])) for snap, p in zip(snaps, prepared)]
+            start = time.perf_counter()
+            fleet.refresh(batches)
+            refresh_ms = (time.perf_counter() - start) * 1000
+        self.stdout.write(f"{batch}-host ingest write: {writes[0]:.1f} ms without a view refresh, {writes[1]:.1f} ms "
+                          f"with one; the refresh alone {refresh_ms:.1f} ms")
+
+        client = APIClient()
+        latest_cache.invalidate()
+
+        def per_host():
+            top = []
+            for h in range(hosts):
+                body = client.get(f"/api/hosts/bench-fleet-{h}/latest/?sort=-cpu_percent&limit=50").json()
+                top.extend(body["processes"])
+            return sorted(top, key=lambda p: -p["cpu_percent"])[:50]
+
+        cases = (
+            ("top 50 by CPU: /latest/ per host", per_host, 1),
+            ("top 50 by CPU: /fleet/processes/", lambda: client.get("/api/fleet/processes/?limit=50").json(),
+             options["repeats"]),
+            ("top 50 by RSS: /fleet/processes/",
+             lambda: client.get("/api/fleet/processes/?sort=-rss_bytes&limit=50").json(), options["repeats"]),
+            ("RAM > 90%: /fleet/hosts/", lambda: client.get("/api/fleet/hosts/?min_ram=90").json(),
+             options["repeats"]),
+        )
+        self.stdout.write(f"{'query':<36} {'ms':>10}")
+        for label, fn, repeats in cases:
+            self.stdout.write(f"{label:<36} {self.timed(fn, repeats):>10.1f}")
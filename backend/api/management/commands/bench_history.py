@@ -0,0 +1,95 @@
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+
+from api.models import Host, Snapshot
+from api.storage import get_process_store
+
+
+def seed(hosts, snapshots, processes, log):
+    base = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+    store = get_process_store()
+    for h in range(hosts):
+        host = Host.objects.create(hostname=f"bench-{h}")
+        for offset in range(0, snapshots, 1000):
+            with transaction.atomic():
+                snaps = Snapshot.objects.bulk_create([
+                    Snapshot(host=host, snapshot_time=base + timedelta(seconds=5 * i))
+                    for i in range(offset, min(offset + 1000, snapshots))
+                ])
+                store.write([
+                    (s, [(s.id, p, 1, f"proc{p % 50}", 0.5, p * 10, 1735689600.0) for p in range(processes)])
+                    for s in snaps
+                ])
+        log(f"  seeded bench-{h}: {snapshots} snapshots, {snapshots * processes:,} process rows")
+
+
+class Command(BaseCommand):
+    help = ("Seed a throwaway database and compare page-number history pagination (with the old and new "
+            "snapshot indexes) against cursor pagination at increasing depth.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hosts", type=int, default=4)
+        parser.add_argument("--snapshots", type=int, default=10000, help="snapshots per host")
+        parser.add_argument("--processes", type=int, default=50, help="processes per snapshot")
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--repeats", type=int, default=3)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            seed(options["hosts"], options["snapshots"], options["processes"], self.stdout.write)
+            self.compare(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def timed_get(self, client, url, repeats):
+        best = float("inf")
+        body = None
+        for _ in range(repeats):
+            start = time.perf_counter()
+            body = client.get(url).json()
+            best = min(best, (time.perf_counter() - start) * 1000)
+        return best, body
+
+    def compare(self, options):
+        client = APIClient()
+        size = options["page_size"]
+        repeats = options["repeats"]
+        pages = options["snapshots"] // size
+        depths = sorted({1, pages // 4, pages // 2, pages})
+        url = f"/api/history/bench-0/?page_size={size}"
+        table = connection.ops.quote_name(Snapshot._meta.db_table)
+
+        # indexes as they were before migration 0005: host_id only
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX snapshot_host_time")
+            cursor.execute(f"CREATE INDEX bench_snapshot_host ON {table} (host_id)")
+        old_ms = {d: self.timed_get(client, f"{url}&page={d}", repeats)[0] for d in depths}
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX bench_snapshot_host")
+            cursor.execute(f"CREATE INDEX snapshot_host_time ON {table} (host_id, snapshot_time DESC)")
+
+        offset_ms = {d: self.timed_get(client, f"{url}&page={d}", repeats)[0] for d in depths}
+
+        cursor_ms = {}
+        next_url = f"{url}&pagination=cursor"
+        for depth in range(1, pages + 1):
+            if depth in offset_ms:
+                cursor_ms[depth], body = self.timed_get(client, next_url, repeats)
+            else:
+                body = client.get(next_url).json()
+            next_url = body["next"]
+            if not next_url:
+                break
+
+        self.stdout.write(f"{'page':>8} {'page-number, old indexes':>25} {'page-number':>12} {'cursor':>8}   (best of {repeats}, ms)")
+        for depth in depths:
+            self.stdout.write(f"{depth:>8} {old_ms[depth]:>25.1f} {offset_ms[depth]:>12.1f} {cursor_ms.get(depth, float('nan')):>8.1f}")
@@ -0,0 +1,101 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from api.consumers import broadcast_snapshot
+from api.ingest import ingest_snapshots, parse_snapshot_time
+from api.models import Host, Snapshot, Process
+from api.serializers import HostSerializer
+
+
+def make_batch(hosts, processes, per_host, seq, static_once=False):
+    """
+    Snapshots as older agents send them, with every host detail each time,
+    or with static_once as current agents do: the static facts in a host's
+    first snapshot only and RAM use as a host_metrics sample.
+    """
+    snapshots = []
+    for h in range(hosts):
+        for i in range(per_host):
+            hostdetails = {"hostname": f"bench-{h}"}
+            if not static_once or seq == 0 and i == 0:
+                hostdetails.update({"os": "Linux 6.1", "logical_cores": 8, "ram_total_gb": 31.2})
+            ram_used = {"ram_used_gb": round(random.uniform(4, 28), 2)}
+            snapshot = {
+                "hostdetails": hostdetails,
+                "snapshot_time": f"2025-01-01T00:{seq % 60:02d}:{i % 60:02d}+00:00",
+                "processes": [
+                    {"pid": p, "ppid": p // 10, "name": f"proc{p % 97}",
+                     "cpu_percent": random.random() * 5, "rss_bytes": p * 10}
+                    for p in range(1, processes + 1)
+                ],
+            }
+            if static_once:
+                snapshot["host_metrics"] = ram_used
+            else:
+                hostdetails.update(ram_used)
+            snapshots.append(snapshot)
+    return snapshots
+
+
+def legacy_ingest(snapshots):
+    """Per-snapshot path the ingest view used before the bulk pipeline."""
+    with transaction.atomic():
+        for snap in snapshots:
+            host_data = snap["hostdetails"]
+            host, _ = Host.objects.get_or_create(hostname=host_data["hostname"])
+            serializer = HostSerializer(host, data=host_data, partial=True)
+            serializer.is_valid()
+            serializer.save()
+            snap_obj = Snapshot.objects.create(host=host, snapshot_time=parse_snapshot_time(snap["snapshot_time"]))
+            proc_objs = []
+            for p in snap["processes"]:
+                try:
+                    proc_objs.append(Process(
+                        snapshot=snap_obj,
+                        pid=int(p.get("pid", 0)),
+                        ppid=int(p.get("ppid", 0)),
+                        name=str(p.get("name", ""))[:512],
+                        cpu_percent=float(p.get("cpu_percent", 0.0)),
+                        rss_bytes=int(p.get("rss_bytes", 0)),
+                    ))
+                except Exception:
+                    continue
+            Process.objects.bulk_create(proc_objs, batch_size=500)
+            broadcast_snapshot(snap_obj.id, host.hostname, snap_obj.snapshot_time.isoformat())
+
+
+class Command(BaseCommand):
+    help = ("Compare snapshots/s of the per-snapshot and bulk ingest paths, and of bulk ingest with host details "
+            "sent every time or only once, on a throwaway test database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hosts", type=int, default=20)
+        parser.add_argument("--processes", type=int, default=300)
+        parser.add_argument("--per-host", type=int, default=5, help="snapshots per host in each batch")
+        parser.add_argument("--rounds", type=int, default=3)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            cases = (
+                ("per-snapshot", legacy_ingest, False),
+                ("bulk", ingest_snapshots, False),
+                ("bulk, static once", ingest_snapshots, True),
+            )
+            for label, fn, static_once in cases:
+                total = 0
+                elapsed = 0.0
+                for r in range(options["rounds"]):
+                    batch = make_batch(options["hosts"], options["processes"], options["per_host"], r, static_once)
+                    start = time.perf_counter()
+                    fn(batch)
+                    elapsed += time.perf_counter() - start
+                    total += len(batch)
+                self.stdout.write(f"{label:>17}: {total / elapsed:8.1f} snapshots/s "
+                                  f"({total * options['processes'] / elapsed:,.0f} process rows/s)")
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
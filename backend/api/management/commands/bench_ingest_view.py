@@ -0,0 +1,82 @@
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import path
+
+from api.views import AsyncIngestView, IngestAPIView
+from .loadtest_ws import percentile
+
+
+# mounted with override_settings(ROOT_URLCONF=__name__) so both views can be hit side by side
+urlpatterns = [
+    path("sync/", IngestAPIView.as_view()),
+    path("async/", AsyncIngestView.as_view()),
+]
+
+
+def make_body(agent, seq, processes):
+    return json.dumps({
+        "hostdetails": {"hostname": f"bench-agent-{agent}", "os": "Linux 6.1", "ram_total_gb": 31.2},
+        "snapshot_time": (datetime(2025, 1, 1, tzinfo=dt_timezone.utc) + timedelta(seconds=seq)).isoformat(),
+        "processes": [
+            {"pid": p, "ppid": p // 10, "name": f"proc{p % 97}", "cpu_percent": 0.5, "rss_bytes": p * 10}
+            for p in range(1, processes + 1)
+        ],
+    })
+
+
+class Command(BaseCommand):
+    help = ("Drive concurrent simulated agents through the ASGI handler against the DRF ingest view "
+            "and the native async one on a throwaway test database; reports snapshots/s and latency.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--agents", type=int, nargs="+", default=[1, 10, 50])
+        parser.add_argument("--posts", type=int, default=5, help="snapshots each agent sends")
+        parser.add_argument("--processes", type=int, default=300)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(ROOT_URLCONF=__name__, INGEST_MODE="sync"):
+                self.stdout.write(f"{'agents':>7} {'view':>6} {'snapshots/s':>12} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+                for agents in options["agents"]:
+                    for view in ("sync", "async"):
+                        rate, latencies, errors = asyncio.run(
+                            self.drive(view, agents, options["posts"], options["processes"]))
+                        self.stdout.write(f"{agents:>7} {view:>6} {rate:>12.1f} {statistics.median(latencies):>8.1f} "
+                                          f"{percentile(latencies, 95):>8.1f} {errors:>7}")
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    async def drive(self, view, agents, posts, processes):
+        client = AsyncClient()
+        # bodies are built up front so only the server side is timed
+        bodies = [[make_body(a, s, processes) for s in range(posts)] for a in range(agents)]
+        latencies = []
+        errors = 0
+
+        async def agent(items):
+            nonlocal errors
+            for body in items:
+                start = time.perf_counter()
+                response = await client.post(f"/{view}/", body, content_type="application/json",
+                                             headers={"X-API-Key": settings.AGENT_API_KEY})
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 201:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(agent(items) for items in bodies))
+        elapsed = time.perf_counter() - start
+        return agents * posts / elapsed, latencies, errors
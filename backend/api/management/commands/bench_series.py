@@ -0,0 +1,88 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+
+from api.models import Process
+from api.storage import get_process_store
+from .bench_history import seed
+
+
+class Command(BaseCommand):
+    help = ("Seed a throwaway database and time one process's CPU/RSS series: paging /api/history/ and "
+            "filtering on the client, versus /api/hosts/<hostname>/series/ with and without the "
+            "(snapshot, pid) / (snapshot, name) indexes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--snapshots", type=int, default=5000, help="snapshots in the series")
+        parser.add_argument("--processes", type=int, default=500, help="processes per snapshot")
+        parser.add_argument("--repeats", type=int, default=3)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            seed(1, options["snapshots"], options["processes"], self.stdout.write)
+            self.compare(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def timed(self, fn, repeats):
+        best = float("inf")
+        result = None
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = fn()
+            best = min(best, (time.perf_counter() - start) * 1000)
+        return best, result
+
+    def compare(self, options):
+        client = APIClient()
+        repeats = options["repeats"]
+        pid = options["processes"] // 2
+        window = "start=2025-01-01T00:00:00Z&end=2026-01-01T00:00:00Z"
+
+        def paged():
+            points = []
+            url = f"/api/history/bench-0/?pagination=cursor&page_size=100&{window}"
+            while url:
+                body = client.get(url).json()
+                points.extend((s["snapshot_time"], p["cpu_percent"]) for s in body["results"]
+                              for p in s["processes"] if p["pid"] == pid)
+                url = body["next"]
+            return len(points)
+
+        def series(param):
+            body = client.get(f"/api/hosts/bench-0/series/?{param}&{window}").json()
+            return sum(len(i["t"]) for i in body["instances"])
+
+        cases = [("history pages + client filter", paged),
+                 ("series ?pid=", lambda: series(f"pid={pid}")),
+                 ("series ?name=", lambda: series(f"name=proc{pid % 50}"))]
+        self.stdout.write(f"store: {get_process_store().name}")
+        self.stdout.write(f"{'path':<32} {'indexes':<10} {'ms':>10} {'points':>8}")
+
+        results = {label: self.timed(fn, repeats) for label, fn in cases}
+        # the same series reads with only the snapshot_id index, as before migration 0006
+        store = get_process_store()
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            if store.name == "daily":
+                for table in store.partitions():
+                    for suffix, _ in store.INDEXES:
+                        cursor.execute(f"DROP INDEX {qn(table + suffix)}")
+                    cursor.execute(f"CREATE INDEX {qn(table + '_snap')} ON {qn(table)} (snapshot_id)")
+            else:
+                cursor.execute("DROP INDEX process_snapshot_pid")
+                cursor.execute("DROP INDEX process_snapshot_name")
+                cursor.execute(f"CREATE INDEX bench_process_snapshot ON {qn(Process._meta.db_table)} (snapshot_id)")
+        old = {label: self.timed(fn, repeats) for label, fn in cases[1:]}
+
+        for label, (ms, points) in results.items():
+            if label in old:
+                self.stdout.write(f"{label:<32} {'snapshot':<10} {old[label][0]:>10.1f} {old[label][1]:>8}")
+            self.stdout.write(f"{label:<32} {'composite' if label in old else '':<10} {ms:>10.1f} {points:>8}")
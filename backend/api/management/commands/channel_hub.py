@@ -0,0 +1,21 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.channel_layers import ChannelHub
+
+
+class Command(BaseCommand):
+    help = ("Relay WebSocket broadcasts between backend worker processes (CHANNEL_LAYER=socket). "
+            "Start it before the workers.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default=settings.CHANNEL_HUB_PATH, help="Unix socket to listen on")
+
+    def handle(self, *args, **options):
+        hub = ChannelHub(options["path"], log=self.stdout.write)
+        try:
+            asyncio.run(hub.serve())
+        except KeyboardInterrupt:
+            self.stdout.write(f"Relayed {hub.relayed} messages, dropped {hub.dropped}")
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import requests
+import websockets
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = ("Load-test a running deployment: WebSocket clients spread over --ws workers subscribe to "
+            "synthetic hosts that are ingested through --ingest workers; reports ingest rate, "
+            "delivery and end-to-end latency.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ingest", nargs="+", default=["http://127.0.0.1:8000"], help="ingest base URLs")
+        parser.add_argument("--ws", nargs="+", default=["ws://127.0.0.1:8000"], help="WebSocket base URLs")
+        parser.add_argument("--clients", type=int, default=50)
+        parser.add_argument("--hosts", type=int, default=10)
+        parser.add_argument("--rounds", type=int, default=5)
+        parser.add_argument("--interval", type=float, default=1.0, help="seconds between rounds")
+        parser.add_argument("--processes", type=int, default=100)
+        parser.add_argument("--prefix", default="loadtest")
+        parser.add_argument("--api-key", default=settings.AGENT_API_KEY)
+        parser.add_argument("--wait", type=float, default=5.0, help="seconds to wait for late frames")
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run(options))
+
+    async def run(self, o):
+        sent_at = {}
+        latencies = []
+        received = {url: 0 for url in o["ws"]}
+
+        async def client(ws_url, ready):
+            async with websockets.connect(f"{ws_url}/ws/hosts/", max_size=None) as ws:
+                await ws.send(json.dumps({"action": "subscribe", "hosts": [f"{o['prefix']}-*"]}))
+                ready.set()
+                async for raw in ws:
+                    now = time.perf_counter()
+                    data = json.loads(raw).get("data", {})
+                    started = sent_at.get((data.get("host"), data.get("snapshot_time")))
+                    if started is not None:
+                        latencies.append((now - started) * 1000)
+                        received[ws_url] += 1
+
+        readies = [asyncio.Event() for _ in range(o["clients"])]
+        tasks = [asyncio.create_task(client(o["ws"][i % len(o["ws"])], readies[i])) for i in range(o["clients"])]
+        await asyncio.wait_for(asyncio.gather(*(r.wait() for r in readies)), timeout=30)
+        await asyncio.sleep(0.5)
+        self.stdout.write(f"{o['clients']} clients subscribed across {len(o['ws'])} worker(s)")
+
+        session = requests.Session()
+        processes = [{"pid": p, "ppid": 1, "name": f"proc{p % 40}", "cpu_percent": 0.5, "rss_bytes": p * 10}
+                     for p in range(o["processes"])]
+        base = datetime.now(dt_timezone.utc).replace(microsecond=0)
+        post_ms = []
+
+        def post(i, host, stamp):
+            url = o["ingest"][i % len(o["ingest"])]
+            body = {"hostdetails": {"hostname": host}, "snapshot_time": stamp, "processes": processes}
+            start = time.perf_counter()
+            response = session.post(f"{url}/api/ingest/", json=body, headers={"X-API-Key": o["api_key"]}, timeout=30)
+            post_ms.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+
+        started = time.perf_counter()
+        count = 0
+        for r in range(o["rounds"]):
+            round_start = time.perf_counter()
+            stamp = (base + timedelta(seconds=r)).strftime("%Y-%m-%dT%H:%M:%SZ")
+            for h in range(o["hosts"]):
+                host = f"{o['prefix']}-{h}"
+                sent_at[(host, stamp)] = time.perf_counter()
+                await asyncio.to_thread(post, count, host, stamp)
+                count += 1
+            await asyncio.sleep(max(0, o["interval"] - (time.perf_counter() - round_start)))
+        ingest_s = time.perf_counter() - started
+
+        expected = count * o["clients"]
+        deadline = time.perf_counter() + o["wait"]
+        while sum(received.values()) < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.1)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        got = sum(received.values())
+        self.stdout.write(f"ingested {count} snapshots in {ingest_s:.1f}s; POST p50 {statistics.median(post_ms):.1f} ms, "
+                          f"p95 {percentile(post_ms, 95):.1f} ms")
+        self.stdout.write(f"frames delivered {got}/{expected} ({100 * got / max(expected, 1):.1f}%)")
+        for url, n in received.items():
+            self.stdout.write(f"  {url}: {n}")
+        self.stdout.write(f"delivery latency p50 {percentile(latencies, 50):.1f} ms, p95 {percentile(latencies, 95):.1f} ms, "
+                          f"p99 {percentile(latencies, 99):.1f} ms, max {max(latencies, default=float('nan')):.1f} ms")
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.models import Snapshot, Process
+from api.storage import PROCESS_KEYS, DailyProcessStore, _q
+
+
+class Command(BaseCommand):
+    help = "Copy process rows from api_process into day-partitioned tables (for PROCESS_STORAGE=daily)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk", type=int, default=200, help="snapshots copied per transaction")
+        parser.add_argument("--keep", action="store_true", help="leave the copied rows in api_process")
+
+    def handle(self, *args, **options):
+        store = DailyProcessStore()
+        snapshots = Snapshot.objects.filter(processes__isnull=False).distinct().order_by("id")
+        total = snapshots.count()
+        if not total:
+            raise CommandError("api_process is empty; nothing to migrate.")
+
+        done = 0
+        last_id = 0
+        while True:
+            chunk = list(snapshots.filter(id__gt=last_id)[:options["chunk"]])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            ids = [s.id for s in chunk]
+            rows = {}
+            for row in Process.objects.filter(snapshot_id__in=ids).values_list(
+                "snapshot_id", *PROCESS_KEYS
+            ):
+                rows.setdefault(row[0], []).append(row)
+            with transaction.atomic():
+                store.write([(s, rows.get(s.id, [])) for s in chunk])
+                if not options["keep"]:
+                    with connection.cursor() as cursor:
+                        cursor.execute(
+                            f"DELETE FROM {_q(Process._meta.db_table)} WHERE {_q('snapshot_id')} IN "
+                            f"({', '.join(['%s'] * len(ids))})",
+                            ids,
+                        )
+            done += len(chunk)
+            self.stdout.write(f"  {done}/{total} snapshots")
+
+        self.stdout.write(self.style.SUCCESS("Done. Set PROCESS_STORAGE=daily and restart the backend."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.storage import get_process_store, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = "Remove snapshot history older than HISTORY_RETENTION_DAYS (or --days). Run it from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None, help="override HISTORY_RETENTION_DAYS")
+
+    def handle(self, *args, **options):
+        cutoff = retention_cutoff(options["days"])
+        if cutoff is None:
+            raise CommandError("Retention is disabled; set HISTORY_RETENTION_DAYS or pass --days.")
+        store = get_process_store()
+        removed = store.prune(cutoff)
+        self.stdout.write(f"Removed {removed} snapshots older than {cutoff.isoformat()} ({store.name} storage)")
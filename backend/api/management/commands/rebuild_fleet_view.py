@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api import fleet
+
+
+class Command(BaseCommand):
+    help = ("Fill the fleet view (HostLatest / LatestProcess) from each host's newest snapshot. Ingest keeps "
+            "it current; run once after upgrading or after changing FLEET_TOP_PROCESSES.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = fleet.rebuild()
+        self.stdout.write(f"Rebuilt the fleet view for {count} hosts")
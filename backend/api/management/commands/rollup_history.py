@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.rollups import run_rollups
+
+
+class Command(BaseCommand):
+    help = "Build 1-minute, 1-hour and 1-day rollups of snapshot history up to the last complete bucket."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", type=int, default=0, metavar="SECONDS",
+                            help="keep running, catching up every SECONDS")
+
+    def handle(self, *args, **options):
+        while True:
+            run_rollups(log=self.stdout.write)
+            if not options["loop"]:
+                break
+            time.sleep(options["loop"])
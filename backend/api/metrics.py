@@ -0,0 +1,180 @@
+"""
+Process-local metrics served in the Prometheus text format at /api/metrics/.
+
+Counters, gauges and histograms are kept in memory behind one lock each;
+recording a value is a dict update, cheap enough for the ingest and
+broadcast paths. Gauges can also be read from a function at scrape time
+(queue depths, cache size). Every worker process has its own values, so
+scrape each worker separately and let Prometheus tell them apart by
+instance.
+
+The metric classes and render() are shared with agent/metrics.py, which
+cannot import the backend; the two copies are kept identical (api.tests
+checks).
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(9))  # 1 KiB .. 64 MiB
+
+_registry = []
+
+
+# shared with agent/metrics.py from here to render()
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._values[()] = self._zero()
+        _registry.append(self)
+
+    def _zero(self):
+        return 0
+
+    def _key(self, labels):
+        # str() so label values of mixed types (200, "error") still sort
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, value, *extra in self.samples():
+            lines.append(f"{name}{_format_labels(self.labelnames, key, *extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), function=None):
+        super().__init__(name, help, labels)
+        self.function = function
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.function is None:
+            return super().samples()
+        try:
+            value = self.function()
+        except Exception:
+            return []
+        return [(self.name, (), value)]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=TIME_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels)
+
+    def _zero(self):
+        return [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = self._zero()
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(state[0]), state[1], state[2]) for key, state in sorted(self._values.items())]
+        samples = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts):
+                cumulative += n
+                samples.append((f"{self.name}_bucket", key, cumulative, (("le", _format_value(bound)),)))
+            samples.append((f"{self.name}_sum", key, total))
+            samples.append((f"{self.name}_count", key, count))
+        return samples
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ingest
+ingest_requests = Counter("procmon_ingest_requests_total", "Ingest requests by response status.", ["status"])
+ingest_body_bytes = Histogram("procmon_ingest_body_bytes", "Ingest request body size as received.",
+                              buckets=SIZE_BUCKETS)
+ingest_decode_seconds = Histogram("procmon_ingest_decode_seconds",
+                                  "Time to decompress, parse and validate an ingest body.")
+ingest_db_seconds = Histogram("procmon_ingest_db_seconds", "Time of one ingest database transaction.")
+ingest_broadcast_seconds = Histogram("procmon_ingest_broadcast_seconds",
+                                     "Time to broadcast the snapshots of one ingest write.")
+ingest_snapshots = Counter("procmon_ingest_snapshots_total", "Snapshots written.")
+ingest_rows = Counter("procmon_ingest_rows_total", "Process rows written.")
+
+# WebSocket fan-out
+broadcasts = Counter("procmon_broadcasts_total", "Snapshot events sent to channel layer groups.")
+ws_connections = Gauge("procmon_ws_connections", "Open WebSocket connections.")
+ws_frames = Counter("procmon_ws_frames_total", "Frames sent to WebSocket clients by type.", ["type"])
+ws_coalesced = Counter("procmon_ws_coalesced_total", "Snapshot events replaced by a newer one under max_rate.")
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_host_disk_free_gb_host_disk_total_gb_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessName',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=512, unique=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_processname'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(max_length=2, unique=True)),
+                ('completed_until', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HostRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('1m', '1 minute'), ('1h', '1 hour'), ('1d', '1 day')], max_length=2)),
+                ('bucket', models.DateTimeField()),
+                ('samples', models.PositiveIntegerField()),
+                ('cpu_avg', models.FloatField()),
+                ('cpu_max', models.FloatField()),
+                ('rss_avg', models.FloatField()),
+                ('rss_max', models.BigIntegerField()),
+                ('count_avg', models.FloatField()),
+                ('count_max', models.PositiveIntegerField()),
+                ('host', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.host')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('host', 'resolution', 'bucket'), name='uniq_host_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProcessRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('1m', '1 minute'), ('1h', '1 hour'), ('1d', '1 day')], max_length=2)),
+                ('bucket', models.DateTimeField()),
+                ('samples', models.PositiveIntegerField()),
+                ('cpu_avg', models.FloatField()),
+                ('cpu_max', models.FloatField()),
+                ('rss_avg', models.FloatField()),
+                ('rss_max', models.BigIntegerField()),
+                ('count_avg', models.FloatField()),
+                ('count_max', models.PositiveIntegerField()),
+                ('name', models.CharField(max_length=512)),
+                ('host', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.host')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('host', 'resolution', 'bucket', 'name'), name='uniq_process_rollup')],
+            },
+        ),
+    ]
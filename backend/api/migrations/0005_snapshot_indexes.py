@@ -0,0 +1,70 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Single-column indexes made redundant or unused: pid/ppid are never
+# filtered on, and host_id lookups are covered by snapshot_host_time.
+UNUSED_INDEXES = [("process", "pid"), ("process", "ppid"), ("snapshot", "host_id")]
+
+
+def drop_unused_indexes(apps, schema_editor):
+    # Drop the indexes in place; letting AlterField do it rebuilds the whole
+    # table on SQLite, which is slow on large histories.
+    qn = schema_editor.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        for model_name, column in UNUSED_INDEXES:
+            table = apps.get_model("api", model_name)._meta.db_table
+            constraints = schema_editor.connection.introspection.get_constraints(cursor, table)
+            for name, info in constraints.items():
+                if (info["index"] and info["columns"] == [column]
+                        and not (info["primary_key"] or info["unique"] or info["foreign_key"])):
+                    schema_editor.execute(schema_editor.sql_delete_index % {"table": qn(table), "name": qn(name)})
+
+
+def restore_indexes(apps, schema_editor):
+    for model_name, column in UNUSED_INDEXES:
+        model = apps.get_model("api", model_name)
+        field = column.removesuffix("_id")
+        schema_editor.add_index(model, models.Index(fields=[field], name=f"{model._meta.db_table}_{field}_idx"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='snapshot',
+            index=models.Index(fields=['host', '-snapshot_time'], name='snapshot_host_time'),
+        ),
+        migrations.AddIndex(
+            model_name='snapshot',
+            index=models.Index(fields=['snapshot_time'], name='snapshot_time'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(drop_unused_indexes, restore_indexes),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='process',
+                    name='pid',
+                    field=models.IntegerField(),
+                ),
+                migrations.AlterField(
+                    model_name='process',
+                    name='ppid',
+                    field=models.IntegerField(),
+                ),
+                migrations.AlterField(
+                    model_name='snapshot',
+                    name='host',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='api.host'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+DAY_TABLE_PREFIX = "api_process_p"
+DAY_TABLE_INDEXES = (("_snap_pid", "snapshot_id, pid"), ("_snap_name", "snapshot_id, name_id"))
+
+
+def drop_snapshot_index(apps, schema_editor):
+    # (snapshot_id, pid) covers every lookup the single-column FK index served;
+    # drop it in place rather than letting AlterField rebuild api_process.
+    qn = schema_editor.quote_name
+    table = apps.get_model("api", "process")._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        constraints = schema_editor.connection.introspection.get_constraints(cursor, table)
+        for name, info in constraints.items():
+            if (info["index"] and info["columns"] == ["snapshot_id"]
+                    and not (info["primary_key"] or info["unique"] or info["foreign_key"])):
+                schema_editor.execute(schema_editor.sql_delete_index % {"table": qn(table), "name": qn(name)})
+
+
+def restore_snapshot_index(apps, schema_editor):
+    model = apps.get_model("api", "process")
+    schema_editor.add_index(model, models.Index(fields=["snapshot"], name="api_process_snapshot_idx"))
+
+
+def index_day_tables(apps, schema_editor):
+    # day tables created before this migration only have the snapshot_id index
+    qn = schema_editor.quote_name
+    tables = [t for t in schema_editor.connection.introspection.table_names() if t.startswith(DAY_TABLE_PREFIX)]
+    for table in tables:
+        for suffix, columns in DAY_TABLE_INDEXES:
+            schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {qn(table + suffix)} ON {qn(table)} ({columns})")
+        schema_editor.execute(f"DROP INDEX IF EXISTS {qn(table + '_snap')}")
+
+
+def unindex_day_tables(apps, schema_editor):
+    qn = schema_editor.quote_name
+    tables = [t for t in schema_editor.connection.introspection.table_names() if t.startswith(DAY_TABLE_PREFIX)]
+    for table in tables:
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {qn(table + '_snap')} ON {qn(table)} (snapshot_id)")
+        for suffix, _ in DAY_TABLE_INDEXES:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {qn(table + suffix)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_snapshot_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='process',
+            index=models.Index(fields=['snapshot', 'pid'], name='process_snapshot_pid'),
+        ),
+        migrations.AddIndex(
+            model_name='process',
+            index=models.Index(fields=['snapshot', 'name'], name='process_snapshot_name'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(drop_snapshot_index, restore_snapshot_index),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='process',
+                    name='snapshot',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='processes', to='api.snapshot'),
+                ),
+            ],
+        ),
+        migrations.RunPython(index_day_tables, unindex_day_tables),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_process_series_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HostLatest',
+            fields=[
+                ('host', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='latest', serialize=False, to='api.host')),
+                ('snapshot_time', models.DateTimeField()),
+                ('process_count', models.PositiveIntegerField()),
+                ('cpu_percent', models.FloatField()),
+                ('rss_bytes', models.BigIntegerField()),
+                ('ram_percent', models.FloatField(blank=True, null=True)),
+                ('disk_percent', models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-ram_percent'], name='host_latest_ram'), models.Index(fields=['-disk_percent'], name='host_latest_disk'), models.Index(fields=['-cpu_percent'], name='host_latest_cpu')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LatestProcess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pid', models.IntegerField()),
+                ('ppid', models.IntegerField()),
+                ('name', models.CharField(max_length=512)),
+                ('cpu_percent', models.FloatField()),
+                ('rss_bytes', models.BigIntegerField()),
+                ('host', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='latest_processes', to='api.host')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-cpu_percent'], name='latest_process_cpu'), models.Index(fields=['-rss_bytes'], name='latest_process_rss')],
+            },
+        ),
+    ]
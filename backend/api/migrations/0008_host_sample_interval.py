@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_fleet_view'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='host',
+            name='sample_interval',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
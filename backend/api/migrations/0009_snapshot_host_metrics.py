@@ -0,0 +1,73 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:04
+
+from django.db import migrations, models
+
+
+METRIC_FIELDS = ("ram_used_gb", "ram_available_gb", "disk_used_gb", "disk_free_gb")
+
+
+def copy_to_latest_snapshot(apps, schema_editor):
+    # the host row only ever held the last reported values; keep them on
+    # each host's newest snapshot
+    Host = apps.get_model("api", "host")
+    Snapshot = apps.get_model("api", "snapshot")
+    for host in Host.objects.iterator():
+        latest = Snapshot.objects.filter(host=host).order_by("-snapshot_time").first()
+        if latest is not None:
+            Snapshot.objects.filter(pk=latest.pk).update(**{f: getattr(host, f) for f in METRIC_FIELDS})
+
+
+def copy_to_host(apps, schema_editor):
+    Host = apps.get_model("api", "host")
+    Snapshot = apps.get_model("api", "snapshot")
+    for host in Host.objects.iterator():
+        latest = Snapshot.objects.filter(host=host).order_by("-snapshot_time").values(*METRIC_FIELDS).first()
+        if latest is not None:
+            Host.objects.filter(pk=host.pk).update(**latest)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_host_sample_interval'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snapshot',
+            name='ram_used_gb',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='snapshot',
+            name='ram_available_gb',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='snapshot',
+            name='disk_used_gb',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='snapshot',
+            name='disk_free_gb',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(copy_to_latest_snapshot, copy_to_host),
+        migrations.RemoveField(
+            model_name='host',
+            name='ram_used_gb',
+        ),
+        migrations.RemoveField(
+            model_name='host',
+            name='ram_available_gb',
+        ),
+        migrations.RemoveField(
+            model_name='host',
+            name='disk_used_gb',
+        ),
+        migrations.RemoveField(
+            model_name='host',
+            name='disk_free_gb',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_snapshot_host_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rollupstate',
+            name='dirty_since',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:39
+
+from django.db import migrations, models
+
+
+DAY_TABLE_PREFIX = "api_process_p"
+
+
+def _day_tables(schema_editor):
+    return [t for t in schema_editor.connection.introspection.table_names() if t.startswith(DAY_TABLE_PREFIX)]
+
+
+def add_day_table_column(apps, schema_editor):
+    # day tables are created by DailyProcessStore, outside the migration state
+    qn = schema_editor.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        for table in _day_tables(schema_editor):
+            columns = [c.name for c in schema_editor.connection.introspection.get_table_description(cursor, table)]
+            if "start_time" not in columns:
+                schema_editor.execute(
+                    f"ALTER TABLE {qn(table)} ADD COLUMN start_time double precision NOT NULL DEFAULT 0"
+                )
+
+
+def drop_day_table_column(apps, schema_editor):
+    qn = schema_editor.quote_name
+    for table in _day_tables(schema_editor):
+        schema_editor.execute(f"ALTER TABLE {qn(table)} DROP COLUMN start_time")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_rollupstate_dirty_since'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='process',
+            name='start_time',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.RunPython(add_day_table_column, drop_day_table_column),
+    ]
@@ -10,13 +10,14 @@ class Host(models.Model):
     physical_cores = models.PositiveIntegerField(blank=True, null=True)
     logical_cores = models.PositiveIntegerField(blank=True, null=True)
     
+    # static facts, written only when the agent reports a change; RAM and
+    # disk use are kept per snapshot
     ram_total_gb = models.FloatField(blank=True, null=True)
-    ram_used_gb = models.FloatField(blank=True, null=True)
-    ram_available_gb = models.FloatField(blank=True, null=True)
-    
     disk_total_gb = models.FloatField(blank=True, null=True)
-    disk_used_gb = models.FloatField(blank=True, null=True)
-    disk_free_gb = models.FloatField(blank=True, null=True)
+
+    # seconds between samples, told to the host's agent in ingest responses
+    # (null: settings.AGENT_INTERVAL); set by operators, never by the agent
+    sample_interval = models.PositiveIntegerField(blank=True, null=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -28,20 +29,129 @@ class Host(models.Model):
         return self.hostname
 
 class Snapshot(models.Model):
-    host = models.ForeignKey(Host, on_delete=models.CASCADE, related_name="snapshots")
+    # host lookups are served by the (host, snapshot_time) index below
+    host = models.ForeignKey(Host, on_delete=models.CASCADE, related_name="snapshots", db_index=False)
     snapshot_time = models.DateTimeField()
+    ram_used_gb = models.FloatField(blank=True, null=True)
+    ram_available_gb = models.FloatField(blank=True, null=True)
+    disk_used_gb = models.FloatField(blank=True, null=True)
+    disk_free_gb = models.FloatField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["-snapshot_time"]
+        indexes = [
+            models.Index(fields=["host", "-snapshot_time"], name="snapshot_host_time"),
+            models.Index(fields=["snapshot_time"], name="snapshot_time"),
+        ]
 
     def __str__(self):
         return f"{self.host.hostname} @ {self.snapshot_time.isoformat()}"
 
 class Process(models.Model):
-    snapshot = models.ForeignKey(Snapshot, on_delete=models.CASCADE, related_name="processes")
-    pid = models.IntegerField(db_index=True)
-    ppid = models.IntegerField(db_index=True)
+    # snapshot lookups are served by the composite indexes below
+    snapshot = models.ForeignKey(Snapshot, on_delete=models.CASCADE, related_name="processes", db_index=False)
+    pid = models.IntegerField()
+    ppid = models.IntegerField()
+    name = models.CharField(max_length=512)
+    cpu_percent = models.FloatField()
+    rss_bytes = models.BigIntegerField()
+    # Unix seconds; 0 when the agent did not send it
+    start_time = models.FloatField(default=0.0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["snapshot", "pid"], name="process_snapshot_pid"),
+            models.Index(fields=["snapshot", "name"], name="process_snapshot_name"),
+        ]
+
+
+class ProcessName(models.Model):
+    """Interned process names referenced by the day-partitioned process tables."""
+    name = models.CharField(max_length=512, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class RollupFields(models.Model):
+    RESOLUTIONS = [("1m", "1 minute"), ("1h", "1 hour"), ("1d", "1 day")]
+
+    host = models.ForeignKey(Host, on_delete=models.CASCADE)
+    resolution = models.CharField(max_length=2, choices=RESOLUTIONS)
+    bucket = models.DateTimeField()
+    samples = models.PositiveIntegerField()
+    cpu_avg = models.FloatField()
+    cpu_max = models.FloatField()
+    rss_avg = models.FloatField()
+    rss_max = models.BigIntegerField()
+    count_avg = models.FloatField()
+    count_max = models.PositiveIntegerField()
+
+    class Meta:
+        abstract = True
+
+
+class HostRollup(RollupFields):
+    """Per-host totals (sum over all processes) aggregated per time bucket."""
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["host", "resolution", "bucket"], name="uniq_host_rollup"),
+        ]
+
+
+class ProcessRollup(RollupFields):
+    """Per-host, per-process-name totals aggregated per time bucket."""
     name = models.CharField(max_length=512)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["host", "resolution", "bucket", "name"], name="uniq_process_rollup"),
+        ]
+
+
+class RollupState(models.Model):
+    """How far each resolution has been rolled up."""
+    resolution = models.CharField(max_length=2, unique=True)
+    completed_until = models.DateTimeField()
+    # earliest source data written behind completed_until since the last
+    # run (late uploads); those buckets are rebuilt on the next run
+    dirty_since = models.DateTimeField(blank=True, null=True)
+
+
+class HostLatest(models.Model):
+    """
+    Summary of each host's newest snapshot, kept up to date at ingest (see
+    api.fleet) so fleet-wide queries never scan Snapshot or Process.
+    """
+    host = models.OneToOneField(Host, on_delete=models.CASCADE, primary_key=True, related_name="latest")
+    snapshot_time = models.DateTimeField()
+    process_count = models.PositiveIntegerField()
     cpu_percent = models.FloatField()
     rss_bytes = models.BigIntegerField()
+    ram_percent = models.FloatField(blank=True, null=True)
+    disk_percent = models.FloatField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-ram_percent"], name="host_latest_ram"),
+            models.Index(fields=["-disk_percent"], name="host_latest_disk"),
+            models.Index(fields=["-cpu_percent"], name="host_latest_cpu"),
+        ]
+
+
+class LatestProcess(models.Model):
+    """The heaviest processes (by CPU and by RSS) of each host's newest snapshot."""
+    host = models.ForeignKey(Host, on_delete=models.CASCADE, related_name="latest_processes")
+    pid = models.IntegerField()
+    ppid = models.IntegerField()
+    name = models.CharField(max_length=512)
+    cpu_percent = models.FloatField()
+    rss_bytes = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-cpu_percent"], name="latest_process_cpu"),
+            models.Index(fields=["-rss_bytes"], name="latest_process_rss"),
+        ]
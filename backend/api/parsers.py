@@ -0,0 +1,44 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError, UnsupportedMediaType
+from rest_framework.parsers import BaseParser, JSONParser
+
+from .codecs import COLUMNAR_CONTENT_TYPE, PayloadTooLarge, UnsupportedEncoding, decode_columnar, decompress, loads
+from .ingest import payload_limit
+
+
+class RequestTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Payload too large."
+    default_code = "payload_too_large"
+
+
+class ColumnarParser(BaseParser):
+    """
+    Parses the binary columnar agent payload (see api.codecs) into a list
+    of snapshot dicts, honouring the request's Content-Encoding.
+    """
+
+    media_type = COLUMNAR_CONTENT_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context["request"]
+        encoding = request.META.get("HTTP_CONTENT_ENCODING")
+        try:
+            raw = decompress(stream.read(), encoding, payload_limit())
+            return decode_columnar(raw)
+        except UnsupportedEncoding as e:
+            raise UnsupportedMediaType(f"{media_type}; encoding={e}")
+        except PayloadTooLarge as e:
+            raise RequestTooLarge(str(e))
+        except Exception as e:
+            raise ParseError(f"Failed to decode payload: {e}")
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser using codecs.loads (orjson when installed) for ingest bodies."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return loads(stream.read())
+        except ValueError as e:
+            raise ParseError(f"JSON parse error - {e}")
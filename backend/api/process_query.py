@@ -0,0 +1,119 @@
+import heapq
+from operator import itemgetter
+
+from .storage import PROCESS_KEYS
+
+
+class ProcessQuery:
+    """
+    Process-list options shared by the latest and history endpoints:
+
+        ?sort=-cpu_percent   sort key, "-" for descending
+        ?limit=20            keep the first N after sorting
+        ?pid=1234            one process id
+        ?name=nginx          exact process name
+        ?prefix=postgres     process name prefix
+        ?min_cpu=1.5         cpu_percent >= value
+        ?min_rss=1000        rss_bytes >= value
+        ?fields=pid,name     return only these keys
+
+    Filters are pushed into the process store query (``orm_filters``);
+    ``apply`` runs the whole query over rows already in memory.
+    """
+
+    PARAMS = ("sort", "limit", "pid", "name", "prefix", "min_cpu", "min_rss", "fields")
+
+    def __init__(self, sort=None, descending=False, limit=None, pid=None, name=None, prefix=None,
+                 min_cpu=None, min_rss=None, fields=None):
+        self.sort = sort
+        self.descending = descending
+        self.limit = limit
+        self.pid = pid
+        self.name = name
+        self.prefix = prefix
+        self.min_cpu = min_cpu
+        self.min_rss = min_rss
+        self.fields = fields
+
+    @classmethod
+    def from_params(cls, params):
+        """Build from request query params; None when none are given. Raises ValueError on bad values."""
+        if not any(params.get(p) for p in cls.PARAMS):
+            return None
+        query = cls(name=params.get("name") or None, prefix=params.get("prefix") or None)
+
+        sort = params.get("sort")
+        if sort:
+            query.descending = sort.startswith("-")
+            query.sort = sort.lstrip("-")
+            if query.sort not in PROCESS_KEYS:
+                raise ValueError(f"sort must be one of {', '.join(PROCESS_KEYS)} (prefix '-' for descending)")
+        if params.get("limit"):
+            query.limit = cls._number(params, "limit", int)
+            if query.limit < 1:
+                raise ValueError("limit must be a positive integer")
+        if params.get("pid"):
+            query.pid = cls._number(params, "pid", int)
+        if params.get("min_cpu"):
+            query.min_cpu = cls._number(params, "min_cpu", float)
+        if params.get("min_rss"):
+            query.min_rss = cls._number(params, "min_rss", int)
+        if params.get("fields"):
+            query.fields = [f.strip() for f in params["fields"].split(",") if f.strip()]
+            unknown = [f for f in query.fields if f not in PROCESS_KEYS]
+            if unknown:
+                raise ValueError(f"unknown fields: {', '.join(unknown)}")
+        return query
+
+    @staticmethod
+    def _number(params, key, cast):
+        try:
+            return cast(params[key])
+        except (TypeError, ValueError):
+            raise ValueError(f"{key} must be a number")
+
+    def orm_filters(self):
+        """Filter kwargs for a queryset over process rows."""
+        filters = {}
+        if self.pid is not None:
+            filters["pid"] = self.pid
+        if self.name is not None:
+            filters["name"] = self.name
+        if self.prefix is not None:
+            filters["name__startswith"] = self.prefix
+        if self.min_cpu is not None:
+            filters["cpu_percent__gte"] = self.min_cpu
+        if self.min_rss is not None:
+            filters["rss_bytes__gte"] = self.min_rss
+        return filters
+
+    def matches(self, row):
+        if self.pid is not None and row["pid"] != self.pid:
+            return False
+        if self.name is not None and row["name"] != self.name:
+            return False
+        if self.prefix is not None and not row["name"].startswith(self.prefix):
+            return False
+        if self.min_cpu is not None and row["cpu_percent"] < self.min_cpu:
+            return False
+        if self.min_rss is not None and row["rss_bytes"] < self.min_rss:
+            return False
+        return True
+
+    def finish(self, rows):
+        """Sort, limit and project rows that already passed the filters."""
+        if self.sort:
+            key = itemgetter(self.sort)
+            if self.limit and self.limit < len(rows):
+                pick = heapq.nlargest if self.descending else heapq.nsmallest
+                rows = pick(self.limit, rows, key=key)
+            else:
+                rows = sorted(rows, key=key, reverse=self.descending)
+        if self.limit:
+            rows = rows[:self.limit]
+        if self.fields:
+            rows = [{f: row[f] for f in self.fields} for row in rows]
+        return rows
+
+    def apply(self, rows):
+        return self.finish([row for row in rows if self.matches(row)])
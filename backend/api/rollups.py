@@ -0,0 +1,214 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .models import Snapshot, HostRollup, ProcessRollup, RollupState
+from .storage import get_process_store
+
+
+RESOLUTIONS = {"1m": 60, "1h": 3600, "1d": 86400}
+SOURCES = {"1h": "1m", "1d": "1h"}
+# how much source data one rollup pass reads at a time
+WINDOWS = {"1m": timedelta(hours=1), "1h": timedelta(days=1), "1d": timedelta(days=31)}
+SNAPSHOT_CHUNK = 200
+
+
+def floor_time(dt, resolution):
+    seconds = RESOLUTIONS[resolution]
+    ts = int(dt.timestamp())
+    return datetime.fromtimestamp(ts - ts % seconds, tz=dt_timezone.utc)
+
+
+def choose_resolution(start, end, max_points=None):
+    """Pick the finest rollup resolution that keeps the range under max_points buckets."""
+    max_points = max_points or settings.HISTORY_MAX_POINTS
+    span = (end - start).total_seconds()
+    for resolution, seconds in RESOLUTIONS.items():
+        if span / seconds <= max_points:
+            return resolution
+    return "1d"
+
+
+class _Acc:
+    __slots__ = ("samples", "cpu_sum", "cpu_max", "rss_sum", "rss_max", "count_sum", "count_max")
+
+    def __init__(self):
+        self.samples = 0
+        self.cpu_sum = self.cpu_max = 0.0
+        self.rss_sum = 0.0
+        self.rss_max = 0
+        self.count_sum = 0.0
+        self.count_max = 0
+
+    def add(self, cpu, rss, count):
+        self.samples += 1
+        self.cpu_sum += cpu
+        self.rss_sum += rss
+        self.count_sum += count
+        self.cpu_max = max(self.cpu_max, cpu)
+        self.rss_max = max(self.rss_max, rss)
+        self.count_max = max(self.count_max, count)
+
+    def merge(self, row):
+        self.samples += row.samples
+        self.cpu_sum += row.cpu_avg * row.samples
+        self.rss_sum += row.rss_avg * row.samples
+        self.count_sum += row.count_avg * row.samples
+        self.cpu_max = max(self.cpu_max, row.cpu_max)
+        self.rss_max = max(self.rss_max, row.rss_max)
+        self.count_max = max(self.count_max, row.count_max)
+
+    def fields(self):
+        n = self.samples
+        return {
+            "samples": n,
+            "cpu_avg": self.cpu_sum / n,
+            "cpu_max": self.cpu_max,
+            "rss_avg": self.rss_sum / n,
+            "rss_max": self.rss_max,
+            "count_avg": self.count_sum / n,
+            "count_max": self.count_max,
+        }
+
+
+def _from_raw(start, end):
+    hosts, names = {}, {}
+    snapshots = Snapshot.objects.filter(snapshot_time__gte=start, snapshot_time__lt=end).order_by("id")
+    last_id = 0
+    store = get_process_store()
+    while True:
+        chunk = list(snapshots.filter(id__gt=last_id)[:SNAPSHOT_CHUNK])
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+        rows = store.read(chunk)
+        for snap in chunk:
+            bucket = floor_time(snap.snapshot_time, "1m")
+            per_name = {}
+            cpu_total = rss_total = 0
+            for p in rows[snap.id]:
+                t = per_name.get(p["name"])
+                if t is None:
+                    t = per_name[p["name"]] = [0.0, 0, 0]
+                t[0] += p["cpu_percent"]
+                t[1] += p["rss_bytes"]
+                t[2] += 1
+                cpu_total += p["cpu_percent"]
+                rss_total += p["rss_bytes"]
+            hosts.setdefault((snap.host_id, bucket), _Acc()).add(cpu_total, rss_total, len(rows[snap.id]))
+            for name, (cpu, rss, count) in per_name.items():
+                names.setdefault((snap.host_id, bucket, name), _Acc()).add(cpu, rss, count)
+    return hosts, names
+
+
+def _from_rollups(source, resolution, start, end):
+    hosts, names = {}, {}
+    for row in HostRollup.objects.filter(resolution=source, bucket__gte=start, bucket__lt=end).iterator():
+        hosts.setdefault((row.host_id, floor_time(row.bucket, resolution)), _Acc()).merge(row)
+    for row in ProcessRollup.objects.filter(resolution=source, bucket__gte=start, bucket__lt=end).iterator():
+        names.setdefault((row.host_id, floor_time(row.bucket, resolution), row.name), _Acc()).merge(row)
+    return hosts, names
+
+
+def roll_up(resolution, start, end):
+    """(Re)build the ``resolution`` buckets in [start, end). Safe to re-run over the same range."""
+    if resolution == "1m":
+        hosts, names = _from_raw(start, end)
+    else:
+        hosts, names = _from_rollups(SOURCES[resolution], resolution, start, end)
+
+    with transaction.atomic():
+        HostRollup.objects.filter(resolution=resolution, bucket__gte=start, bucket__lt=end).delete()
+        ProcessRollup.objects.filter(resolution=resolution, bucket__gte=start, bucket__lt=end).delete()
+        HostRollup.objects.bulk_create(
+            [HostRollup(host_id=h, resolution=resolution, bucket=b, **acc.fields()) for (h, b), acc in hosts.items()],
+            batch_size=1000,
+        )
+        ProcessRollup.objects.bulk_create(
+            [ProcessRollup(host_id=h, resolution=resolution, bucket=b, name=n, **acc.fields())
+             for (h, b, n), acc in names.items()],
+            batch_size=1000,
+        )
+    return len(hosts), len(names)
+
+
+def _source_bounds(resolution, now):
+    """Earliest source time and the point up to which source data is complete."""
+    if resolution == "1m":
+        earliest = Snapshot.objects.aggregate(t=Min("snapshot_time"))["t"]
+        return earliest, now - timedelta(seconds=settings.ROLLUP_RAW_LAG)
+    source = SOURCES[resolution]
+    earliest = HostRollup.objects.filter(resolution=source).aggregate(t=Min("bucket"))["t"]
+    state = RollupState.objects.filter(resolution=source).first()
+    return earliest, state.completed_until if state else None
+
+
+def mark_dirty(resolution, since):
+    """
+    Record that source data for ``resolution`` from ``since`` on was written
+    behind its watermark, so run_rollups rebuilds those buckets. Ingest
+    calls it for "1m" inside its transaction; it matches no row unless
+    the batch holds late snapshots.
+    """
+    RollupState.objects.filter(resolution=resolution, completed_until__gt=since).filter(
+        Q(dirty_since__isnull=True) | Q(dirty_since__gt=since)
+    ).update(dirty_since=since)
+
+
+def _rewind(state, resolution, earliest):
+    """The watermark moved back to the earliest dirty bucket; clears dirty_since."""
+    start = state.completed_until
+    dirty = state.dirty_since
+    if dirty is None:
+        return start
+    # only clear the mark that was read; a later, earlier one waits for the next run
+    RollupState.objects.filter(pk=state.pk, dirty_since=dirty).update(dirty_since=None)
+    return min(start, max(floor_time(dirty, resolution), floor_time(earliest, resolution)))
+
+
+def run_rollups(now=None, log=print):
+    """
+    Advance every resolution from its watermark up to the last complete
+    bucket, first rebuilding buckets that late data has landed in. A
+    rebuilt range marks the coarser resolution built from it as dirty too.
+    """
+    now = now or timezone.now()
+    for resolution in RESOLUTIONS:
+        earliest, complete = _source_bounds(resolution, now)
+        if earliest is None or complete is None:
+            continue
+        state = RollupState.objects.filter(resolution=resolution).first()
+        start = _rewind(state, resolution, earliest) if state else floor_time(earliest, resolution)
+        if state and start < state.completed_until:
+            for coarser, source in SOURCES.items():
+                if source == resolution:
+                    mark_dirty(coarser, start)
+        end = floor_time(complete, resolution)
+        while start < end:
+            stop = min(end, start + WINDOWS[resolution])
+            host_buckets, name_buckets = roll_up(resolution, start, stop)
+            if not state or stop > state.completed_until:
+                RollupState.objects.update_or_create(resolution=resolution, defaults={"completed_until": stop})
+            log(f"{resolution}: {start.isoformat()} -> {stop.isoformat()} "
+                f"({host_buckets} host buckets, {name_buckets} process buckets)")
+            start = stop
+
+
+def rollup_series(host, start, end, resolution, name=None):
+    """Host and per-name rollup series for a history query."""
+    fields = ["samples", "cpu_avg", "cpu_max", "rss_avg", "rss_max", "count_avg", "count_max"]
+    host_rows = HostRollup.objects.filter(
+        host=host, resolution=resolution, bucket__gte=floor_time(start, resolution), bucket__lt=end
+    ).order_by("bucket").values("bucket", *fields)
+    proc_rows = ProcessRollup.objects.filter(
+        host=host, resolution=resolution, bucket__gte=floor_time(start, resolution), bucket__lt=end
+    )
+    if name:
+        proc_rows = proc_rows.filter(name=name)
+    return {
+        "host": list(host_rows),
+        "processes": list(proc_rows.order_by("bucket", "name").values("bucket", "name", *fields)),
+    }
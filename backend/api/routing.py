@@ -2,5 +2,6 @@ from django.urls import path
 from . import ws_consumers
 
 websocket_urlpatterns = [
+    path("ws/hosts/", ws_consumers.HostConsumer.as_asgi()),
     path("ws/hosts/<str:hostname>/", ws_consumers.HostConsumer.as_asgi()),
 ]
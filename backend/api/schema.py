@@ -0,0 +1,228 @@
+"""
+The fixed snapshot schema accepted by /api/ingest/.
+
+validate_snapshots() checks decoded snapshots in a single pass and
+replaces every process record with a ``(pid, ppid, name, cpu_percent,
+rss_bytes, start_time)`` tuple, the order of storage.PROCESS_KEYS. Deltas, the
+process stores and the latest-snapshot cache then work on those tuples
+without coercing fields again. Anything that does not match raises
+SchemaError naming the offending path, e.g. ``[0].processes[12]: pid``.
+
+    snapshot: {"hostdetails": {...}, "snapshot_time": str,
+               "host_metrics": {"ram_used_gb": number, ...},
+               "processes": [process],
+               "seq": int, "stream": str, "keyframe": bool,
+               "delta": {"added": [process], "changed": [process],
+                         "removed": [int]}}
+    process:  {"pid": int, "ppid": int, "name": str,
+               "cpu_percent": number, "rss_bytes": int,
+               "start_time": number}
+
+start_time is the process's start in Unix seconds, which tells a reused
+pid from the process that had it before. Missing process fields default
+to 0 / "" as they always have (a start_time of 0 means unknown), and the
+"cpu" / "memory_rss" keys of older agents are still read. In "changed"
+records only pid is required; fields left out are None in the tuple.
+host_metrics (RAM and disk use, stored with the snapshot) is reduced to
+the HOST_METRIC_FIELDS it carries; older agents send those fields in
+hostdetails and have them moved over. The remaining host details are
+validated by HostSerializer in prepare_snapshots.
+"""
+
+import math
+from operator import itemgetter
+
+NAME_MAX = 512
+INT_MAX = 2 ** 31 - 1
+RSS_MAX = 2 ** 63 - 1
+PROCESS_FIELDS = ("pid", "ppid", "name", "cpu_percent", "rss_bytes", "start_time")
+HOST_METRIC_FIELDS = ("ram_used_gb", "ram_available_gb", "disk_used_gb", "disk_free_gb")
+
+_fields = itemgetter(*PROCESS_FIELDS)
+
+
+class SchemaError(ValueError):
+    pass
+
+
+class Rows(list):
+    """Process tuples that are already validated (the columnar decoder emits these)."""
+
+
+def _number(value):
+    return (type(value) is float and math.isfinite(value) or type(value) is int) and value >= 0
+
+
+def _fast_rows(records):
+    """
+    Check records that carry all six fields column by column, in C.
+    Returns the tuples, or None to fall back to the per-record path
+    (defaults, aliases, int cpu values, long names and every error).
+    """
+    try:
+        rows = list(map(_fields, records))
+    except (KeyError, TypeError, IndexError):
+        return None
+    if not rows:
+        return rows
+    pids, ppids, names, cpus, rss, starts = zip(*rows)
+    if ({*map(type, pids), *map(type, ppids), *map(type, rss)} != {int}
+            or set(map(type, names)) != {str} or {*map(type, cpus), *map(type, starts)} != {float}):
+        return None
+    if (min(pids) < 0 or max(pids) > INT_MAX or min(ppids) < 0 or max(ppids) > INT_MAX
+            or min(rss) < 0 or max(rss) > RSS_MAX or max(map(len, names)) > NAME_MAX):
+        return None
+    # a NaN or infinity anywhere makes the sum non-finite
+    if (min(cpus) < 0 or not math.isfinite(math.fsum(cpus))
+            or min(starts) < 0 or not math.isfinite(math.fsum(starts))):
+        return None
+    return rows
+
+
+def _process(p):
+    """The tuple for one process record, or None if it does not match the schema."""
+    if type(p) is not dict:
+        return None
+    pid = p.get("pid", 0)
+    ppid = p.get("ppid", 0)
+    name = p.get("name", "")
+    cpu = p.get("cpu_percent")
+    if cpu is None:
+        cpu = p.get("cpu", 0.0)
+    rss = p.get("rss_bytes")
+    if rss is None:
+        rss = p.get("memory_rss", 0)
+    start = p.get("start_time")
+    if start is None:
+        start = 0.0
+    if (type(pid) is not int or type(ppid) is not int or type(rss) is not int or type(name) is not str
+            or not 0 <= pid <= INT_MAX or not 0 <= ppid <= INT_MAX or not 0 <= rss <= RSS_MAX
+            or not _number(cpu) or not _number(start)):
+        return None
+    return (pid, ppid, name[:NAME_MAX], float(cpu), rss, float(start))
+
+
+def _change(p):
+    """Like _process for a "changed" record: fields that are absent become None."""
+    if type(p) is not dict:
+        return None
+    pid = p.get("pid")
+    ppid = p.get("ppid")
+    name = p.get("name")
+    cpu = p.get("cpu_percent")
+    rss = p.get("rss_bytes")
+    start = p.get("start_time")
+    if (type(pid) is not int or not 0 <= pid <= INT_MAX
+            or ppid is not None and (type(ppid) is not int or not 0 <= ppid <= INT_MAX)
+            or name is not None and type(name) is not str
+            or cpu is not None and not _number(cpu)
+            or rss is not None and (type(rss) is not int or not 0 <= rss <= RSS_MAX)
+            or start is not None and not _number(start)):
+        return None
+    return (pid, ppid, name if name is None else name[:NAME_MAX], cpu if cpu is None else float(cpu), rss,
+            start if start is None else float(start))
+
+
+FIELDS = (
+    ("pid", int, INT_MAX), ("ppid", int, INT_MAX), ("name", str, None),
+    ("cpu_percent", float, None), ("cpu", float, None),
+    ("rss_bytes", int, RSS_MAX), ("memory_rss", int, RSS_MAX),
+    ("start_time", float, None),
+)
+
+
+def _explain(p, sparse):
+    """Name the first bad field of a rejected record; only called on the error path."""
+    if type(p) is not dict:
+        return "expected an object"
+    if sparse and "pid" not in p:
+        return "pid: required"
+    for key, kind, limit in FIELDS:
+        if key not in p:
+            continue
+        value = p[key]
+        # null means "unchanged" in a delta and "use the alias" for cpu/rss
+        if value is None and (sparse or key in ("cpu_percent", "rss_bytes", "start_time")):
+            continue
+        if kind is float:
+            if not _number(value):
+                return f"{key}: expected a non-negative number"
+        elif type(value) is not kind:
+            return f"{key}: expected {'a string' if kind is str else 'an integer'}"
+        elif limit is not None and not 0 <= value <= limit:
+            return f"{key}: out of range"
+    return "invalid process record"
+
+
+def _rows(records, path, sparse=False):
+    if type(records) is Rows:
+        return records
+    if type(records) is not list:
+        raise SchemaError(f"{path}: expected a list")
+    if not sparse:
+        rows = _fast_rows(records)
+        if rows is not None:
+            return rows
+    convert = _change if sparse else _process
+    rows = [convert(p) for p in records]
+    if None in rows:
+        i = rows.index(None)
+        raise SchemaError(f"{path}[{i}]: {_explain(records[i], sparse)}")
+    return rows
+
+
+def _host_metrics(snap, path):
+    hostdetails = snap.get("hostdetails", {})
+    values = snap.get("host_metrics")
+    if values is None:
+        values, path = hostdetails, f"{path}.hostdetails"
+    elif type(values) is not dict:
+        raise SchemaError(f"{path}.host_metrics: expected an object")
+    else:
+        path = f"{path}.host_metrics"
+    sample = {}
+    for key in HOST_METRIC_FIELDS:
+        value = values.get(key)
+        hostdetails.pop(key, None)
+        if value is None:
+            continue
+        if not _number(value):
+            raise SchemaError(f"{path}.{key}: expected a non-negative number")
+        sample[key] = float(value)
+    return sample
+
+
+def validate_snapshot(snap, path=""):
+    if type(snap) is not dict:
+        raise SchemaError(f"{path or 'snapshot'}: expected an object")
+    if type(snap.get("hostdetails", {})) is not dict:
+        raise SchemaError(f"{path}.hostdetails: expected an object")
+    if type(snap.get("snapshot_time", "")) is not str:
+        raise SchemaError(f"{path}.snapshot_time: expected a string")
+    snap["host_metrics"] = _host_metrics(snap, path)
+    seq = snap.get("seq")
+    if seq is not None and type(seq) is not int:
+        raise SchemaError(f"{path}.seq: expected an integer")
+    if type(snap.get("keyframe", False)) is not bool:
+        raise SchemaError(f"{path}.keyframe: expected a boolean")
+    if "processes" in snap:
+        snap["processes"] = _rows(snap["processes"], f"{path}.processes")
+    if "delta" in snap:
+        delta = snap["delta"]
+        if type(delta) is not dict:
+            raise SchemaError(f"{path}.delta: expected an object")
+        delta["added"] = _rows(delta.get("added", []), f"{path}.delta.added")
+        delta["changed"] = _rows(delta.get("changed", []), f"{path}.delta.changed", sparse=True)
+        removed = delta.get("removed", [])
+        if type(removed) is not list or not all(type(pid) is int for pid in removed):
+            raise SchemaError(f"{path}.delta.removed: expected a list of integers")
+    return snap
+
+
+def validate_snapshots(snapshots):
+    """Validate a list of decoded snapshots in place; returns it."""
+    if type(snapshots) is not list:
+        raise SchemaError("expected a list of snapshots")
+    for i, snap in enumerate(snapshots):
+        validate_snapshot(snap, f"[{i}]")
+    return snapshots
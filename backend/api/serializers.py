@@ -4,17 +4,28 @@ from .models import Host, Snapshot, Process
 class ProcessSerializer(serializers.ModelSerializer):
     class Meta:
         model = Process
-        fields = ["pid", "ppid", "name", "cpu_percent", "rss_bytes"]
+        fields = ["pid", "ppid", "name", "cpu_percent", "rss_bytes", "start_time"]
 
 
 
 class SnapshotSerializer(serializers.ModelSerializer):
+    """
+    Uses ``process_rows`` set by storage.attach_processes when present,
+    otherwise reads the snapshot's Process rows.
+    """
     host = serializers.CharField(source="host.hostname")
-    processes = ProcessSerializer(many=True)
+    processes = serializers.SerializerMethodField()
 
     class Meta:
         model = Snapshot
-        fields = ["id", "host", "snapshot_time", "processes", "created_at"]
+        fields = ["id", "host", "snapshot_time", "ram_used_gb", "ram_available_gb", "disk_used_gb", "disk_free_gb",
+                  "processes", "created_at"]
+
+    def get_processes(self, obj):
+        rows = getattr(obj, "process_rows", None)
+        if rows is not None:
+            return rows
+        return ProcessSerializer(obj.processes.all(), many=True).data
 
 
 
@@ -24,14 +35,6 @@ class HostSerializer(serializers.ModelSerializer):
         model = Host
         fields = "__all__"
         extra_kwargs = {
-            "hostname": {"validators": []}
+            "hostname": {"validators": []},
+            "sample_interval": {"read_only": True},
         }
-
-
-class HistoricalProcessSerializer(serializers.ModelSerializer):
-    snapshot_time = serializers.DateTimeField(source="snapshot.snapshot_time")
-    host = serializers.CharField(source="snapshot.host.hostname")
-
-    class Meta:
-        model = Process
-        fields = ["pid", "ppid", "name", "cpu_percent", "rss_bytes", "snapshot_time", "host"]
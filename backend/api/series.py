@@ -0,0 +1,77 @@
+"""
+Per-process time series for /api/hosts/<hostname>/series/.
+
+The host's snapshots in the range come from the (host, snapshot_time)
+index; their process rows are then read with the pid or name filter in
+the store SQL, which the (snapshot, pid) and (snapshot, name) indexes
+answer with one seek per snapshot instead of scanning every process of
+every snapshot.
+
+Samples are split into instances, one per process that held the pid.
+Agents send each process's start time, and a pid sampled with a different
+start time than before belongs to a new process. Samples from agents that
+do not send it (start_time 0) fall back to a heuristic:
+
+    * a sample whose name differs from the pid's previous sample starts a
+      new instance;
+    * after a gap (the pid missing from one or more snapshots in between) a
+      different ppid also starts one. A process re-parented while it is
+      still being sampled keeps its instance.
+
+The heuristic cannot tell a restarted process that got the same pid, name
+and parent (a worker respawned by the same supervisor) from the old one.
+"""
+
+from django.conf import settings
+
+from .models import Snapshot
+from .process_query import ProcessQuery
+from .storage import get_process_store
+
+
+def _same_process(instance, p, gap):
+    if instance["start_time"] and p["start_time"]:
+        return instance["start_time"] == p["start_time"]
+    return instance["name"] == p["name"] and not (gap and instance["ppid"] != p["ppid"])
+
+
+def process_series(host, start, end, pid=None, name=None, max_snapshots=None):
+    """
+    Return {"snapshots": n, "instances": [...]} for ``host`` in [start, end].
+    Each instance is {"pid", "ppid", "name", "start_time", "t",
+    "cpu_percent", "rss_bytes"} with ``t`` in Unix seconds and one array
+    entry per sample; start_time is 0 when the agent did not send it. Raises
+    ValueError when the range holds more than ``max_snapshots`` snapshots.
+    """
+    max_snapshots = max_snapshots or settings.SERIES_MAX_SNAPSHOTS
+    snapshots = list(
+        Snapshot.objects.filter(host=host, snapshot_time__gte=start, snapshot_time__lte=end)
+        .order_by("snapshot_time").only("id", "snapshot_time")[:max_snapshots + 1]
+    )
+    if len(snapshots) > max_snapshots:
+        raise ValueError(f"the range holds more than {max_snapshots} snapshots; narrow start/end "
+                         "or use the rollups on /api/history/<hostname>/?resolution=auto")
+
+    rows = get_process_store().read(snapshots, ProcessQuery(pid=pid, name=name))
+    instances = []
+    current = {}  # pid -> (instance, index of its last snapshot)
+    for i, snap in enumerate(snapshots):
+        t = snap.snapshot_time.timestamp()
+        for p in rows[snap.id]:
+            seen = current.get(p["pid"])
+            instance = seen[0] if seen else None
+            if instance is not None and not _same_process(instance, p, seen[1] < i - 1):
+                instance = None
+            if instance is None:
+                instance = {"pid": p["pid"], "ppid": p["ppid"], "name": p["name"], "start_time": p["start_time"],
+                            "t": [], "cpu_percent": [], "rss_bytes": []}
+                instances.append(instance)
+            instance["ppid"] = p["ppid"]
+            # a process renames itself (prctl) or its agent starts sending start times
+            instance["name"] = p["name"]
+            instance["start_time"] = instance["start_time"] or p["start_time"]
+            instance["t"].append(t)
+            instance["cpu_percent"].append(p["cpu_percent"])
+            instance["rss_bytes"].append(p["rss_bytes"])
+            current[p["pid"]] = (instance, i)
+    return {"snapshots": len(snapshots), "instances": instances}
@@ -0,0 +1,299 @@
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Snapshot, Process, ProcessName
+
+
+BATCH_SIZE = 5000
+READ_CHUNK = 500
+PROCESS_KEYS = ("pid", "ppid", "name", "cpu_percent", "rss_bytes", "start_time")
+
+
+def _q(name):
+    return connection.ops.quote_name(name)
+
+
+def _utc(dt):
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=dt_timezone.utc)
+    return dt.astimezone(dt_timezone.utc)
+
+
+class TableProcessStore:
+    """
+    Process samples in the single ``api_process`` table, one row per
+    process per snapshot with a foreign key to Snapshot.
+
+    Rows are written with executemany and read back as plain dicts, so
+    views never instantiate Process models on the hot path.
+    """
+
+    name = "table"
+
+    def write(self, batches):
+        """Insert process tuples ``(snapshot_id, pid, ppid, name, cpu, rss, start)``; batches is [(snapshot, rows)]."""
+        rows = [row for _, snap_rows in batches for row in snap_rows]
+        if not rows:
+            return
+        fields = ("snapshot", *PROCESS_KEYS)
+        columns = ", ".join(_q(Process._meta.get_field(f).column) for f in fields)
+        sql = f"INSERT INTO {_q(Process._meta.db_table)} ({columns}) VALUES ({', '.join(['%s'] * len(fields))})"
+        with connection.cursor() as cursor:
+            for i in range(0, len(rows), BATCH_SIZE):
+                cursor.executemany(sql, rows[i:i + BATCH_SIZE])
+
+    def read(self, snapshots, query=None):
+        """
+        Return {snapshot_id: [process dicts]} for the given Snapshot objects.
+        A ProcessQuery's filters go into the SQL; sorting, limit and field
+        projection are applied per snapshot afterwards.
+        """
+        result = {s.id: [] for s in snapshots}
+        ids = list(result)
+        filters = query.orm_filters() if query else {}
+        for i in range(0, len(ids), READ_CHUNK):
+            rows = Process.objects.filter(snapshot_id__in=ids[i:i + READ_CHUNK], **filters).values_list(
+                "snapshot_id", *PROCESS_KEYS
+            )
+            for snapshot_id, *values in rows:
+                result[snapshot_id].append(dict(zip(PROCESS_KEYS, values)))
+        return _finish(result, query)
+
+    def prune(self, cutoff):
+        """Delete snapshots older than ``cutoff`` together with their process rows."""
+        with connection.cursor() as cursor:
+            return _delete_snapshots(cursor, cutoff)
+
+
+class DailyProcessStore(TableProcessStore):
+    """
+    Process samples partitioned into one table per UTC day
+    (``api_process_pYYYYMMDD``), with process names interned in ProcessName.
+
+    Retention drops whole day tables instead of deleting rows. Snapshot
+    rows stay in ``api_snapshot``; they are small next to the samples and
+    are removed with a plain range delete.
+    """
+
+    name = "daily"
+    PREFIX = "api_process_p"
+    # snapshot reads plus pid / name lookups within a snapshot (process series)
+    INDEXES = (("_snap_pid", "snapshot_id, pid"), ("_snap_name", "snapshot_id, name_id"))
+    NAME_CACHE_MAX = 100_000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables = None
+        self._names = {}
+        self._labels = {}
+
+    def table_for(self, snapshot_time):
+        return f"{self.PREFIX}{_utc(snapshot_time):%Y%m%d}"
+
+    def partitions(self):
+        with self._lock:
+            if self._tables is None:
+                self._tables = {
+                    t for t in connection.introspection.table_names() if t.startswith(self.PREFIX)
+                }
+            return set(self._tables)
+
+    def _ensure_table(self, table):
+        if table in self.partitions():
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {_q(table)} ("
+                "snapshot_id bigint NOT NULL, pid integer NOT NULL, ppid integer NOT NULL, "
+                "name_id bigint NOT NULL, cpu_percent double precision NOT NULL, rss_bytes bigint NOT NULL, "
+                "start_time double precision NOT NULL DEFAULT 0)"
+            )
+            for suffix, columns in self.INDEXES:
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {_q(table + suffix)} ON {_q(table)} ({columns})")
+        # only cache the table once the DDL is committed; a rolled-back ingest undoes it
+        transaction.on_commit(lambda: self._remember(table))
+
+    def _remember(self, table):
+        with self._lock:
+            self._tables.add(table)
+
+    def intern(self, names):
+        """Map process names to ProcessName ids, creating missing ones."""
+        wanted = set(names)
+        with self._lock:
+            if len(self._names) > self.NAME_CACHE_MAX:
+                self._names.clear()
+            ids = {n: self._names[n] for n in wanted if n in self._names}
+        missing = [n for n in wanted if n not in ids]
+        if missing:
+            ProcessName.objects.bulk_create([ProcessName(name=n) for n in missing], ignore_conflicts=True)
+            created = {}
+            for i in range(0, len(missing), READ_CHUNK):
+                created.update(
+                    ProcessName.objects.filter(name__in=missing[i:i + READ_CHUNK]).values_list("name", "id")
+                )
+            ids.update(created)
+            # like _ensure_table: ids from a rolled-back ingest would be reused for other names
+            transaction.on_commit(lambda: self._remember_names(created))
+        return ids
+
+    def _remember_names(self, created):
+        with self._lock:
+            self._names.update(created)
+
+    def _labels_for(self, name_ids):
+        with self._lock:
+            if len(self._labels) > self.NAME_CACHE_MAX:
+                self._labels.clear()
+            labels = {i: self._labels[i] for i in name_ids if i in self._labels}
+        missing = [i for i in name_ids if i not in labels]
+        if missing:
+            found = {}
+            for i in range(0, len(missing), READ_CHUNK):
+                found.update(
+                    ProcessName.objects.filter(id__in=missing[i:i + READ_CHUNK]).values_list("id", "name")
+                )
+            labels.update(found)
+            with self._lock:
+                self._labels.update(found)
+        return labels
+
+    def write(self, batches):
+        by_table = {}
+        names = []
+        for snap, rows in batches:
+            if rows:
+                by_table.setdefault(self.table_for(snap.snapshot_time), []).extend(rows)
+                names.extend(r[3] for r in rows)
+        if not by_table:
+            return
+
+        ids = self.intern(names)
+        with connection.cursor() as cursor:
+            for table, rows in by_table.items():
+                self._ensure_table(table)
+                sql = (f"INSERT INTO {_q(table)} (snapshot_id, pid, ppid, name_id, cpu_percent, rss_bytes, "
+                       "start_time) VALUES (%s, %s, %s, %s, %s, %s, %s)")
+                encoded = [(s, pid, ppid, ids[name], cpu, rss, start) for s, pid, ppid, name, cpu, rss, start in rows]
+                for i in range(0, len(encoded), BATCH_SIZE):
+                    cursor.executemany(sql, encoded[i:i + BATCH_SIZE])
+
+    def _conditions(self, query):
+        """SQL conditions and params for a ProcessQuery's filters on a day table."""
+        clauses, params = [], []
+        if query is None:
+            return clauses, params
+        if query.pid is not None:
+            clauses.append("pid = %s")
+            params.append(query.pid)
+        if query.min_cpu is not None:
+            clauses.append("cpu_percent >= %s")
+            params.append(query.min_cpu)
+        if query.min_rss is not None:
+            clauses.append("rss_bytes >= %s")
+            params.append(query.min_rss)
+        name_filters = {k: v for k, v in query.orm_filters().items() if k.startswith("name")}
+        if name_filters:
+            sub, sub_params = ProcessName.objects.filter(**name_filters).values("id").query.sql_with_params()
+            clauses.append(f"name_id IN ({sub})")
+            params.extend(sub_params)
+        return clauses, params
+
+    def read(self, snapshots, query=None):
+        result = {s.id: [] for s in snapshots}
+        conditions, condition_params = self._conditions(query)
+        by_table = {}
+        for s in snapshots:
+            by_table.setdefault(self.table_for(s.snapshot_time), []).append(s.id)
+
+        existing = self.partitions()
+        raw = []
+        with connection.cursor() as cursor:
+            for table, ids in by_table.items():
+                if table not in existing:
+                    continue
+                for i in range(0, len(ids), READ_CHUNK):
+                    chunk = ids[i:i + READ_CHUNK]
+                    where = [f"snapshot_id IN ({', '.join(['%s'] * len(chunk))})", *conditions]
+                    cursor.execute(
+                        f"SELECT snapshot_id, pid, ppid, name_id, cpu_percent, rss_bytes, start_time FROM {_q(table)} "
+                        f"WHERE {' AND '.join(where)}",
+                        [*chunk, *condition_params],
+                    )
+                    raw.extend(cursor.fetchall())
+
+        labels = self._labels_for({r[3] for r in raw})
+        for snapshot_id, pid, ppid, name_id, cpu, rss, start in raw:
+            result[snapshot_id].append(
+                {"pid": pid, "ppid": ppid, "name": labels.get(name_id, ""), "cpu_percent": cpu, "rss_bytes": rss,
+                 "start_time": start}
+            )
+        return _finish(result, query)
+
+    def prune(self, cutoff):
+        """
+        Drop day tables entirely older than ``cutoff`` and delete their
+        snapshots, with any rows they still have in ``api_process`` (kept by
+        migrate_process_storage --keep or written before the switch).
+        """
+        first_kept = self.table_for(cutoff)
+        with connection.cursor() as cursor:
+            for table in sorted(self.partitions()):
+                if table < first_kept:
+                    cursor.execute(f"DROP TABLE IF EXISTS {_q(table)}")
+                    with self._lock:
+                        self._tables.discard(table)
+            day_start = _utc(cutoff).replace(hour=0, minute=0, second=0, microsecond=0)
+            return _delete_snapshots(cursor, day_start)
+
+
+def _delete_snapshots(cursor, cutoff):
+    """Delete snapshots older than ``cutoff`` and their api_process rows; returns the snapshot count."""
+    snap_table = _q(Snapshot._meta.db_table)
+    cursor.execute(
+        f"DELETE FROM {_q(Process._meta.db_table)} WHERE {_q('snapshot_id')} IN "
+        f"(SELECT {_q('id')} FROM {snap_table} WHERE {_q('snapshot_time')} < %s)",
+        [cutoff],
+    )
+    cursor.execute(f"DELETE FROM {snap_table} WHERE {_q('snapshot_time')} < %s", [cutoff])
+    return cursor.rowcount
+
+
+def _finish(result, query):
+    if query is None:
+        return result
+    return {snapshot_id: query.finish(rows) for snapshot_id, rows in result.items()}
+
+
+STORES = {"table": TableProcessStore, "daily": DailyProcessStore}
+_store = None
+
+
+def get_process_store():
+    """Return the process store selected by settings.PROCESS_STORAGE."""
+    global _store
+    if _store is None:
+        _store = STORES[settings.PROCESS_STORAGE]()
+    return _store
+
+
+def attach_processes(snapshots, query=None):
+    """
+    Load process rows for the snapshots and set them as
+    ``snapshot.process_rows``, filtered by an optional ProcessQuery.
+    """
+    snapshots = list(snapshots)
+    rows = get_process_store().read(snapshots, query)
+    for snap in snapshots:
+        snap.process_rows = rows[snap.id]
+    return snapshots
+
+
+def retention_cutoff(days=None):
+    days = settings.HISTORY_RETENTION_DAYS if days is None else days
+    if not days:
+        return None
+    return datetime.now(dt_timezone.utc) - timedelta(days=days)
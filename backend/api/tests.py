@@ -1,3 +1,1208 @@
-from django.test import TestCase
+import asyncio
+import base64
+import gzip
+import importlib
+import json
+import random
+import struct
+import sys
+import tempfile
+import threading
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import path
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from rest_framework.test import APIClient
+
+from .channel_layers import ChannelHub, SocketChannelLayer
+from .codecs import decode_columnar
+from .consumers import broadcast_snapshot_async
+from .async_ingest import IngestWriter, decode_body
+from .deltas import DeltaStore, ResyncRequired, delta_store
+from . import fleet, metrics
+from .ingest import ingest_snapshots
+from .ingest_queue import IngestQueue
+from .intervals import sample_intervals
+from .latest_cache import CachedSnapshot, LatestSnapshotCache, PROTOCOL_VERSION, build_patch, latest_cache, latest_for
+from .models import Host, HostLatest, Process, HostRollup, LatestProcess, ProcessRollup, RollupState, Snapshot
+from .rollups import run_rollups
+from .routing import websocket_urlpatterns
+from .storage import PROCESS_KEYS, DailyProcessStore, TableProcessStore, get_process_store
+from .views import AsyncIngestView, IngestAPIView
+
+# the agent is a flat script directory; its encoders are what the backend decodes
+sys.path.insert(0, str(Path(settings.BASE_DIR).parent / "agent"))
+from delta import DeltaEncoder  # noqa: E402
+from wire import PayloadEncoder  # noqa: E402
+
+
+def make_processes(n, seed=0):
+    rng = random.Random(seed)
+    return [{"pid": pid, "ppid": rng.randrange(0, pid), "name": f"proc{pid % 7}",
+             "cpu_percent": round(rng.random() * 50, 2), "rss_bytes": rng.randrange(1, 2 ** 40),
+             "start_time": round(1735689600 + rng.random() * 1000, 2)}
+            for pid in range(1, n + 1)]
+
+
+def step(processes, seed):
+    """The next sample: some processes exit, some start, the rest change CPU, RSS and parent."""
+    rng = random.Random(seed)
+    kept = [dict(p) for p in processes if rng.random() > 0.1]
+    for p in kept:
+        if rng.random() < 0.5:
+            p["cpu_percent"] = round(rng.random() * 50, 2)
+        if rng.random() < 0.3:
+            p["rss_bytes"] = rng.randrange(1, 2 ** 40)
+        if rng.random() < 0.05:
+            p["ppid"] = 1
+    top = max(p["pid"] for p in processes)
+    kept.extend({"pid": pid, "ppid": 1, "name": "new", "cpu_percent": 0.5, "rss_bytes": 4096,
+                 "start_time": 1735690600.0}
+                for pid in range(top + 1, top + 1 + rng.randrange(0, 5)))
+    return kept
+
+
+def as_tuples(processes):
+    return sorted(tuple(p[k] for k in PROCESS_KEYS) for p in processes)
+
+
+class WireRoundTripTests(SimpleTestCase):
+    """Agent DeltaEncoder + PayloadEncoder -> decode_body -> DeltaStore.apply gives back every sample."""
+
+    def round_trip(self, wire_format, samples, keyframe_interval=4, batch=3):
+        encoder = DeltaEncoder(keyframe_interval)
+        payload = PayloadEncoder(wire_format)
+        store = DeltaStore()
+        encoded = [encoder.encode({"hostdetails": {"hostname": "h"}, "snapshot_time": f"2025-01-01T00:00:{i:02d}",
+                                   "processes": processes})
+                   for i, processes in enumerate(samples)]
+        rebuilt = []
+        for i in range(0, len(encoded), batch):
+            body, headers = payload.encode(encoded[i:i + batch])
+            snapshots, _ = decode_body(body, headers["Content-Type"], headers.get("Content-Encoding"))
+            rebuilt.extend(store.apply("h", snap) for snap in snapshots)
+        return encoded, rebuilt
+
+    def samples(self, count=10):
+        samples = [make_processes(200)]
+        for seed in range(1, count):
+            samples.append(step(samples[-1], seed))
+        return samples
+
+    def test_columnar_round_trip(self):
+        samples = self.samples()
+        encoded, rebuilt = self.round_trip("columnar", samples)
+        self.assertEqual([bool(s.get("keyframe")) for s in encoded], [i % 4 == 0 for i in range(10)])
+        for processes, rows in zip(samples, rebuilt):
+            self.assertEqual(as_tuples(processes), sorted(rows))
+
+    def test_json_round_trip(self):
+        samples = self.samples()
+        _, rebuilt = self.round_trip("json", samples, batch=1)
+        for processes, rows in zip(samples, rebuilt):
+            self.assertEqual(as_tuples(processes), sorted(rows))
+
+    def test_columnar_keeps_meta_and_sparse_changes(self):
+        encoder = DeltaEncoder(10)
+        first = make_processes(3)
+        second = [dict(p) for p in first]
+        second[1]["cpu_percent"] = 9.99
+        snaps = [encoder.encode({"hostdetails": {"hostname": "h", "os": "Linux"}, "host_metrics": {"ram_used_gb": 1.5},
+                                 "snapshot_time": "t", "processes": p}) for p in (first, second)]
+        body, headers = PayloadEncoder("columnar").encode(snaps)
+        decoded, _ = decode_body(body, headers["Content-Type"], headers["Content-Encoding"])
+        self.assertEqual(decoded[0]["hostdetails"], {"hostname": "h", "os": "Linux"})
+        self.assertEqual(decoded[1]["host_metrics"], {"ram_used_gb": 1.5})
+        self.assertEqual(decoded[1]["delta"]["changed"], [(2, None, None, 9.99, None, None)])
+
+    def test_reused_pid_sends_its_new_start_time(self):
+        encoder = DeltaEncoder(10)
+        first = make_processes(2)
+        second = [dict(p) for p in first]
+        second[0]["start_time"] = 1735699999.25
+        snaps = [encoder.encode({"hostdetails": {"hostname": "h"}, "snapshot_time": "t", "processes": p})
+                 for p in (first, second)]
+        body, headers = PayloadEncoder("columnar").encode(snaps)
+        decoded, _ = decode_body(body, headers["Content-Type"], headers["Content-Encoding"])
+        self.assertEqual(decoded[1]["delta"]["changed"], [(1, None, None, None, None, 1735699999.25)])
+
+    def test_columnar_without_start_times_still_decodes(self):
+        # b"PMC1" bodies from agents older than the start_time column
+        meta = json.dumps({"hostdetails": {"hostname": "h"}, "snapshot_time": "t"}).encode()
+        body = b"".join((
+            b"PMC1", struct.pack("<II", 1, 4), b"init", struct.pack("<II", 1, len(meta)), meta,
+            struct.pack("<IiiIiq", 1, 1, 0, 0, 150, 4096), struct.pack("<II", 0, 0),
+        ))
+        self.assertEqual(decode_columnar(body)[0]["processes"], [(1, 0, "init", 1.5, 4096, 0.0)])
+
+    def test_delta_out_of_sequence_requires_resync(self):
+        encoder = DeltaEncoder(10)
+        samples = self.samples(3)
+        snaps = [encoder.encode({"hostdetails": {"hostname": "h"}, "snapshot_time": "t", "processes": p})
+                 for p in samples]
+        body, headers = PayloadEncoder("columnar").encode(snaps)
+        decoded, _ = decode_body(body, headers["Content-Type"], headers["Content-Encoding"])
+        store = DeltaStore()
+        store.apply("h", decoded[0])
+        with self.assertRaises(ResyncRequired):
+            store.apply("h", decoded[2])
+        # the state was dropped; even the right next delta now needs a keyframe
+        with self.assertRaises(ResyncRequired):
+            store.apply("h", decoded[1])
+
+
+# both ingest views side by side, whatever INGEST_VIEW is set to
+urlpatterns = [
+    path("sync/", IngestAPIView.as_view()),
+    path("async/", AsyncIngestView.as_view()),
+]
+
+AUTH = {"HTTP_AUTHORIZATION": f"ApiKey {settings.AGENT_API_KEY}"}
+
+
+def snapshot(hostname="h", time="2025-01-01T00:00:00Z", processes=None, **extra):
+    if processes is None:
+        processes = [{"pid": 1, "ppid": 0, "name": "init", "cpu_percent": 1.5, "rss_bytes": 4096, "start_time": 0.0}]
+    return {"hostdetails": {"hostname": hostname}, "snapshot_time": time, "processes": processes, **extra}
+
+
+def gzip_payload(data):
+    return {"payload": base64.b64encode(gzip.compress(json.dumps(data).encode("utf-8"))).decode("ascii")}
+
+
+@override_settings(ROOT_URLCONF="api.tests", INGEST_MODE="sync")
+class IngestResponseTests(TestCase):
+    url = "/sync/"
+
+    def setUp(self):
+        self.client = APIClient()
+        latest_cache.invalidate()
+
+    def post(self, data, **extra):
+        return self.client.post(self.url, data, format="json", **AUTH, **extra)
+
+    def test_created(self):
+        response = self.post(gzip_payload([snapshot("a"), snapshot("b")]))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([c["hostname"] for c in response.json()["created"]], ["a", "b"])
+        snap = Snapshot.objects.get(host__hostname="a")
+        self.assertEqual(get_process_store().read([snap])[snap.id],
+                         [{"pid": 1, "ppid": 0, "name": "init", "cpu_percent": 1.5, "rss_bytes": 4096,
+                           "start_time": 0.0}])
+
+    def test_direct_json_snapshot(self):
+        response = self.post(snapshot("direct"))
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Host.objects.filter(hostname="direct").exists())
+
+    def test_missing_api_key(self):
+        response = self.client.post(self.url, snapshot(), format="json")
+        self.assertEqual(response.status_code, 403)
+
+    def test_schema_error(self):
+        bad = snapshot(processes=[{"pid": "1", "ppid": 0, "name": "x", "cpu_percent": 0.0, "rss_bytes": 1}])
+        response = self.post(gzip_payload([bad]))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["detail"], "Invalid snapshot [0].processes[0]: pid: expected an integer")
+        self.assertFalse(Snapshot.objects.exists())
+
+    def test_invalid_snapshot_is_skipped_not_the_batch(self):
+        bad = snapshot("bad", processes=[{"pid": 1, "ppid": 0, "name": 5, "cpu_percent": 0.0, "rss_bytes": 1}])
+        with self.assertLogs("api.ingest", "WARNING"):
+            response = self.post(gzip_payload([snapshot("a"), bad, snapshot("b")]))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["invalid"],
+                         [{"index": 1, "detail": "[1].processes[0]: name: expected a string"}])
+        self.assertEqual(sorted(Snapshot.objects.values_list("host__hostname", flat=True)), ["a", "b"])
+
+    def test_interval_override(self):
+        sample_intervals.invalidate()
+        self.assertNotIn("interval", self.post(snapshot("a")).json())
+        with override_settings(AGENT_INTERVAL=30):
+            self.assertEqual(self.post(snapshot("a")).json()["interval"], 30)
+            # a host's own interval wins; saving it through the ORM drops the cached intervals
+            host = Host.objects.get(hostname="a")
+            host.sample_interval = 5
+            host.save()
+            self.assertEqual(self.post(snapshot("a")).json()["interval"], 5)
+            # several hosts in one batch get the shortest
+            self.assertEqual(self.post(gzip_payload([snapshot("b"), snapshot("a")])).json()["interval"], 5)
+
+    def test_bad_payload(self):
+        response = self.post({"payload": "not base64 gzip"})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(INGEST_MAX_DECOMPRESSED_MB=1)
+    def test_payload_too_large(self):
+        names = [{"pid": i, "ppid": 0, "name": "x" * 500, "cpu_percent": 0.0, "rss_bytes": 1} for i in range(4000)]
+        response = self.post(gzip_payload([snapshot(processes=names)]))
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Snapshot.objects.exists())
+
+    def test_unsupported_media_type(self):
+        response = self.client.post(self.url, b"hello", content_type="text/plain", **AUTH)
+        self.assertEqual(response.status_code, 415)
+
+    def test_unsupported_content_encoding(self):
+        body, headers = PayloadEncoder("columnar").encode([snapshot()])
+        response = self.client.post(self.url, body, content_type=headers["Content-Type"],
+                                    HTTP_CONTENT_ENCODING="br", **AUTH)
+        self.assertEqual(response.status_code, 415)
+
+    def test_columnar(self):
+        body, headers = PayloadEncoder("columnar").encode([snapshot("col")])
+        response = self.client.post(self.url, body, content_type=headers["Content-Type"],
+                                    HTTP_CONTENT_ENCODING=headers["Content-Encoding"], **AUTH)
+        self.assertEqual(response.status_code, 201)
+        self.assertIn("gzip", response["Accept-Encoding"])
+
+    def test_delta_without_keyframe_asks_for_resync(self):
+        delta_store._hosts.pop("resync-host", None)
+        delta = snapshot("resync-host", stream="s", seq=7,
+                         delta={"added": [], "removed": [], "changed": [{"pid": 1, "cpu_percent": 2.0}]})
+        del delta["processes"]
+        response = self.post(gzip_payload([delta]))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {"created": [], "resync": ["resync-host"]})
+
+        keyframe = snapshot("resync-host", stream="s", seq=8, keyframe=True)
+        delta["seq"] = 9
+        response = self.post(gzip_payload([keyframe, delta]))
+        self.assertEqual(len(response.json()["created"]), 2)
+        self.assertNotIn("resync", response.json())
+
+
+@override_settings(ROOT_URLCONF="api.tests", INGEST_MODE="sync")
+class AsyncIngestResponseTests(TransactionTestCase):
+    """The same responses from the async view; its writer threads need committed data."""
+
+    def setUp(self):
+        self.client = APIClient()
+        latest_cache.invalidate()
+
+    def post(self, body, content_type="application/json", **extra):
+        return self.client.generic("POST", "/async/", body, content_type=content_type, **AUTH, **extra)
+
+    def test_created(self):
+        response = self.post(json.dumps(gzip_payload([snapshot("a")])))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Snapshot.objects.filter(host__hostname="a").count(), 1)
+
+    def test_errors(self):
+        self.assertEqual(self.post(json.dumps({"payload": "nope"})).status_code, 400)
+        self.assertEqual(self.post(b"hello", content_type="text/plain").status_code, 415)
+        with override_settings(INGEST_MAX_DECOMPRESSED_MB=1):
+            body, headers = PayloadEncoder("columnar").encode([snapshot(processes=[
+                {"pid": i, "ppid": 0, "name": f"{i:0500d}", "cpu_percent": 0.0, "rss_bytes": 1} for i in range(4000)
+            ])])
+            response = self.post(body, headers["Content-Type"], HTTP_CONTENT_ENCODING=headers["Content-Encoding"])
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Snapshot.objects.exists())
+
+    def test_invalid_snapshot_is_skipped_not_the_batch(self):
+        bad = snapshot("bad", time=5)
+        with self.assertLogs("api.ingest", "WARNING"):
+            response = self.post(json.dumps([bad, snapshot("a")]))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["invalid"], [{"index": 0, "detail": "[0].snapshot_time: expected a string"}])
+        self.assertEqual(list(Snapshot.objects.values_list("host__hostname", flat=True)), ["a"])
+
+
+def proc(pid, name, cpu, rss, start=0.0):
+    return {"pid": pid, "ppid": 0, "name": name, "cpu_percent": cpu, "rss_bytes": rss, "start_time": start}
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=dt_timezone.utc)
+
+
+@override_settings(ROOT_URLCONF="api.tests", INGEST_MODE="sync", ROLLUP_RAW_LAG=120)
+class RollupTests(TestCase):
+    """Snapshots go in through the ingest view so late uploads mark the rollups dirty as they would live."""
+
+    def setUp(self):
+        self.client = APIClient()
+        latest_cache.invalidate()
+        self.ingest([
+            snapshot("r", "2025-01-01T00:00:10Z", [proc(1, "a", 1.0, 100), proc(2, "a", 3.0, 300), proc(3, "b", 2.0, 50)]),
+            snapshot("r", "2025-01-01T00:00:40Z", [proc(1, "a", 4.0, 200)]),
+            snapshot("r", "2025-01-01T00:01:10Z", [proc(3, "b", 8.0, 10)]),
+        ])
+
+    def ingest(self, snapshots):
+        response = self.client.post("/sync/", gzip_payload(snapshots), format="json", **AUTH)
+        self.assertEqual(response.status_code, 201)
+
+    def host_row(self, resolution, bucket):
+        return HostRollup.objects.get(host__hostname="r", resolution=resolution, bucket=bucket)
+
+    def name_row(self, resolution, bucket, name):
+        return ProcessRollup.objects.get(host__hostname="r", resolution=resolution, bucket=bucket, name=name)
+
+    def test_minute_aggregates(self):
+        run_rollups(now=utc(2025, 1, 1, 0, 4), log=lambda m: None)
+        row = self.host_row("1m", utc(2025, 1, 1, 0, 0))
+        self.assertEqual((row.samples, row.cpu_avg, row.cpu_max), (2, 5.0, 6.0))
+        self.assertEqual((row.rss_avg, row.rss_max, row.count_avg, row.count_max), (325.0, 450, 2.0, 3))
+        a = self.name_row("1m", utc(2025, 1, 1, 0, 0), "a")
+        self.assertEqual((a.samples, a.cpu_avg, a.rss_avg, a.rss_max, a.count_avg, a.count_max),
+                         (2, 4.0, 300.0, 400, 1.5, 2))
+        self.assertEqual(self.name_row("1m", utc(2025, 1, 1, 0, 0), "b").samples, 1)
+        self.assertEqual(self.host_row("1m", utc(2025, 1, 1, 0, 1)).cpu_avg, 8.0)
+
+    def test_raw_lag_holds_back_recent_minutes(self):
+        run_rollups(now=utc(2025, 1, 1, 0, 2, 30), log=lambda m: None)
+        self.assertFalse(HostRollup.objects.exists())
+        with override_settings(ROLLUP_RAW_LAG=0):
+            run_rollups(now=utc(2025, 1, 1, 0, 2, 30), log=lambda m: None)
+        self.assertEqual(HostRollup.objects.filter(resolution="1m").count(), 2)
+        self.assertEqual(RollupState.objects.get(resolution="1m").completed_until, utc(2025, 1, 1, 0, 2))
+
+    def test_coarser_resolutions_merge_samples(self):
+        run_rollups(now=utc(2025, 1, 3), log=lambda m: None)
+        for resolution in ("1h", "1d"):
+            row = self.host_row(resolution, utc(2025, 1, 1))
+            self.assertEqual((row.samples, row.cpu_avg, row.cpu_max, row.rss_max), (3, 6.0, 8.0, 450))
+            b = self.name_row(resolution, utc(2025, 1, 1), "b")
+            self.assertEqual((b.samples, b.cpu_avg, b.cpu_max), (2, 5.0, 8.0))
+
+    def test_late_snapshot_rebuilds_every_resolution(self):
+        run_rollups(now=utc(2025, 1, 3), log=lambda m: None)
+        completed = {s.resolution: s.completed_until for s in RollupState.objects.all()}
+
+        self.ingest([snapshot("r", "2025-01-01T00:00:20Z", [proc(4, "c", 9.0, 1000)])])
+        self.assertEqual(RollupState.objects.get(resolution="1m").dirty_since, utc(2025, 1, 1, 0, 0, 20))
+        run_rollups(now=utc(2025, 1, 3), log=lambda m: None)
+
+        minute = self.host_row("1m", utc(2025, 1, 1, 0, 0))
+        self.assertEqual((minute.samples, minute.cpu_max, minute.rss_max), (3, 9.0, 1000))
+        for resolution in ("1h", "1d"):
+            row = self.host_row(resolution, utc(2025, 1, 1))
+            self.assertEqual((row.samples, row.cpu_max, row.rss_max), (4, 9.0, 1000))
+            self.assertEqual(self.name_row(resolution, utc(2025, 1, 1), "c").samples, 1)
+        # rebuilding went back, then forward again to where each resolution had got to
+        self.assertEqual({s.resolution: s.completed_until for s in RollupState.objects.all()}, completed)
+        self.assertFalse(RollupState.objects.filter(dirty_since__isnull=False).exists())
+
+    def test_snapshot_after_watermark_is_not_dirty(self):
+        run_rollups(now=utc(2025, 1, 1, 0, 4), log=lambda m: None)
+        self.ingest([snapshot("r", "2025-01-01T00:05:00Z", [proc(1, "a", 1.0, 1)])])
+        self.assertIsNone(RollupState.objects.get(resolution="1m").dirty_since)
+
+
+@override_settings(ROOT_URLCONF="api.tests", INGEST_MODE="sync", FLEET_TOP_PROCESSES=2, FLEET_REFRESH_SECONDS=15)
+class FleetTests(TestCase):
+    processes = [proc(1, "idle", 0.0, 10), proc(2, "cpu", 50.0, 20), proc(3, "mem", 1.0, 9000),
+                 proc(4, "both", 30.0, 5000), proc(5, "small", 0.5, 30)]
+
+    def setUp(self):
+        self.client = APIClient()
+        latest_cache.invalidate()
+
+    def ingest(self, *snapshots):
+        response = self.client.post("/sync/", gzip_payload(list(snapshots)), format="json", **AUTH)
+        self.assertEqual(response.status_code, 201)
+
+    def pids(self, hostname):
+        return sorted(LatestProcess.objects.filter(host__hostname=hostname).values_list("pid", flat=True))
+
+    def test_ingest_keeps_each_hosts_heaviest(self):
+        self.ingest(snapshot("f", "2025-01-01T00:00:00Z", self.processes,
+                             hostdetails={"hostname": "f", "ram_total_gb": 16.0},
+                             host_metrics={"ram_used_gb": 4.0}))
+        latest = HostLatest.objects.get(host__hostname="f")
+        self.assertEqual((latest.process_count, latest.cpu_percent, latest.rss_bytes, latest.ram_percent),
+                         (5, 81.5, 14060, 25.0))
+        self.assertIsNone(latest.disk_percent)
+        # top 2 by CPU (2, 4) and top 2 by RSS (3, 4)
+        self.assertEqual(self.pids("f"), [2, 3, 4])
+
+    def test_refresh_is_throttled_by_snapshot_time(self):
+        self.ingest(snapshot("f", "2025-01-01T00:00:00Z", self.processes))
+        self.ingest(snapshot("f", "2025-01-01T00:00:10Z", [proc(9, "new", 1.0, 1)]))
+        self.assertEqual(HostLatest.objects.get(host__hostname="f").process_count, 5)
+        self.ingest(snapshot("f", "2025-01-01T00:00:15Z", [proc(9, "new", 1.0, 1)]))
+        self.assertEqual(HostLatest.objects.get(host__hostname="f").process_count, 1)
+        self.assertEqual(self.pids("f"), [9])
+        # a spooled upload from before the stored snapshot never replaces it
+        self.ingest(snapshot("f", "2025-01-01T00:00:00Z", self.processes))
+        self.assertEqual(self.pids("f"), [9])
+
+    def test_newest_snapshot_in_a_batch_wins(self):
+        self.ingest(snapshot("f", "2025-01-01T00:01:00Z", [proc(9, "new", 1.0, 1)]),
+                    snapshot("f", "2025-01-01T00:00:00Z", self.processes))
+        self.assertEqual(self.pids("f"), [9])
+
+    def test_rebuild_rewrites_throttled_hosts(self):
+        self.ingest(snapshot("f", "2025-01-01T00:00:00Z", self.processes), snapshot("g", "2025-01-01T00:00:00Z"))
+        self.ingest(snapshot("f", "2025-01-01T00:00:05Z", [proc(9, "new", 1.0, 1)]))
+        LatestProcess.objects.filter(host__hostname="g").delete()
+        HostLatest.objects.filter(host__hostname="g").delete()
+
+        self.assertEqual(fleet.rebuild(), 2)
+        self.assertEqual(self.pids("f"), [9])
+        self.assertEqual(self.pids("g"), [1])
+        self.assertEqual(HostLatest.objects.get(host__hostname="f").snapshot_time, utc(2025, 1, 1, 0, 0, 5))
+
+    def test_queries(self):
+        self.ingest(snapshot("f", "2025-01-01T00:00:00Z", self.processes), snapshot("g", "2025-01-01T00:00:00Z"))
+        top = fleet.top_processes({"sort": "-rss_bytes", "limit": "2"})
+        self.assertEqual([(p["host"], p["pid"]) for p in top], [("f", 3), ("f", 4)])
+        count, hosts = fleet.hosts({"min_cpu": "10", "sort": "process_count"})
+        self.assertEqual((count, [h["host"] for h in hosts]), (1, ["f"]))
+        self.assertEqual(fleet.hosts({"sort": "process_count"})[1][0]["host"], "g")
+        self.assertEqual(fleet.hosts({"max_age": "60"})[0], 0)
+        for params in ({"sort": "name"}, {"limit": "0"}, {"min_ram": "lots"}):
+            with self.assertRaises(ValueError):
+                fleet.hosts(params)
+        with self.assertRaises(ValueError):
+            fleet.top_processes({"limit": "3"})
+        with self.assertRaises(ValueError):
+            fleet.top_processes({"sort": "cpu_percent"})
+
+
+def apply_patch(live, patch):
+    """dashboard.js applyPatch on its liveProcesses map (JSON object keys are strings)."""
+    for pid in patch["removed"]:
+        live.pop(str(pid), None)
+    for p in patch["added"] + patch["changed"]:
+        live[str(p["pid"])] = p
+    return live
+
+
+def cached(snapshot_id, processes, hostname="h"):
+    time = f"2025-01-01T00:{snapshot_id // 60:02d}:{snapshot_id % 60:02d}Z"
+    return CachedSnapshot(1, snapshot_id, time, {"host": hostname, "snapshot_time": time}, b"{}",
+                          {p["pid"]: (p["ppid"], p["name"], p["cpu_percent"], p["rss_bytes"], p["start_time"])
+                           for p in processes})
+
+
+def live_map(processes):
+    return {str(p["pid"]): p for p in processes}
+
+
+class PatchTests(SimpleTestCase):
+    """build_patch frames, applied the way the dashboard applies them, reproduce each snapshot."""
+
+    def test_patches_replay_to_each_snapshot(self):
+        samples = [make_processes(100)]
+        for seed in range(1, 12):
+            samples.append(step(samples[-1], seed))
+        live = live_map(samples[0])
+        previous = cached(1, samples[0])
+        for snapshot_id, processes in enumerate(samples[1:], start=2):
+            current = cached(snapshot_id, processes)
+            patch = json.loads(build_patch(previous, current))
+            self.assertEqual((patch["type"], patch["v"], patch["base"], patch["seq"]),
+                             ("patch", PROTOCOL_VERSION, previous.snapshot_id, snapshot_id))
+            self.assertEqual(apply_patch(live, patch), live_map(processes))
+            previous = current
+
+    def test_only_differences_are_sent(self):
+        before = [proc(1, "a", 1.0, 10), proc(2, "b", 2.0, 20), proc(3, "c", 3.0, 30)]
+        after = [proc(1, "a", 1.0, 10), proc(2, "b", 2.5, 20), proc(4, "d", 4.0, 40)]
+        patch = json.loads(build_patch(cached(1, before), cached(2, after)))
+        self.assertEqual(patch["added"], [proc(4, "d", 4.0, 40)])
+        self.assertEqual(patch["changed"], [proc(2, "b", 2.5, 20)])
+        self.assertEqual(patch["removed"], [3])
+        self.assertEqual((patch["host"], patch["snapshot_time"]), ("h", "2025-01-01T00:00:02Z"))
+
+    def test_reparenting_is_a_change(self):
+        before = [proc(1, "init", 0.0, 1), proc(2, "a", 1.0, 10)]
+        after = [proc(1, "init", 0.0, 1), dict(proc(2, "a", 1.0, 10), ppid=1)]
+        patch = json.loads(build_patch(cached(1, before), cached(2, after)))
+        self.assertEqual([p["ppid"] for p in patch["changed"]], [1])
+        self.assertEqual(apply_patch(live_map(before), patch), live_map(after))
+
+
+@override_settings(ROOT_URLCONF="api.tests", INGEST_MODE="sync")
+class CachedPatchTests(TestCase):
+    """The patch the latest cache keeps for broadcasts, from snapshots written by ingest."""
+
+    def setUp(self):
+        self.client = APIClient()
+        latest_cache.invalidate()
+
+    def ingest(self, *snapshots):
+        response = self.client.post("/sync/", gzip_payload(list(snapshots)), format="json", **AUTH)
+        self.assertEqual(response.status_code, 201)
+
+    def test_cached_patch_applies_to_previous_snapshot(self):
+        first = [proc(1, "a", 1.0, 10), proc(2, "b", 2.0, 20)]
+        second = [proc(1, "a", 5.0, 10), proc(3, "c", 3.0, 30)]
+        self.ingest(snapshot("p", "2025-01-01T00:00:00Z", first))
+        base = latest_cache.get("p")
+        self.assertIsNone(base.patch_text)
+        self.ingest(snapshot("p", "2025-01-01T00:00:05Z", second))
+        entry = latest_cache.get("p")
+        self.assertEqual(entry.patch_base, base.snapshot_id)
+        patch = json.loads(entry.patch_text)
+        self.assertEqual((patch["base"], patch["seq"]), (base.snapshot_id, entry.snapshot_id))
+        self.assertEqual(apply_patch(live_map(first), patch), live_map(second))
+
+    def test_older_snapshot_does_not_replace_the_cached_one(self):
+        self.ingest(snapshot("p", "2025-01-01T00:00:05Z", [proc(1, "a", 1.0, 10)]))
+        newest = latest_cache.get("p")
+        self.ingest(snapshot("p", "2025-01-01T00:00:00Z", [proc(2, "b", 1.0, 10)]))
+        self.assertIs(latest_cache.get("p"), newest)
+
+
+def rows(*pids, cpu=1.0):
+    return [(pid, 1, f"p{pid}", cpu, 100, 0.0) for pid in pids]
+
+
+def keyframe(seq, processes, stream="s"):
+    return {"stream": stream, "seq": seq, "keyframe": True, "processes": processes}
+
+
+def delta(seq, added=(), removed=(), changed=(), stream="s"):
+    return {"stream": stream, "seq": seq, "delta": {"added": list(added), "removed": list(removed),
+                                                    "changed": list(changed)}}
+
+
+class DeltaStoreTests(SimpleTestCase):
+
+    def test_keyframe_then_deltas(self):
+        store = DeltaStore()
+        self.assertEqual(sorted(store.apply("h", keyframe(1, rows(1, 2, 3)))), rows(1, 2, 3))
+        processes = store.apply("h", delta(2, added=rows(4), removed=[1], changed=[(2, None, None, 9.0, None)]))
+        self.assertEqual(sorted(processes), [(2, 1, "p2", 9.0, 100), *rows(3, 4)])
+        # a keyframe replaces the table whatever came before
+        self.assertEqual(store.apply("h", keyframe(9, rows(7))), rows(7))
+        self.assertEqual(store.apply("h", delta(10)), rows(7))
+
+    def test_sequence_gap_requires_resync(self):
+        store = DeltaStore()
+        store.apply("h", keyframe(1, rows(1)))
+        with self.assertRaises(ResyncRequired):
+            store.apply("h", delta(3))
+        # the state is gone, so the delta that was skipped cannot fill the gap either
+        with self.assertRaises(ResyncRequired):
+            store.apply("h", delta(2))
+
+    def test_other_stream_requires_resync(self):
+        store = DeltaStore()
+        store.apply("h", keyframe(1, rows(1)))
+        with self.assertRaises(ResyncRequired):
+            store.apply("h", delta(2, stream="restarted"))
+
+    def test_change_to_unknown_pid_requires_resync(self):
+        store = DeltaStore()
+        store.apply("h", keyframe(1, rows(1)))
+        with self.assertRaises(ResyncRequired):
+            store.apply("h", delta(2, changed=[(5, None, None, 1.0, None)]))
+        with self.assertRaises(ResyncRequired):
+            store.apply("h", delta(3))
+
+    def test_hosts_are_independent(self):
+        store = DeltaStore()
+        store.apply("a", keyframe(1, rows(1)))
+        store.apply("b", keyframe(1, rows(2)))
+        store.forget("a")
+        with self.assertRaises(ResyncRequired):
+            store.apply("a", delta(2))
+        self.assertEqual(store.apply("b", delta(2)), rows(2))
+
+    def test_snapshots_without_seq_pass_through(self):
+        store = DeltaStore()
+        self.assertEqual(store.apply("h", {"processes": rows(1)}), rows(1))
+        with self.assertRaises(ResyncRequired):
+            store.apply("h", delta(1))
+
+
+@override_settings(ROOT_URLCONF="api.tests", INGEST_MODE="sync")
+class DeltaIngestTests(TestCase):
+    """Delta state only ever describes a snapshot the server has stored."""
+
+    def setUp(self):
+        self.client = APIClient()
+        latest_cache.invalidate()
+        delta_store.forget("d")
+
+    def post(self, *snapshots):
+        return self.client.post("/sync/", gzip_payload(list(snapshots)), format="json", **AUTH)
+
+    def snap(self, seq, time, **kwargs):
+        data = snapshot("d", time, stream="s", seq=seq, **kwargs)
+        if "delta" in kwargs:
+            del data["processes"]
+        return data
+
+    def change(self, cpu):
+        return {"added": [], "removed": [], "changed": [{"pid": 1, "cpu_percent": cpu}]}
+
+    def test_deltas_are_stored_as_full_lists(self):
+        response = self.post(self.snap(1, "2025-01-01T00:00:00Z", keyframe=True),
+                             self.snap(2, "2025-01-01T00:00:05Z", delta=self.change(7.5)))
+        self.assertEqual(response.status_code, 201)
+        snap = Snapshot.objects.get(snapshot_time=utc(2025, 1, 1, 0, 0, 5))
+        self.assertEqual(get_process_store().read([snap])[snap.id],
+                         [{"pid": 1, "ppid": 0, "name": "init", "cpu_percent": 7.5, "rss_bytes": 4096,
+                           "start_time": 0.0}])
+
+    def test_dropped_snapshot_asks_for_resync(self):
+        self.post(self.snap(1, "2025-01-01T00:00:00Z", keyframe=True))
+        bad_host = self.snap(2, "2025-01-01T00:00:05Z", delta=self.change(2.0),
+                             hostdetails={"hostname": "d", "physical_cores": "many"})
+        response = self.post(bad_host)
+        self.assertEqual(response.json(), {"created": [], "resync": ["d"]})
+        # the next delta would build on the dropped one
+        response = self.post(self.snap(3, "2025-01-01T00:00:10Z", delta=self.change(3.0)))
+        self.assertEqual(response.json(), {"created": [], "resync": ["d"]})
+
+    def test_failed_write_asks_for_resync(self):
+        self.post(self.snap(1, "2025-01-01T00:00:00Z", keyframe=True))
+        with mock.patch("api.ingest.fleet.refresh", side_effect=RuntimeError("disk full")):
+            response = self.post(self.snap(2, "2025-01-01T00:00:05Z", delta=self.change(2.0)))
+        self.assertEqual(response.status_code, 500)
+        response = self.post(self.snap(3, "2025-01-01T00:00:10Z", delta=self.change(3.0)))
+        self.assertEqual(response.json(), {"created": [], "resync": ["d"]})
+        self.assertEqual(Snapshot.objects.count(), 1)
+
+
+@override_settings(ROOT_URLCONF="api.tests", INGEST_MODE="queue", INGEST_RETRY_AFTER=7)
+class IngestQueueTests(TestCase):
+    """Queue mode answers 202 or 429 and never lets a refused request touch the delta state."""
+
+    def setUp(self):
+        self.client = APIClient()
+        delta_store.forget("q")
+        self.queue = IngestQueue(maxsize=1, workers=1, coalesce_max=10)
+        # no worker threads: the test drains the queue itself
+        self.queue.start = lambda: None
+        patcher = mock.patch("api.views.ingest_queue", self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, *snapshots, url="/sync/"):
+        return self.client.generic("POST", url, json.dumps(gzip_payload(list(snapshots))),
+                                   content_type="application/json", **AUTH)
+
+    def snap(self, seq, **kwargs):
+        return snapshot("q", f"2025-01-01T00:00:{seq:02d}Z", stream="s", seq=seq, **kwargs)
+
+    def test_accepted_then_full(self):
+        response = self.post(self.snap(1, keyframe=True))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {"queued": 1, "queue_depth": 1})
+
+        refused = self.snap(2, delta={"added": [], "removed": [], "changed": []})
+        del refused["processes"]
+        response = self.post(refused)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "7")
+        self.assertEqual(self.queue.stats["rejected"], 1)
+
+        # the refused delta was not applied, so its retry still lines up
+        batch, taken = self.queue._take_batch()
+        self.assertEqual((len(batch), taken), (1, 1))
+        response = self.post(refused)
+        self.assertEqual(response.status_code, 202)
+        self.assertNotIn("resync", response.json())
+
+    def test_failed_prepare_gives_the_place_back(self):
+        with mock.patch("api.views.prepare_snapshots", side_effect=RuntimeError("boom")):
+            self.assertEqual(self.post(self.snap(1, keyframe=True)).status_code, 500)
+        self.assertTrue(self.queue.reserve(1))
+
+    def test_async_view(self):
+        self.assertEqual(self.post(self.snap(1, keyframe=True), url="/async/").status_code, 202)
+        response = self.post(self.snap(2, keyframe=True), url="/async/")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "7")
+
+
+@override_settings(ROOT_URLCONF="api.tests", INGEST_MODE="queue")
+class IngestQueueWorkerTests(TransactionTestCase):
+
+    def test_worker_stores_queued_snapshots(self):
+        queue = IngestQueue(maxsize=4, workers=1, coalesce_max=10)
+        with mock.patch("api.views.ingest_queue", queue):
+            response = APIClient().post("/sync/", gzip_payload([snapshot("w1"), snapshot("w2")]), format="json", **AUTH)
+            self.assertEqual(response.status_code, 202)
+            queue._queue.join()
+        self.assertEqual(sorted(Snapshot.objects.values_list("host__hostname", flat=True)), ["w1", "w2"])
+        self.assertEqual((queue.stats["stored"], queue.stats["transactions"]), (2, 1))
+        # the place is free again once a worker has taken the batch
+        self.assertTrue(all(queue.reserve(1) for _ in range(4)))
+
+
+@override_settings(ROOT_URLCONF="api.tests", INGEST_MODE="sync")
+class IngestWriterTests(TestCase):
+
+    def test_full_writer_answers_429(self):
+        with mock.patch("api.views.ingest_writer", IngestWriter(maxsize=0, workers=1, coalesce_max=10)):
+            response = APIClient().generic("POST", "/async/", json.dumps(gzip_payload([snapshot("full")])),
+                                           content_type="application/json", **AUTH)
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse(Host.objects.filter(hostname="full").exists())
+
+
+class ProcessStorageTests(TestCase):
+
+    def setUp(self):
+        host = Host.objects.create(hostname="s")
+        self.old = Snapshot.objects.create(host=host, snapshot_time=utc(2025, 1, 1, 12))
+        self.new = Snapshot.objects.create(host=host, snapshot_time=utc(2025, 1, 3, 12))
+
+    def rows(self, snap, *names):
+        return [(snap.id, pid, 1, name, 1.5, 100 * pid, 1735689600.0 + pid) for pid, name in enumerate(names, start=1)]
+
+    def test_daily_store_round_trip(self):
+        store = DailyProcessStore()
+        with self.captureOnCommitCallbacks(execute=True):
+            store.write([(self.old, self.rows(self.old, "a", "b")), (self.new, self.rows(self.new, "b"))])
+        self.assertEqual(store.partitions(), {"api_process_p20250101", "api_process_p20250103"})
+        result = DailyProcessStore().read([self.old, self.new])
+        self.assertEqual(sorted(p["name"] for p in result[self.old.id]), ["a", "b"])
+        self.assertEqual(result[self.new.id], [{"pid": 1, "ppid": 1, "name": "b", "cpu_percent": 1.5,
+                                                "rss_bytes": 100, "start_time": 1735689601.0}])
+
+    def test_daily_prune_drops_days_and_leftover_table_rows(self):
+        # rows left in api_process by migrate_process_storage --keep or from before the switch
+        TableProcessStore().write([(self.old, self.rows(self.old, "a"))])
+        store = DailyProcessStore()
+        with self.captureOnCommitCallbacks(execute=True):
+            store.write([(self.old, self.rows(self.old, "a")), (self.new, self.rows(self.new, "b"))])
+
+        self.assertEqual(store.prune(utc(2025, 1, 2, 6)), 1)
+        connection.check_constraints()
+        self.assertFalse(Process.objects.exists())
+        self.assertEqual(list(Snapshot.objects.values_list("id", flat=True)), [self.new.id])
+        self.assertEqual(store.partitions(), {"api_process_p20250103"})
+        self.assertEqual(len(store.read([self.new])[self.new.id]), 1)
+
+    def test_table_prune(self):
+        store = TableProcessStore()
+        store.write([(self.old, self.rows(self.old, "a")), (self.new, self.rows(self.new, "b"))])
+        self.assertEqual(store.prune(utc(2025, 1, 2)), 1)
+        self.assertEqual(list(Process.objects.values_list("name", flat=True)), ["b"])
+
+    def test_migrate_process_storage(self):
+        TableProcessStore().write([(self.old, self.rows(self.old, "a", "b")), (self.new, self.rows(self.new, "c"))])
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("migrate_process_storage", "--chunk", "1", stdout=StringIO())
+        self.assertFalse(Process.objects.exists())
+        result = DailyProcessStore().read([self.old, self.new])
+        self.assertEqual(sorted(p["name"] for p in result[self.old.id]), ["a", "b"])
+        self.assertEqual([p["name"] for p in result[self.new.id]], ["c"])
+
+    def test_migrate_process_storage_keep(self):
+        TableProcessStore().write([(self.old, self.rows(self.old, "a"))])
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("migrate_process_storage", "--keep", stdout=StringIO())
+        self.assertEqual(Process.objects.count(), 1)
+        self.assertEqual(len(DailyProcessStore().read([self.old])[self.old.id]), 1)
+
+
+class DayTableMigrationTests(TransactionTestCase):
+    """0011 adds start_time to day tables created before it."""
+
+    table = "api_process_p20240101"
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def test_existing_day_tables_get_the_column(self):
+        migration = importlib.import_module("api.migrations.0011_process_start_time")
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE {self.table} (snapshot_id bigint NOT NULL, pid integer NOT NULL, "
+                           "ppid integer NOT NULL, name_id bigint NOT NULL, cpu_percent double precision NOT NULL, "
+                           "rss_bytes bigint NOT NULL)")
+            cursor.execute(f"INSERT INTO {self.table} VALUES (1, 1, 0, 1, 0.5, 10)")
+        with connection.schema_editor() as editor:
+            migration.add_day_table_column(None, editor)
+            # a second run (or a table created after the store learned the column) is left alone
+            migration.add_day_table_column(None, editor)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT pid, start_time FROM {self.table}")
+            self.assertEqual(cursor.fetchall(), [(1, 0.0)])
+
+
+class HostDetailsTests(TestCase):
+    """Static details are kept on the host; RAM and disk use go with each snapshot."""
+
+    metrics = {"ram_used_gb": 4.0, "ram_available_gb": 12.0, "disk_used_gb": 40.0, "disk_free_gb": 60.0}
+
+    def test_hostname_only_snapshots_keep_static_details(self):
+        ingest_snapshots([
+            snapshot("s", "2025-01-01T00:00:00Z", [],
+                     hostdetails={"hostname": "s", "os": "Linux", "ram_total_gb": 16.0}, host_metrics=self.metrics),
+            snapshot("s", "2025-01-01T00:00:05Z", [], host_metrics={**self.metrics, "ram_used_gb": 5.5}),
+        ])
+        host = Host.objects.get(hostname="s")
+        self.assertEqual((host.os, host.ram_total_gb), ("Linux", 16.0))
+        self.assertEqual(list(Snapshot.objects.order_by("snapshot_time").values_list("ram_used_gb", flat=True)),
+                         [4.0, 5.5])
+        data = self.client.get("/api/hosts/s/").json()
+        self.assertEqual((data["os"], data["ram_total_gb"], data["ram_used_gb"], data["disk_free_gb"]),
+                         ("Linux", 16.0, 5.5, 60.0))
+
+
+class HostMetricsMigrationTests(TransactionTestCase):
+    """0009 moves the host's RAM and disk use onto its newest snapshot."""
+
+    before = [("api", "0008_host_sample_interval")]
+    after = [("api", "0009_snapshot_host_metrics")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes("api"))
+
+    def test_values_are_copied_to_the_latest_snapshot(self):
+        apps = self.migrate(self.before)
+        Host = apps.get_model("api", "Host")
+        Snapshot = apps.get_model("api", "Snapshot")
+        host = Host.objects.create(hostname="m", ram_used_gb=4.0, ram_available_gb=12.0, disk_used_gb=40.0,
+                                   disk_free_gb=60.0)
+        Host.objects.create(hostname="empty")
+        older = Snapshot.objects.create(host=host, snapshot_time=utc(2025, 1, 1))
+        newer = Snapshot.objects.create(host=host, snapshot_time=utc(2025, 1, 1, 0, 0, 5))
+
+        Snapshot = self.migrate(self.after).get_model("api", "Snapshot")
+        fields = ("ram_used_gb", "ram_available_gb", "disk_used_gb", "disk_free_gb")
+        self.assertEqual(Snapshot.objects.values_list(*fields).get(pk=newer.pk), (4.0, 12.0, 40.0, 60.0))
+        self.assertEqual(Snapshot.objects.values_list(*fields).get(pk=older.pk), (None,) * 4)
+
+
+class ProcessSeriesTests(TestCase):
+    url = "/api/hosts/h/series/"
+
+    def ingest(self, *samples):
+        """One snapshot per minute from 00:00; each sample is a list of (pid, ppid, name, start_time)."""
+        ingest_snapshots([
+            snapshot("h", f"2025-01-01T00:{minute:02d}:00Z", [
+                {"pid": pid, "ppid": ppid, "name": name, "cpu_percent": float(minute), "rss_bytes": 10,
+                 "start_time": start}
+                for pid, ppid, name, start in sample
+            ])
+            for minute, sample in enumerate(samples)
+        ])
+
+    def series(self, **params):
+        response = self.client.get(self.url, {"start": "2025-01-01T00:00:00Z", "end": "2025-01-01T01:00:00Z",
+                                              **params})
+        self.assertEqual(response.status_code, 200)
+        return [(i["name"], i["start_time"], i["cpu_percent"]) for i in response.json()["instances"]]
+
+    def test_reused_pid_is_a_new_instance(self):
+        # a worker respawned under the same supervisor with the same name and pid
+        self.ingest([(10, 1, "worker", 100.0)], [(10, 1, "worker", 100.0)],
+                    [(10, 1, "worker", 160.5)], [(10, 1, "worker", 160.5)])
+        self.assertEqual(self.series(pid=10), [("worker", 100.0, [0.0, 1.0]), ("worker", 160.5, [2.0, 3.0])])
+
+    def test_same_start_time_keeps_a_renamed_process(self):
+        self.ingest([(10, 1, "python", 100.0)], [(10, 1, "gunicorn", 100.0)])
+        self.assertEqual(self.series(pid=10), [("gunicorn", 100.0, [0.0, 1.0])])
+
+    def test_without_start_times_name_and_parent_decide(self):
+        self.ingest([(10, 1, "a", 0.0)], [], [(10, 1, "a", 0.0)], [(10, 1, "b", 0.0)], [], [(10, 2, "b", 0.0)])
+        self.assertEqual(self.series(pid=10), [("a", 0.0, [0.0, 2.0]), ("b", 0.0, [3.0]), ("b", 0.0, [5.0])])
+
+    def test_name_series_and_errors(self):
+        self.ingest([(10, 1, "nginx", 100.0), (11, 10, "nginx", 101.0)], [(11, 10, "nginx", 101.0)])
+        self.assertEqual(self.series(name="nginx"), [("nginx", 100.0, [0.0]), ("nginx", 101.0, [0.0, 1.0])])
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"pid": "x"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/hosts/nobody/series/", {"pid": 1}).status_code, 404)
+        with override_settings(SERIES_MAX_SNAPSHOTS=1):
+            response = self.client.get(self.url, {"pid": 10, "start": "2025-01-01T00:00:00Z",
+                                                  "end": "2025-01-01T01:00:00Z"})
+        self.assertEqual(response.status_code, 400)
+
+
+class LatestCacheTests(TestCase):
+
+    def snap(self, hostname, second=0, processes=1):
+        host, _ = Host.objects.get_or_create(hostname=hostname)
+        snap = Snapshot.objects.create(host=host, snapshot_time=utc(2025, 1, 1, 0, 0, second))
+        snap.process_rows = [proc(pid, "p", 1.0, 10) for pid in range(1, processes + 1)]
+        return snap
+
+    def entry_size(self):
+        return LatestSnapshotCache(max_bytes=1 << 30, ttl=0).put(self.snap("size")).size
+
+    def test_least_recently_read_host_is_evicted(self):
+        size = self.entry_size()
+        cache = LatestSnapshotCache(max_bytes=2 * size + size // 2, ttl=0)
+        cache.put(self.snap("h1"))
+        cache.put(self.snap("h2"))
+        cache.get("h1")
+        cache.put(self.snap("h3"))
+        self.assertIsNone(cache.get("h2"))
+        kept = [cache.get("h1"), cache.get("h3")]
+        self.assertNotIn(None, kept)
+        self.assertEqual(cache.stats()["bytes"], sum(entry.size for entry in kept))
+
+    def test_byte_count_follows_replacements(self):
+        cache = LatestSnapshotCache(max_bytes=1 << 30, ttl=0)
+        cache.put(self.snap("h1", 0, processes=1))
+        entry = cache.put(self.snap("h1", 1, processes=50))
+        self.assertEqual(cache.stats()["bytes"], entry.size)
+        cache.invalidate(hostname="h1")
+        self.assertEqual(cache.stats(), {"hosts": 0, "bytes": 0, "max_bytes": 1 << 30})
+
+    def test_newest_entry_is_kept_even_over_budget(self):
+        cache = LatestSnapshotCache(max_bytes=1, ttl=0)
+        cache.put(self.snap("h1"))
+        cache.put(self.snap("h2"))
+        self.assertIsNone(cache.get("h1"))
+        self.assertIsNotNone(cache.get("h2"))
+
+    def test_disabled_cache_stores_nothing(self):
+        cache = LatestSnapshotCache(max_bytes=0, ttl=0)
+        snap = self.snap("h1")
+        self.assertEqual(cache.put(snap).snapshot_id, snap.id)
+        self.assertIsNone(cache.get("h1"))
+
+    def test_ttl(self):
+        cache = LatestSnapshotCache(max_bytes=1 << 30, ttl=30)
+        with mock.patch("api.latest_cache.time.monotonic", return_value=1000.0):
+            cache.put(self.snap("h1"))
+        with mock.patch("api.latest_cache.time.monotonic", return_value=1029.0):
+            self.assertIsNotNone(cache.get("h1"))
+        with mock.patch("api.latest_cache.time.monotonic", return_value=1031.0):
+            self.assertIsNone(cache.get("h1"))
+        self.assertEqual(cache.stats()["bytes"], 0)
+
+    def test_orm_deletes_invalidate(self):
+        latest_cache.invalidate()
+        snap = self.snap("h1")
+        latest_cache.put(snap)
+        snap.delete()
+        self.assertIsNone(latest_cache.get("h1"))
+
+    def test_miss_reads_the_database(self):
+        latest_cache.invalidate()
+        self.snap("h1", 0)
+        newest = self.snap("h1", 5)
+        TableProcessStore().write([(newest, [(newest.id, 7, 1, "x", 2.0, 30, 1735689600.5)])])
+        with override_settings(PROCESS_STORAGE="table"), mock.patch("api.storage._store", TableProcessStore()):
+            entry = latest_for("h1")
+        self.assertEqual(entry.snapshot_id, newest.id)
+        self.assertEqual(entry.processes, {7: (1, "x", 2.0, 30, 1735689600.5)})
+        self.assertIs(latest_cache.get("h1"), entry)
+        self.assertIsNone(latest_for("nobody"))
+
+
+def frame(host, seq, kind="snapshot"):
+    return json.dumps({"type": kind, "host": host, "seq": seq})
+
+
+class HostStreamTests(TransactionTestCase):
+    """
+    Multi-host and wildcard subscriptions and max_rate on one WebSocket.
+    Subscribed hosts have a stored snapshot, so each subscribe answers with
+    a full frame once it is in place; broadcast seqs start above those ids.
+    """
+
+    def setUp(self):
+        latest_cache.invalidate()
+
+    async def seed(self, *hostnames):
+        ids = {}
+        for hostname in hostnames:
+            host = await Host.objects.acreate(hostname=hostname)
+            ids[hostname] = (await Snapshot.objects.acreate(host=host, snapshot_time=utc(2025, 1, 1))).id
+        return ids
+
+    async def connect(self, path="/ws/hosts/"):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def broadcast(self, host, seq, patch_base=None):
+        patch = frame(host, seq, "patch") if patch_base is not None else None
+        await broadcast_snapshot_async(seq, host, "t", frame(host, seq), patch, patch_base)
+
+    async def received(self, communicator):
+        return json.loads(await communicator.receive_from(timeout=1))
+
+    async def synced(self, communicator, host):
+        """Round trip through the consumer: earlier messages have been handled once this returns."""
+        await communicator.send_json_to({"action": "latest", "host": host})
+        self.assertEqual((await self.received(communicator))["data"]["host"], host)
+
+    async def test_multi_host_subscription(self):
+        ids = await self.seed("a", "b")
+        ws = await self.connect()
+        await ws.send_json_to({"action": "subscribe", "hosts": ["a", "b"]})
+        self.assertEqual({(await self.received(ws))["seq"] for _ in range(2)}, {ids["a"], ids["b"]})
+
+        for host, seq in (("a", 1001), ("c", 1002), ("b", 1003)):
+            await self.broadcast(host, seq)
+        self.assertEqual(await self.received(ws), json.loads(frame("a", 1001)))
+        self.assertEqual(await self.received(ws), json.loads(frame("b", 1003)))
+
+        await ws.send_json_to({"action": "unsubscribe", "hosts": ["b"]})
+        await self.synced(ws, "a")
+        await self.broadcast("b", 1004)
+        await self.broadcast("a", 1005)
+        self.assertEqual(await self.received(ws), json.loads(frame("a", 1005)))
+        self.assertTrue(await ws.receive_nothing())
+        await ws.disconnect()
+
+    async def test_wildcard_matches_later_hosts_once(self):
+        ids = await self.seed("web-1")
+        ws = await self.connect()
+        await ws.send_json_to({"action": "subscribe", "hosts": ["web-*", "web-1"]})
+        self.assertEqual((await self.received(ws))["seq"], ids["web-1"])
+        self.assertTrue(await ws.receive_nothing(timeout=0.05))
+
+        await self.broadcast("db-1", 1001)
+        await self.broadcast("web-1", 1002)
+        await self.broadcast("web-new", 1003)
+        # web-1 reaches the connection through its host group and the fleet group
+        self.assertEqual([(await self.received(ws))["seq"] for _ in range(2)], [1002, 1003])
+        self.assertTrue(await ws.receive_nothing())
+
+        await ws.send_json_to({"action": "unsubscribe", "hosts": ["web-*"]})
+        await self.synced(ws, "web-1")
+        await self.broadcast("web-new", 1004)
+        await self.broadcast("web-1", 1005)
+        self.assertEqual((await self.received(ws))["seq"], 1005)
+        self.assertTrue(await ws.receive_nothing())
+        await ws.disconnect()
+
+    async def test_max_rate_coalesces_to_the_newest(self):
+        await self.seed("a")
+        ws = await self.connect("/ws/hosts/?max_rate=4")
+        await ws.send_json_to({"action": "subscribe", "hosts": ["a"]})
+        await self.received(ws)
+        for seq in (1001, 1002, 1003, 1004):
+            await self.broadcast("a", seq)
+        self.assertEqual((await self.received(ws))["seq"], 1001)
+        self.assertEqual((await self.received(ws))["seq"], 1004)
+        self.assertTrue(await ws.receive_nothing(timeout=0.4))
+        await ws.disconnect()
+
+    async def test_patches_follow_the_clients_seq(self):
+        ids = await self.seed("a")
+        ws = await self.connect("/ws/hosts/?v=2")
+        await ws.send_json_to({"action": "subscribe", "hosts": ["a"]})
+        self.assertEqual((await self.received(ws))["seq"], ids["a"])
+        await self.broadcast("a", 1001, patch_base=ids["a"])
+        await self.broadcast("a", 1003, patch_base=1002)
+        self.assertEqual(await self.received(ws), json.loads(frame("a", 1001, "patch")))
+        # missed snapshot 1002: the full frame instead of an unusable patch
+        self.assertEqual(await self.received(ws), json.loads(frame("a", 1003)))
+        await ws.disconnect()
+
+    async def test_frame_without_prerendered_text(self):
+        ids = await self.seed("plain")
+        ws = await self.connect()
+        await ws.send_json_to({"action": "subscribe", "hosts": ["pl*"]})
+        self.assertEqual((await self.received(ws))["seq"], ids["plain"])
+        host = await Host.objects.aget(hostname="plain")
+        later = await Snapshot.objects.acreate(host=host, snapshot_time=utc(2025, 1, 2))
+        await broadcast_snapshot_async(later.id, "plain", "t")
+        data = await self.received(ws)
+        self.assertEqual((data["type"], data["v"], data["seq"]), ("snapshot", PROTOCOL_VERSION, later.id))
+        self.assertEqual((data["data"]["id"], data["data"]["host"]), (later.id, "plain"))
+        await ws.disconnect()
+
+
+class SocketChannelLayerTests(SimpleTestCase):
+    """Two layers in one process stand in for two workers sharing a hub."""
+
+    def setUp(self):
+        self.path = str(Path(tempfile.mkdtemp()) / "hub.sock")
+        self.hub_loop = asyncio.new_event_loop()
+        threading.Thread(target=self.hub_loop.run_forever, daemon=True).start()
+        self.hub = ChannelHub(self.path, log=lambda m: None)
+
+    def tearDown(self):
+        async def shutdown():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.hub_loop).result(5)
+        self.hub_loop.call_soon_threadsafe(self.hub_loop.stop)
+
+    def start_hub(self):
+        asyncio.run_coroutine_threadsafe(self.hub.serve(), self.hub_loop)
+
+    async def until(self, condition):
+        for _ in range(300):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        self.fail("timed out")
+
+    def members(self, group):
+        return len(self.hub.members.get(group, ()))
+
+    async def test_group_messages_cross_layers(self):
+        self.start_hub()
+        worker_a, worker_b = SocketChannelLayer(self.path), SocketChannelLayer(self.path)
+        on_a, on_b = await worker_a.new_channel(), await worker_b.new_channel()
+        await worker_a.group_add("host_x", on_a)
+        await worker_b.group_add("host_x", on_b)
+        await self.until(lambda: self.members("host_x") == 2)
+
+        await worker_b.group_send("host_x", {"type": "snapshot_created", "snapshot_id": 1})
+        self.assertEqual((await asyncio.wait_for(worker_a.receive(on_a), 2))["snapshot_id"], 1)
+        # the sender's own members get it once, locally, not echoed back by the hub
+        self.assertEqual((await asyncio.wait_for(worker_b.receive(on_b), 2))["snapshot_id"], 1)
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.hub.relayed, 1)
+
+    async def test_discarded_group_is_not_relayed(self):
+        self.start_hub()
+        worker_a, worker_b = SocketChannelLayer(self.path), SocketChannelLayer(self.path)
+        on_a = await worker_a.new_channel()
+        await worker_a.group_add("host_x", on_a)
+        await self.until(lambda: self.members("host_x") == 1)
+        await worker_a.group_discard("host_x", on_a)
+        await self.until(lambda: self.members("host_x") == 0)
+
+        await worker_b.group_send("host_x", {"type": "snapshot_created", "snapshot_id": 1})
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.hub.relayed, 0)
+
+    async def test_subscriptions_survive_a_late_hub(self):
+        worker_a, worker_b = SocketChannelLayer(self.path), SocketChannelLayer(self.path)
+        on_a = await worker_a.new_channel()
+        await worker_a.group_add("host_x", on_a)
+        self.start_hub()
+        await self.until(lambda: self.members("host_x") == 1)
+
+        await worker_b.group_send("host_x", {"type": "snapshot_created", "snapshot_id": 7})
+        self.assertEqual((await asyncio.wait_for(worker_a.receive(on_a), 3))["snapshot_id"], 7)
+
+
+class MetricsTests(SimpleTestCase):
+    def test_label_values_are_escaped(self):
+        counter = metrics.Counter("procmon_test_total", "Test.", ["path"])
+        metrics._registry.remove(counter)
+        counter.inc(path='C:\\tmp\n"x"')
+        self.assertEqual(counter.render()[2], 'procmon_test_total{path="C:\\\\tmp\\n\\"x\\""} 1')
+
+    def test_agent_copy_is_in_sync(self):
+        def shared(path):
+            source = path.read_text()
+            start = source.index("def _format_labels")
+            return source[start:source.index("\n\n\n", source.index("def render", start))]
+
+        backend = Path(settings.BASE_DIR)
+        self.assertEqual(shared(backend / "api" / "metrics.py"), shared(backend.parent / "agent" / "metrics.py"))
@@ -1,14 +1,26 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
+                    AsyncIngestView,
                     IngestAPIView,
+                    IngestQueueAPIView,
+                    MetricsAPIView,
+                    FleetHostsAPIView,
+                    FleetProcessesAPIView,
                     LatestSnapshotAPIView,
                     HostDetailAPIView,
+                    ProcessSeriesAPIView,
                     HistoricalProcessesAPIView
                     )
 
 urlpatterns = [
-    path("ingest/", IngestAPIView.as_view(), name="ingest"),
+    path("ingest/", (AsyncIngestView if settings.INGEST_VIEW == "async" else IngestAPIView).as_view(), name="ingest"),
+    path("ingest/queue/", IngestQueueAPIView.as_view(), name="ingest_queue"),
+    path("metrics/", MetricsAPIView.as_view(), name="metrics"),
+    path("fleet/hosts/", FleetHostsAPIView.as_view(), name="fleet_hosts"),
+    path("fleet/processes/", FleetProcessesAPIView.as_view(), name="fleet_processes"),
     path("hosts/<str:hostname>/latest/", LatestSnapshotAPIView.as_view(), name="latest_snapshot"),
+    path("hosts/<str:hostname>/series/", ProcessSeriesAPIView.as_view(), name="process_series"),
     path("hosts/<str:hostname>/", HostDetailAPIView.as_view(), name="host_detail"),
     path("history/<str:hostname>/", HistoricalProcessesAPIView.as_view(), name="historical_processes"),
 
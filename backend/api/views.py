@@ -1,22 +1,40 @@
-import base64
-import gzip
-import json
-from datetime import datetime
-from django.db import transaction
+import asyncio
+import time
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.utils.dateparse import parse_datetime
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from datetime import timedelta
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.permissions import AllowAny
+from rest_framework.settings import api_settings
 
+from . import fleet, metrics
 from .authentication import AgentAPIKeyAuthentication
-from .models import Host, Snapshot, Process
-from .serializers import SnapshotSerializer, HostSerializer, HistoricalProcessSerializer
-from .consumers import broadcast_snapshot
-from rest_framework.pagination import PageNumberPagination
+from .async_ingest import UnsupportedContentType, decode_body, decode_pool, ingest_writer
+from .codecs import SUPPORTED_ENCODINGS, PayloadTooLarge, UnsupportedEncoding
+from .parsers import ColumnarParser, FastJSONParser
+from .models import Host, Snapshot
+from .serializers import SnapshotSerializer, HostSerializer
+from .ingest import InvalidPayload, extract_snapshots, prepare_snapshots, store_snapshots
+from .ingest_queue import ingest_queue
+from .intervals import sample_intervals
+from .storage import attach_processes
+from .latest_cache import latest_for
+from .process_query import ProcessQuery
+from .schema import HOST_METRIC_FIELDS
+from .rollups import RESOLUTIONS, choose_resolution, rollup_series
+from .series import process_series
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class IngestAPIView(APIView):
@@ -25,114 +43,91 @@ class IngestAPIView(APIView):
     Expects JSON payload: { "payload": "<base64(gzip(JSON snapshot))>" }
     Or accept direct JSON snapshot (uncompressed) if 'payload' not provided.
 
+    Agents may instead send a raw application/x-procmon-columnar body (see
+    api.codecs); ingest responses advertise the accepted Content-Encodings
+    in an Accept-Encoding header.
+
+    Snapshots carrying "seq"/"stream" may be keyframes ("keyframe": true with
+    "processes") or deltas ("delta": {"added", "removed", "changed"}). Hosts
+    whose delta could not be applied are listed under "resync" in the
+    response so the agent sends a keyframe next. Snapshots that do not
+    match the schema are skipped and listed under "invalid" with their
+    index; the request is refused with 400 only if none is valid. "interval" tells the agent
+    how often to sample when the host (Host.sample_interval) or
+    AGENT_INTERVAL sets one.
+
+    With INGEST_MODE = "queue" the snapshots are validated and queued, the
+    view answers 202, and ingest workers write them to the database. A full
+    queue answers 429 with Retry-After.
+
     """
 
     authentication_classes = [AgentAPIKeyAuthentication]
     permission_classes = [AllowAny]
+    parser_classes = [ColumnarParser, FastJSONParser, *api_settings.DEFAULT_PARSER_CLASSES]
+
+    def _queue_full_response(self):
+        response = Response({"detail": "Ingest queue full"},
+                            status=status.HTTP_429_TOO_MANY_REQUESTS)
+        response["Retry-After"] = str(settings.INGEST_RETRY_AFTER)
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        metrics.ingest_requests.inc(status=response.status_code)
+        return super().finalize_response(request, response, *args, **kwargs)
 
     def post(self, request, *args, **kwargs):
         """
-          Accept two forms:
+          Accept three forms:
           1) compressed: {"payload": "<base64...>"}
           2) direct JSON snapshot: {"hostname":..., "snapshot_time":..., "processes":[...]}
+          3) columnar body, already decoded by ColumnarParser into a list of snapshots
 
         """
+        metrics.ingest_body_bytes.observe(int(request.META.get("CONTENT_LENGTH") or 0))
+        started = time.perf_counter()
+        # parse errors from request.data must surface as 400/415, not 500
+        data = request.data
         try:
-            data = request.data
-            snapshots = []
-
-            if isinstance(data, dict) and "payload" in data:
-                b64 = data["payload"]
-                try:
-                    raw = base64.b64decode(b64)
-                    decompressed = gzip.decompress(raw)
-                    parsed = json.loads(decompressed.decode("utf-8"))
-                except Exception as e:
-                    return Response({"detail": f"Failed to decode payload: {e}"}
-                                    , status=status.HTTP_400_BAD_REQUEST)
-
-                if isinstance(parsed, list):
-                    snapshots = parsed
-                elif isinstance(parsed, dict):
-                    if "snapshots" in parsed and isinstance(parsed["snapshots"], list):
-                        snapshots = parsed["snapshots"]
-                    else:
-                        snapshots = [parsed]
-                else:
-                    return Response({"detail": "Unsupported payload content"},
-                                     status=status.HTTP_400_BAD_REQUEST)
-
-            elif isinstance(data, dict):
-                if "snapshot" in data and isinstance(data["snapshot"], list):
-                    snapshots = data["snapshot"]
-                elif "hostdetails" in data and "snapshot_time" in data:
-                    snapshots = [data]
-                else:
-                    return Response({"detail": "Invalid body"},
-                                     status=status.HTTP_400_BAD_REQUEST)
+            try:
+                snapshots, invalid = extract_snapshots(data)
+            except InvalidPayload as e:
+                return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            except PayloadTooLarge as e:
+                return Response({"detail": str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            metrics.ingest_decode_seconds.observe(time.perf_counter() - started)
+
+            queued = settings.INGEST_MODE == "queue"
+            # refuse before applying deltas, so the agent's retry still lines up
+            if queued and not ingest_queue.reserve(len(snapshots)):
+                return self._queue_full_response()
+
+            try:
+                prepared, resync = prepare_snapshots(snapshots)
+            except Exception:
+                if queued:
+                    ingest_queue.release()
+                raise
+
+            if queued:
+                ingest_queue.submit(prepared)
+                body = {"queued": len(prepared), "queue_depth": ingest_queue.depth()}
+                response_status = status.HTTP_202_ACCEPTED
             else:
-                return Response({"detail": "Unsupported body"},
-                                 status=status.HTTP_400_BAD_REQUEST)
-
-            created = []
-            with transaction.atomic():
-                for snap in snapshots:
-                    host_data = snap.get("hostdetails", {})
-                    hostname = host_data.get("hostname")
-                    snapshot_time = snap.get("snapshot_time")
-                    processes = snap.get("processes", [])
-
-                    if not hostname or not snapshot_time:
-                        continue
-
-                    host, _ = Host.objects.get_or_create(hostname=hostname)
-                    serializer = HostSerializer(host, data=host_data, partial=True)
-                    if not serializer.is_valid():
-                        print(f"Invalid host data: {serializer.errors}")
-                       # raise ValueError(f"invalid data, {serializer.errors}")
-                        continue
-                    serializer.save()
-
-
-                    snap_dt = None
-                    try:
-                        snap_dt = parse_datetime(snapshot_time)
-                    except Exception:
-                        snap_dt = None
-                    if snap_dt is None:
-                        try:
-                            snap_dt = datetime.fromisoformat(snapshot_time)
-                        except Exception:
-                            snap_dt = timezone.now()
-
-                    snap_obj = Snapshot.objects.create(host=host, snapshot_time=snap_dt)
-
-                    proc_objs = []
-                    for p in processes:
-                        try:
-                            proc_objs.append(Process(
-                                snapshot=snap_obj,
-                                pid=int(p.get("pid", 0)),
-                                ppid=int(p.get("ppid", 0)),
-                                name=str(p.get("name", ""))[:512],
-                                cpu_percent=float(p.get("cpu_percent", p.get("cpu", 0.0))),
-                                rss_bytes=int(p.get("rss_bytes", p.get("memory_rss", 0))),
-                            ))
-                        except Exception:
-                            continue
-
-                    if proc_objs:
-                        Process.objects.bulk_create(proc_objs, batch_size=500)
-
-                    created.append({"snapshot_id": snap_obj.id, "hostname": host.hostname})
-
-                    try:
-                        broadcast_snapshot(snap_obj.id, host.hostname, snap_obj.snapshot_time.isoformat())
-                    except Exception:
-                        pass
-
-            return Response({"created": created}, 
-                            status=status.HTTP_201_CREATED)
+                body = {"created": store_snapshots(prepared)}
+                response_status = status.HTTP_201_CREATED
+
+            if resync:
+                body["resync"] = resync
+            if invalid:
+                body["invalid"] = invalid
+            interval = sample_intervals.get(dict.fromkeys(p[0] for p in prepared))
+            if interval:
+                body["interval"] = interval
+            response = Response(body, 
+                            status=response_status)
+            response["Accept-Encoding"] = ", ".join(SUPPORTED_ENCODINGS)
+            return response
 
         except Exception as e:
             return Response({"detail": str(e)}, 
@@ -140,10 +135,146 @@ class IngestAPIView(APIView):
         
 
 
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncIngestView(View):
+    """
+    POST /api/ingest/ when INGEST_VIEW = "async" (opt-in; the default is "sync").
+
+    Native async counterpart of IngestAPIView: same bodies, headers and
+    responses, but nothing runs on the event loop except bookkeeping.
+    Decoding, delta application and validation run on a decode thread
+    pool, database writes go through the bounded group-commit
+    IngestWriter, and broadcasts are awaited directly.
+    """
+
+    async def post(self, request, *args, **kwargs):
+        response = await self._ingest(request)
+        metrics.ingest_requests.inc(status=response.status_code)
+        return response
+
+    async def _ingest(self, request):
+        try:
+            AgentAPIKeyAuthentication().authenticate(request)
+        except AuthenticationFailed as e:
+            return JsonResponse({"detail": str(e.detail)}, status=status.HTTP_403_FORBIDDEN)
+
+        metrics.ingest_body_bytes.observe(len(request.body))
+        loop = asyncio.get_running_loop()
+        try:
+            snapshots, invalid = await loop.run_in_executor(
+                decode_pool, decode_body,
+                request.body, request.content_type, request.META.get("HTTP_CONTENT_ENCODING"),
+            )
+        except (UnsupportedContentType, UnsupportedEncoding) as e:
+            return JsonResponse({"detail": f"Unsupported media type: {e}"},
+                                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        except InvalidPayload as e:
+            return JsonResponse({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except PayloadTooLarge as e:
+            return JsonResponse({"detail": str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        queued = settings.INGEST_MODE == "queue"
+        # claim a place before applying deltas, so a refused agent's retry still lines up
+        writer = ingest_queue if queued else ingest_writer
+        reserved = ingest_queue.reserve(len(snapshots)) if queued else ingest_writer.reserve()
+        if not reserved:
+            return self._queue_full_response()
+
+        try:
+            try:
+                prepared, resync = await loop.run_in_executor(decode_pool, prepare_snapshots, snapshots)
+            except Exception:
+                writer.release()
+                raise
+            if queued:
+                ingest_queue.submit(prepared)
+                body = {"queued": len(prepared), "queue_depth": ingest_queue.depth()}
+                response_status = status.HTTP_202_ACCEPTED
+            else:
+                body = {"created": await ingest_writer.store(prepared)}
+                response_status = status.HTTP_201_CREATED
+            if sample_intervals.stale():
+                await loop.run_in_executor(decode_pool, sample_intervals.reload)
+        except Exception as e:
+            return JsonResponse({"detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        if resync:
+            body["resync"] = resync
+        if invalid:
+            body["invalid"] = invalid
+        interval = sample_intervals.get(dict.fromkeys(p[0] for p in prepared))
+        if interval:
+            body["interval"] = interval
+        response = JsonResponse(body, status=response_status)
+        response["Accept-Encoding"] = ", ".join(SUPPORTED_ENCODINGS)
+        return response
+
+    def _queue_full_response(self):
+        response = JsonResponse({"detail": "Ingest queue full"}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        response["Retry-After"] = str(settings.INGEST_RETRY_AFTER)
+        return response
+
+
+class IngestQueueAPIView(APIView):
+    """
+    GET /api/ingest/queue/
+    Returns depth, capacity and counters of the background ingest queue.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        return Response({"mode": settings.INGEST_MODE, **ingest_queue.snapshot_stats()},
+                        status=status.HTTP_200_OK)
+
+
+class MetricsAPIView(APIView):
+    """
+    GET /api/metrics/
+    This process's metrics in the Prometheus text format (see api.metrics).
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+class FleetProcessesAPIView(APIView):
+    """
+    GET /fleet/processes/?sort=-cpu_percent&limit=50
+    Returns the heaviest processes across every host's latest snapshot,
+    read from the fleet view maintained at ingest (see api.fleet).
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            processes = fleet.top_processes(request.query_params)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"processes": processes}, status=status.HTTP_200_OK)
+
+
+class FleetHostsAPIView(APIView):
+    """
+    GET /fleet/hosts/?min_ram=90&sort=-ram_percent
+    Returns latest-snapshot summaries (RAM and disk use, CPU and RSS totals,
+    process count) of the hosts matching the filters, from the fleet view.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            count, hosts = fleet.hosts(request.query_params)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"count": count, "hosts": hosts}, status=status.HTTP_200_OK)
+
+
 class HostDetailAPIView(APIView):
     """
     GET /hosts/<hostname>/
-    Returns host details for the given hostname.
+    Returns host details for the given hostname, with RAM and disk use
+    from its latest snapshot.
     """
     permission_classes = [AllowAny]
 
@@ -152,14 +283,20 @@ class HostDetailAPIView(APIView):
         Retrieves host details for the given hostname.
         """
         host = get_object_or_404(Host, hostname=hostname)
-        serializer = HostSerializer(host)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data = dict(HostSerializer(host).data)
+        latest = Snapshot.objects.filter(host=host).values(*HOST_METRIC_FIELDS).first()
+        data.update(latest or dict.fromkeys(HOST_METRIC_FIELDS))
+        return Response(data, status=status.HTTP_200_OK)
 
 
 class LatestSnapshotAPIView(APIView):
     """
     GET /hosts/<hostname>/latest/
     Returns the latest snapshot of a host, including processes.
+    Served from the latest-snapshot cache as pre-rendered JSON, gzipped
+    when the client accepts it. Process-list parameters (sort, limit, pid,
+    name, prefix, min_cpu, min_rss, fields; see api.process_query) are
+    applied to the cached rows.
     """
     permission_classes = [AllowAny]
 
@@ -167,12 +304,62 @@ class LatestSnapshotAPIView(APIView):
         """
         Retrieves the most recent snapshot for the given hostname.
         """
-        host = get_object_or_404(Host, hostname=hostname)
-        snap = host.snapshots.prefetch_related("processes").first()
-        if not snap:
+        try:
+            query = ProcessQuery.from_params(request.query_params)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        entry = latest_for(hostname)
+        if entry is None:
+            get_object_or_404(Host, hostname=hostname)
             return Response({"detail": "No snapshots"}, status=status.HTTP_404_NOT_FOUND)
-        serializer = SnapshotSerializer(snap)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if query:
+            return Response(entry.select(query), status=status.HTTP_200_OK)
+
+        if "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", ""):
+            response = HttpResponse(entry.gzip, content_type="application/json")
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(entry.json, content_type="application/json")
+        patch_vary_headers(response, ["Accept-Encoding"])
+        return response
+
+
+class ProcessSeriesAPIView(APIView):
+    """
+    GET /hosts/<hostname>/series/?pid=1234 or ?name=nginx
+    Returns compact CPU/RSS arrays for one pid or process name between
+    start and end (default: the last hour), split into one instance per
+    process start time, so a reused pid is a separate instance (see
+    api.series for agents that do not send start times).
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, hostname, *args, **kwargs):
+        host = get_object_or_404(Host, hostname=hostname)
+        params = request.query_params
+        name = params.get("name") or None
+        try:
+            pid = int(params["pid"]) if params.get("pid") else None
+        except ValueError:
+            return Response({"detail": "pid must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if pid is None and name is None:
+            return Response({"detail": "pid or name is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        end_dt = _parse_query_time(params.get("end")) or timezone.now()
+        start_dt = _parse_query_time(params.get("start")) or end_dt - timedelta(hours=1)
+        try:
+            series = process_series(host, start_dt, end_dt, pid=pid, name=name)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "host": host.hostname,
+            "pid": pid,
+            "name": name,
+            "start": start_dt,
+            "end": end_dt,
+            **series,
+        }, status=status.HTTP_200_OK)
 
 
 class HistoricalProcessesPagination(PageNumberPagination):
@@ -180,10 +367,26 @@ class HistoricalProcessesPagination(PageNumberPagination):
     page_size_query_param = "page_size"
     max_page_size = 100
 
+class HistoricalProcessesCursorPagination(CursorPagination):
+    """Keyset pagination on (host, snapshot_time): no COUNT(*) and no OFFSET, so any depth costs O(page)."""
+    ordering = "-snapshot_time"
+    page_size = 1
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
 class HistoricalProcessesAPIView(APIView):
     """
     GET /hosts/<hostname>/historical-processes/
     Returns paginated snapshot records (with processes) for a host.
+    ?pagination=cursor switches from page numbers to keyset pagination;
+    follow the "next"/"previous" links. Process-list parameters (sort,
+    limit, pid, name, prefix, min_cpu, min_rss, fields) narrow each snapshot's
+    processes in the store query.
+
+    With ?resolution=1m|1h|1d|auto returns pre-aggregated rollups for the
+    start/end range instead (default: the last 24 hours); "auto" picks the
+    finest resolution that stays under HISTORY_MAX_POINTS buckets.
     """
 
     permission_classes = [AllowAny]
@@ -191,7 +394,16 @@ class HistoricalProcessesAPIView(APIView):
     def get(self, request, hostname, *args, **kwargs):
         host = get_object_or_404(Host, hostname=hostname)
 
-        snapshots = Snapshot.objects.filter(host=host).prefetch_related("processes").order_by("-snapshot_time")
+        resolution = request.query_params.get("resolution")
+        if resolution and resolution != "raw":
+            return self._rollups(request, host, resolution)
+
+        try:
+            query = ProcessQuery.from_params(request.query_params)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        snapshots = Snapshot.objects.filter(host=host).select_related("host")
 
         start = request.query_params.get("start")
         end = request.query_params.get("end")
@@ -204,9 +416,35 @@ class HistoricalProcessesAPIView(APIView):
             if end_dt:
                 snapshots = snapshots.filter(snapshot_time__lte=end_dt)
 
-        paginator = HistoricalProcessesPagination()
-        page = paginator.paginate_queryset(snapshots, request)
+        if request.query_params.get("pagination") == "cursor":
+            paginator = HistoricalProcessesCursorPagination()
+        else:
+            paginator = HistoricalProcessesPagination()
+        page = attach_processes(paginator.paginate_queryset(snapshots, request), query)
         serializer = SnapshotSerializer(page, many=True)
         return paginator.get_paginated_response(serializer.data)
 
-
+    def _rollups(self, request, host, resolution):
+        end_dt = _parse_query_time(request.query_params.get("end")) or timezone.now()
+        start_dt = _parse_query_time(request.query_params.get("start")) or end_dt - timedelta(days=1)
+        if resolution == "auto":
+            resolution = choose_resolution(start_dt, end_dt)
+        if resolution not in RESOLUTIONS:
+            return Response({"detail": f"resolution must be one of raw, auto, {', '.join(RESOLUTIONS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        series = rollup_series(host, start_dt, end_dt, resolution, request.query_params.get("name"))
+        return Response({
+            "host": host.hostname,
+            "resolution": resolution,
+            "start": start_dt,
+            "end": end_dt,
+            **series,
+        }, status=status.HTTP_200_OK)
+
+
+def _parse_query_time(value):
+    dt = parse_datetime(value) if value else None
+    if dt is not None and timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
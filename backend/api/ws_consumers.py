@@ -1,17 +1,101 @@
+import asyncio
 import json
+from fnmatch import fnmatchcase
+from urllib.parse import parse_qs
+
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 
+from . import metrics
+from .consumers import FLEET_GROUP
+
+
+WILDCARD_CHARS = frozenset("*?[")
+
+
+class _HostStream:
+    """Delivery state of one subscribed host on one connection."""
+
+    __slots__ = ("seq", "last_sent", "pending", "timer")
+
+    def __init__(self):
+        self.seq = None          # snapshot id the client was last sent
+        self.last_sent = float("-inf")
+        self.pending = None      # newest event held back by max_rate
+        self.timer = None
+
 
 class HostConsumer(AsyncWebsocketConsumer):
+    """
+    Live snapshots of one or more hosts.
+
+    ws/hosts/<hostname>/ subscribes to that host on connect; ws/hosts/
+    starts empty. Either way {"action": "subscribe", "hosts": [...]} adds
+    hosts or fnmatch patterns ("web-*") and {"action": "unsubscribe",
+    "hosts": [...]} removes them. Every frame names its host.
+
+    Protocol 1 (default) pushes a full {"type": "snapshot"} frame per
+    snapshot. Protocol 2 (connect with ?v=2, or send "v": 2 with
+    subscribe) sends a full frame on subscribe and then
+    {"type": "patch", "host", "base", "seq", "added", "changed", "removed"}
+    frames, where seq is the snapshot id. A client whose current seq is
+    not the patch's base has missed one and sends {"action": "resync",
+    "host": ...}.
+
+    ?max_rate=<updates per second> (or "max_rate" with subscribe) limits
+    frames per host; updates arriving faster are coalesced and only the
+    newest is sent when the interval ends, as a full frame if the client
+    has not seen the patch's base.
+
+    A connection with patterns joins FLEET_GROUP and so receives the event
+    of every host's snapshot; it matches the host against its patterns
+    once and remembers the answer until its patterns change.
+    """
+
     async def connect(self):
         self.hostname = self.scope["url_route"]["kwargs"].get("hostname")
-        self.group_name = f"host_{self.hostname}"
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        params = parse_qs(self.scope.get("query_string", b"").decode())
+        self.protocol = self._parse_version(params.get("v", ["1"])[0])
+        self.min_interval = self._parse_interval(params.get("max_rate", [None])[0])
+        self.hosts = set()
+        self.patterns = set()
+        self.matched = {}
+        self.streams = {}
+        self.closed = False
+        if self.hostname:
+            await self._join([self.hostname])
         await self.accept()
+        self.counted = True
+        metrics.ws_connections.inc()
+        if self.hostname and self.protocol >= 2:
+            await self._send_latest(self.hostname)
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        self.closed = True
+        if getattr(self, "counted", False):
+            metrics.ws_connections.dec()
+        for stream in self.streams.values():
+            if stream.timer:
+                stream.timer.cancel()
+        for host in self.hosts:
+            await self.channel_layer.group_discard(f"host_{host}", self.channel_name)
+        if self.patterns:
+            await self.channel_layer.group_discard(FLEET_GROUP, self.channel_name)
+
+    @staticmethod
+    def _parse_version(value):
+        try:
+            return 2 if int(value) >= 2 else 1
+        except (TypeError, ValueError):
+            return 1
+
+    @staticmethod
+    def _parse_interval(max_rate):
+        try:
+            rate = float(max_rate)
+        except (TypeError, ValueError):
+            return 0.0
+        return 1.0 / rate if rate > 0 else 0.0
 
     async def receive(self, text_data=None, bytes_data=None):
         try:
@@ -19,42 +103,142 @@ class HostConsumer(AsyncWebsocketConsumer):
         except Exception:
             payload = {}
 
-        if payload.get("action") == "latest":
-            snap = await database_sync_to_async(self._get_latest_snapshot)()
-            if snap:
-                await self.send(
-                    text_data=json.dumps({"type": "snapshot", "data": snap})
-                )
+        action = payload.get("action")
+        if action == "subscribe":
+            if "v" in payload:
+                self.protocol = self._parse_version(payload["v"])
+            if "max_rate" in payload:
+                self.min_interval = self._parse_interval(payload["max_rate"])
+            hosts = payload.get("hosts") or ([self.hostname] if self.hostname else [])
+            for host in await self._join(hosts):
+                await self._send_latest(host)
+        elif action == "unsubscribe":
+            await self._leave(payload.get("hosts") or [])
+        elif action in ("latest", "resync"):
+            host = payload.get("host") or self.hostname
+            if host:
+                await self._send_latest(host)
+
+    async def _join(self, hosts):
+        """Subscribe to hosts and patterns; returns the hostnames now covered by them."""
+        covered = []
+        for host in hosts:
+            if not isinstance(host, str) or not host:
+                continue
+            if WILDCARD_CHARS.intersection(host):
+                if not self.patterns:
+                    await self.channel_layer.group_add(FLEET_GROUP, self.channel_name)
+                self.patterns.add(host)
+                self.matched.clear()
+                covered.extend(await database_sync_to_async(self._matching_hosts)(host))
+            else:
+                if host not in self.hosts:
+                    await self.channel_layer.group_add(f"host_{host}", self.channel_name)
+                    self.hosts.add(host)
+                covered.append(host)
+        return list(dict.fromkeys(covered))
+
+    async def _leave(self, hosts):
+        for host in hosts:
+            if host in self.patterns:
+                self.patterns.discard(host)
+                self.matched.clear()
+                if not self.patterns:
+                    await self.channel_layer.group_discard(FLEET_GROUP, self.channel_name)
+            elif host in self.hosts:
+                self.hosts.discard(host)
+                await self.channel_layer.group_discard(f"host_{host}", self.channel_name)
+        for host in [h for h in self.streams if not self._wants(h)]:
+            stream = self.streams.pop(host)
+            if stream.timer:
+                stream.timer.cancel()
+
+    def _wants(self, host):
+        if host in self.hosts:
+            return True
+        if not self.patterns:
+            return False
+        wanted = self.matched.get(host)
+        if wanted is None:
+            wanted = self.matched[host] = any(fnmatchcase(host, p) for p in self.patterns)
+        return wanted
 
-    def _get_latest_snapshot(self):
+    def _matching_hosts(self, pattern):
         from .models import Host
-        from .serializers import SnapshotSerializer
-        try:
-            host = Host.objects.get(hostname=self.hostname)
-            snap = host.snapshots.prefetch_related("processes").first()
-            if not snap:
-                return None
-            return SnapshotSerializer(snap).data
-        except Host.DoesNotExist:
-            return None
+        return [h for h in Host.objects.values_list("hostname", flat=True) if fnmatchcase(h, pattern)]
+
+    async def _send_latest(self, host):
+        from .latest_cache import latest_cache, latest_for
+        entry = latest_cache.get(host)
+        if entry is None:
+            entry = await database_sync_to_async(latest_for)(host)
+        if entry:
+            self.streams.setdefault(host, _HostStream()).seq = entry.snapshot_id
+            await self.send(text_data=entry.ws_text)
+            metrics.ws_frames.inc(type="snapshot")
 
     async def snapshot_created(self, event):
+        host = event.get("hostname")
+        if not self._wants(host):
+            return
+        stream = self.streams.setdefault(host, _HostStream())
         snapshot_id = event.get("snapshot_id")
-        snap = await database_sync_to_async(self._get_snapshot_by_id)(snapshot_id)
-        if snap:
-            await self.send(
-                text_data=json.dumps({"type": "snapshot", "data": snap})
-            )
+        # the same event arrives twice when a host matches both a name and a pattern
+        if stream.seq is not None and snapshot_id <= stream.seq:
+            return
+        if stream.pending is not None and snapshot_id <= stream.pending["snapshot_id"]:
+            return
+
+        loop = asyncio.get_running_loop()
+        wait = stream.last_sent + self.min_interval - loop.time()
+        if wait <= 0 and stream.timer is None:
+            await self._deliver(stream, event)
+            return
+        if stream.pending is not None:
+            metrics.ws_coalesced.inc()
+        stream.pending = event
+        if stream.timer is None:
+            stream.timer = loop.call_later(max(wait, 0), self._flush_later, host)
+
+    def _flush_later(self, host):
+        asyncio.ensure_future(self._flush(host))
+
+    async def _flush(self, host):
+        stream = self.streams.get(host)
+        if stream is None or self.closed:
+            return
+        stream.timer = None
+        event, stream.pending = stream.pending, None
+        if event is not None:
+            await self._deliver(stream, event)
+
+    async def _deliver(self, stream, event):
+        stream.last_sent = asyncio.get_running_loop().time()
+        kind = "snapshot"
+        if self.protocol >= 2 and event.get("patch") and stream.seq is not None \
+                and event.get("patch_base") == stream.seq:
+            text, kind = event["patch"], "patch"
+        elif event.get("text"):
+            text = event["text"]
+        else:
+            from .latest_cache import PROTOCOL_VERSION
+            snap = await database_sync_to_async(self._get_snapshot_by_id)(event.get("snapshot_id"))
+            if not snap:
+                return
+            # the same layout as the pre-rendered CachedSnapshot.ws_text
+            text = json.dumps({"type": "snapshot", "v": PROTOCOL_VERSION, "seq": event.get("snapshot_id"),
+                               "data": snap})
+        stream.seq = event.get("snapshot_id")
+        await self.send(text_data=text)
+        metrics.ws_frames.inc(type=kind)
 
     def _get_snapshot_by_id(self, snapshot_id):
         from .models import Snapshot
         from .serializers import SnapshotSerializer
+        from .storage import attach_processes
         try:
-            snap = (
-                Snapshot.objects.select_related("host")
-                .prefetch_related("processes")
-                .get(pk=snapshot_id)
-            )
+            snap = Snapshot.objects.select_related("host").get(pk=snapshot_id)
+            attach_processes([snap])
             return SnapshotSerializer(snap).data
         except Snapshot.DoesNotExist:
             return None
@@ -93,11 +93,32 @@ DATABASES = {
     }
 }
 
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
+# "memory" keeps broadcasts inside one process. "socket" relays them between
+# worker processes on this machine through `manage.py channel_hub` on
+# CHANNEL_HUB_PATH. "redis" spans machines (pip install channels-redis).
+CHANNEL_LAYER = os.getenv("CHANNEL_LAYER", "memory")
+CHANNEL_HUB_PATH = os.getenv("CHANNEL_HUB_PATH", str(BASE_DIR / "channel_hub.sock"))
+
+if CHANNEL_LAYER == "socket":
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "api.channel_layers.SocketChannelLayer",
+            "CONFIG": {"path": CHANNEL_HUB_PATH},
+        }
+    }
+elif CHANNEL_LAYER == "redis":
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {"hosts": [os.getenv("CHANNEL_REDIS_URL", "redis://localhost:6379/0")]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+        }
     }
-}
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
 
@@ -109,6 +130,50 @@ REST_FRAMEWORK = {
 
 AGENT_API_KEY = os.getenv("API_KEY", "mysecretapikey")
 
+# "sync" stores snapshots inside the request; "queue" answers 202 and lets
+# background workers write them (429 + Retry-After when the queue is full).
+INGEST_MODE = os.getenv("INGEST_MODE", "sync")
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "1000"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+INGEST_COALESCE_MAX = int(os.getenv("INGEST_COALESCE_MAX", "200"))
+INGEST_RETRY_AFTER = int(os.getenv("INGEST_RETRY_AFTER", "5"))
+# "sync" (default) uses the original DRF view; "async" serves /api/ingest/ from
+# the native async view (decode pool plus group-commit writer) under ASGI.
+INGEST_VIEW = os.getenv("INGEST_VIEW", "sync")
+INGEST_DECODE_WORKERS = int(os.getenv("INGEST_DECODE_WORKERS", "4"))
+# Largest ingest body accepted after Content-Encoding / base64+gzip is undone;
+# larger ones get 413 before they are fully inflated.
+INGEST_MAX_DECOMPRESSED_MB = int(os.getenv("INGEST_MAX_DECOMPRESSED_MB", "64"))
+# Sampling interval (seconds) sent to agents in ingest responses, unless the
+# host has its own sample_interval; 0 leaves agents on their own config.
+AGENT_INTERVAL = int(os.getenv("AGENT_INTERVAL", "0"))
+
+# "table" keeps process samples in api_process; "daily" writes one table per
+# UTC day with interned names, so retention can drop whole days.
+PROCESS_STORAGE = os.getenv("PROCESS_STORAGE", "table")
+# Days of snapshot history kept by `manage.py prune_history` (0 keeps everything).
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "0"))
+# Seconds after their snapshot_time that raw snapshots are left alone by
+# rollup_history; later arrivals are re-aggregated on the next run.
+ROLLUP_RAW_LAG = int(os.getenv("ROLLUP_RAW_LAG", "120"))
+# Upper bound on buckets returned by /history/<hostname>/?resolution=auto.
+HISTORY_MAX_POINTS = int(os.getenv("HISTORY_MAX_POINTS", "500"))
+# Most snapshots one /hosts/<hostname>/series/ request may cover.
+SERIES_MAX_SNAPSHOTS = int(os.getenv("SERIES_MAX_SNAPSHOTS", "20000"))
+# Processes per host (heaviest by CPU and by RSS) kept in the fleet view at
+# ingest; the most /api/fleet/processes/ can return.
+FLEET_TOP_PROCESSES = int(os.getenv("FLEET_TOP_PROCESSES", "50"))
+# A host's fleet-view rows are rewritten once its snapshots are this many
+# seconds newer than the stored ones; fleet queries lag by up to this much.
+FLEET_REFRESH_SECONDS = int(os.getenv("FLEET_REFRESH_SECONDS", "15"))
+
+# In-memory cache of each host's latest serialized snapshot, filled at ingest
+# and used by /latest/ and the WebSocket "latest" action. Entries older than
+# LATEST_CACHE_TTL seconds are re-read from the database (0 never expires),
+# which bounds staleness when several processes ingest.
+LATEST_CACHE_MAX_MB = int(os.getenv("LATEST_CACHE_MAX_MB", "64"))
+LATEST_CACHE_TTL = int(os.getenv("LATEST_CACHE_TTL", "30"))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -1,6 +1,6 @@
 const HOSTNAME = "ubuntu"; 
 const API_BASE = "http://localhost:8000/api";
-const WS_URL = `ws://localhost:8000/ws/hosts/${HOSTNAME}/`;
+const WS_URL = `ws://localhost:8000/ws/hosts/${HOSTNAME}/?v=2`;
 
 let historyPage = 1;
 let totalPages = 1;
@@ -27,6 +27,10 @@ let ws;
 let wsConnected = false;
 let wsMessageReceived = false;
 
+// live table state for protocol v2 patches: seq is the id of the snapshot shown
+let liveSeq = null;
+let liveProcesses = {};
+
 function connectWebSocket() {
     ws = new WebSocket(WS_URL);
 
@@ -47,7 +51,16 @@ function connectWebSocket() {
         const msg = JSON.parse(event.data);
         if (msg.type === "snapshot") {
             wsMessageReceived = true;
-            renderProcesses(msg.data.processes, "#live-processes");
+            showSnapshot(msg.data);
+        } else if (msg.type === "patch") {
+            wsMessageReceived = true;
+            if (liveSeq === null || msg.base !== liveSeq) {
+                // missed a snapshot; ask for a full frame
+                ws.send(JSON.stringify({ action: "resync" }));
+                return;
+            }
+            applyPatch(msg, "#live-processes");
+            liveSeq = msg.seq;
         }
     };
 
@@ -66,12 +79,85 @@ function connectWebSocket() {
 function fetchLatestProcesses() {
     $.getJSON(`${API_BASE}/hosts/${HOSTNAME}/latest/`, function (data) {
         console.log("Fetched from DB:", data);
-        renderProcesses(data.processes, "#live-processes");
+        showSnapshot(data);
     }).fail(() => {
         console.error("Failed to fetch latest processes from API");
     });
 }
 
+function showSnapshot(snapshot) {
+    liveSeq = snapshot.id;
+    liveProcesses = {};
+    snapshot.processes.forEach(p => { liveProcesses[p.pid] = p; });
+    renderProcesses(snapshot.processes, "#live-processes");
+}
+
+function applyPatch(patch, selector) {
+    const tbody = $(selector).find("tbody");
+    const reparented = patch.changed.some(p => liveProcesses[p.pid] && liveProcesses[p.pid].ppid !== p.ppid);
+
+    patch.removed.forEach(pid => { delete liveProcesses[pid]; });
+    patch.added.concat(patch.changed).forEach(p => { liveProcesses[p.pid] = p; });
+
+    if (!tbody.length || reparented) {
+        // the tree shape changed; rebuild it from the patched state
+        renderProcesses(Object.values(liveProcesses), selector);
+        return;
+    }
+    patch.removed.forEach(pid => tbody.find(`tr[data-pid="${pid}"]`).remove());
+    patch.changed.forEach(p => updateRow(tbody.find(`tr[data-pid="${p.pid}"]`), p));
+    patch.added.forEach(p => insertRow(tbody, p));
+}
+
+function cpuClass(val) {
+    if (val < 30) return "cpu-low";
+    if (val < 70) return "cpu-med";
+    return "cpu-high";
+}
+
+function buildRow(p, level, hasChildren) {
+    return $(`
+        <tr class="process-row" data-pid="${p.pid}" data-level="${level}">
+          <td>${p.pid}</td>
+          <td class="name-cell" style="--lvl:${level}">
+            ${hasChildren ? '<span class="toggle" aria-label="expand">▶</span>' : '<span class="toggle-spacer"></span>'}
+            <span class="name">${p.name}</span>
+          </td>
+          <td class="${cpuClass(p.cpu_percent)}">${p.cpu_percent}</td>
+          <td>${p.rss_bytes}</td>
+        </tr>
+    `);
+}
+
+function updateRow(row, p) {
+    const cells = row.children("td");
+    row.find(".name").text(p.name);
+    cells.eq(2).attr("class", cpuClass(p.cpu_percent)).text(p.cpu_percent);
+    cells.eq(3).text(p.rss_bytes);
+}
+
+function insertRow(tbody, p) {
+    const parent = p.ppid ? tbody.find(`tr[data-pid="${p.ppid}"]`) : $();
+    if (!parent.length) {
+        tbody.append(buildRow(p, 0, false));
+        return;
+    }
+    const level = parseInt(parent.attr("data-level"), 10) + 1;
+    const spacer = parent.find(".toggle-spacer");
+    if (spacer.length) spacer.replaceWith('<span class="toggle" aria-label="expand">▶</span>');
+
+    // new children go after the parent's last descendant
+    let last = parent;
+    let next = parent.next();
+    while (next.length && parseInt(next.attr("data-level"), 10) >= level) {
+        last = next;
+        next = next.next();
+    }
+    const row = buildRow(p, level, false);
+    if (parent.find(".toggle").text() !== "▼" || !parent.is(":visible")) row.hide();
+    last.after(row);
+}
+
 function attachChildren(list) {
     const map = {};
     list.forEach(p => { p.children = []; map[p.pid] = p; });
@@ -103,27 +189,11 @@ function attachChildren(list) {
   
     const tbody = table.find("tbody");
   
-    function cpuClass(val) {
-      if (val < 30) return "cpu-low";
-      if (val < 70) return "cpu-med";
-      return "cpu-high";
-    }
-  
     const roots = attachChildren(processes);
   
     function renderRow(p, level = 0) {
       const hasChildren = p.children && p.children.length > 0;
-      const row = $(`
-        <tr class="process-row" data-pid="${p.pid}" data-level="${level}">
-          <td>${p.pid}</td>
-          <td class="name-cell" style="--lvl:${level}">
-            ${hasChildren ? '<span class="toggle" aria-label="expand">▶</span>' : '<span class="toggle-spacer"></span>'}
-            <span class="name">${p.name}</span>
-          </td>
-          <td class="${cpuClass(p.cpu_percent)}">${p.cpu_percent}</td>
-          <td>${p.rss_bytes}</td>
-        </tr>
-      `);
+      const row = buildRow(p, level, hasChildren);
   
       tbody.append(row);
   